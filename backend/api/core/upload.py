@@ -0,0 +1,184 @@
+import logging
+from typing import Dict, Any, List, Optional, Callable
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from multipart.multipart import MultipartParser, parse_options_header
+from ...services.file_storage import FileStorage, UploadWriter
+
+logger = logging.getLogger(__name__)
+
+# multipart边界和其他表单字段带来的额外请求体大小
+MULTIPART_OVERHEAD = 64 * 1024
+
+# 非文件表单字段（如metadata）的总大小上限
+MAX_FIELDS_SIZE = 64 * 1024
+
+# 上传接口的OpenAPI请求体说明（请求体由receive_upload直接解析，不经过FastAPI的表单参数）
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {
+                        "file": {"type": "string", "format": "binary"},
+                        "metadata": {"type": "string", "description": "JSON格式的自定义元数据"},
+                    },
+                }
+            }
+        },
+    }
+}
+
+class _MultipartUpload:
+    """multipart解析器的回调：文件部分的数据暂存在pending中，由receive_upload写入存储"""
+    
+    def __init__(self, file_storage: FileStorage, max_size_for: Callable[[str], int],
+                 declared_size: Optional[int]):
+        self.file_storage = file_storage
+        self.max_size_for = max_size_for
+        self.declared_size = declared_size
+        
+        self.filename: Optional[str] = None
+        self.max_size: Optional[int] = None
+        self.file_size = 0
+        self.pending: List[bytes] = []
+        self.pending_size = 0
+        self.writer: Optional[UploadWriter] = None
+        self.fields: Dict[str, str] = {}
+        self.fields_size = 0
+        
+        # 当前部分的状态
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._field_name: Optional[str] = None
+        self._field_value = bytearray()
+        self._in_file = False
+    
+    def callbacks(self) -> Dict[str, Callable]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+    
+    def on_part_begin(self):
+        self._headers = {}
+        self._field_name = None
+        self._field_value = bytearray()
+        self._in_file = False
+    
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+    
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+    
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+    
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"filename" not in options:
+            self._field_name = options.get(b"name", b"").decode("utf-8")
+            return
+        
+        if self.filename is not None:
+            raise ValueError("每次只能上传一个文件")
+        filename = options[b"filename"].decode("utf-8")
+        if not filename:
+            raise ValueError("缺少上传文件的文件名")
+        
+        # 在接收文件内容之前验证格式和声明的大小
+        self.max_size = self.max_size_for(filename)
+        self.file_storage.check_size(self.declared_size, self.max_size)
+        self.filename = filename
+        self._in_file = True
+    
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.file_size += end - start
+            # 超出限制时立即停止接收
+            self.file_storage.check_size(self.file_size, self.max_size)
+            self.pending.append(data[start:end])
+            self.pending_size += end - start
+        else:
+            self.fields_size += end - start
+            if self.fields_size > MAX_FIELDS_SIZE:
+                raise ValueError(f"表单字段超过大小限制: {MAX_FIELDS_SIZE // 1024}KB")
+            self._field_value += data[start:end]
+    
+    def on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+        elif self._field_name:
+            self.fields[self._field_name] = self._field_value.decode("utf-8")
+
+async def receive_upload(request: Request, file_storage: FileStorage,
+                         max_size_for: Callable[[str], int]) -> Dict[str, Any]:
+    """
+    流式解析multipart/form-data请求体，文件部分边接收边按块写入存储目录
+    
+    请求体不经过Starlette的表单解析（会先把整个文件读入SpooledTemporaryFile），
+    文件只写入一次。超过大小限制时立即停止接收，包括没有Content-Length的分块传输请求。
+    文件写入在线程池中执行，不阻塞事件循环。
+    
+    Args:
+        request: 请求
+        file_storage: 文件存储
+        max_size_for: 以文件名调用，验证格式并返回该文件的大小限制（字节）；在接收文件内容之前调用
+    
+    Returns:
+        Dict[str, Any]: 包含filename、fields（其他表单字段）以及path、file_hash和file_size
+    
+    Raises:
+        ValueError: 请求格式错误、缺少文件或max_size_for拒绝该文件
+        FileTooLargeError: 如果文件超过大小限制
+    """
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise ValueError("请求体必须是multipart/form-data")
+    
+    content_length = request.headers.get("content-length")
+    declared_size = int(content_length) - MULTIPART_OVERHEAD if content_length else None
+    
+    upload = _MultipartUpload(file_storage, max_size_for, declared_size)
+    parser = MultipartParser(options[b"boundary"], upload.callbacks())
+    
+    async def flush(min_size: int):
+        if upload.filename is not None and upload.writer is None:
+            upload.writer = await run_in_threadpool(file_storage.open_writer, upload.filename)
+        if upload.writer is not None and upload.pending_size >= min_size and upload.pending:
+            block = b"".join(upload.pending)
+            upload.pending, upload.pending_size = [], 0
+            await run_in_threadpool(upload.writer.write, block)
+    
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            # 攒够一个存储块再写入，减少线程切换
+            await flush(file_storage.block_size)
+        parser.finalize()
+        await flush(0)
+        
+        if upload.writer is None:
+            raise ValueError("缺少上传文件")
+        stored_file = await run_in_threadpool(upload.writer.commit)
+    
+    except BaseException:
+        # 清理不完整的文件（包括客户端断开连接）
+        if upload.writer is not None:
+            upload.writer.abort()
+        raise
+    
+    logger.debug(f"文件 {upload.filename} 已写入 {stored_file['path']}, 大小: {stored_file['file_size']}")
+    return {"filename": upload.filename, "fields": upload.fields, **stored_file}
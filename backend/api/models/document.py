@@ -4,6 +4,7 @@ from datetime import datetime
 from enum import Enum
 
 class DocumentStatus(str, Enum):
+    QUEUED = "queued"
     PROCESSING = "processing"
     CHUNKING = "chunking"
     EMBEDDING = "embedding"
@@ -39,6 +40,7 @@ class DocumentListResponse(BaseModel):
     total: int
     limit: int
     offset: int
+    next_cursor: Optional[str] = None  # 下一页的分页游标，没有下一页时为空
 
 class DocumentStatusResponse(BaseModel):
     """任务状态响应模型"""
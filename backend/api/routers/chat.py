@@ -36,12 +36,14 @@ async def chat_completion(
         use_rag = request.use_rag if request.use_rag is not None else True
         
         if use_rag:
-            # 使用GraphRAG提供上下文
+            # 使用GraphRAG提供上下文，查询嵌入通过异步嵌入客户端生成，不阻塞事件循环
+            query_embedding = (await llm_service.embedding_client.embed_many([request.message]))[0]
             context = graphrag_service.get_context_for_query(
                 query=request.message,
                 user_id=current_user.id if request.user_specific else None,
                 document_ids=request.document_ids,
-                max_results=request.max_context_chunks
+                max_results=request.max_context_chunks,
+                query_embedding=query_embedding
             )
             
             # 生成带上下文的提示
@@ -82,12 +84,14 @@ async def stream_chat_completion(
         context = []
         
         if use_rag:
-            # 使用GraphRAG提供上下文
+            # 使用GraphRAG提供上下文，查询嵌入通过异步嵌入客户端生成，不阻塞事件循环
+            query_embedding = (await llm_service.embedding_client.embed_many([request.message]))[0]
             context = graphrag_service.get_context_for_query(
                 query=request.message,
                 user_id=current_user.id if request.user_specific else None,
                 document_ids=request.document_ids,
-                max_results=request.max_context_chunks
+                max_results=request.max_context_chunks,
+                query_embedding=query_embedding
             )
             
             # 生成带上下文的提示
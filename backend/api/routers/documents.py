@@ -1,16 +1,17 @@
- from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 import json
 import logging
-import tempfile
-import os
-import uuid
 from ..deps.auth import get_current_user
+from ..core.upload import receive_upload, UPLOAD_OPENAPI
 from ..models.user import User
 from ..models.document import DocumentResponse, DocumentListResponse, DocumentStatusResponse
 from ...services.document_service import DocumentService
 from ...services.vector_store import VectorStore
+from ...services.file_storage import FileStorage, FileTooLargeError
+from ...processors.base import get_processor_stats
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -18,51 +19,96 @@ logger = logging.getLogger(__name__)
 # 初始化服务
 vector_store = VectorStore()
 document_service = DocumentService(vector_store)
+file_storage = FileStorage()
 
-@router.post("/upload", response_model=DocumentResponse)
+def _upload_max_size(filename: str) -> int:
+    """验证上传文件的格式并返回大小限制，压缩包使用单独的限制"""
+    if document_service.is_archive(filename):
+        return document_service.archive_ingestor.max_size
+    document_service.check_format(filename)
+    return file_storage.max_size
+
+async def _receive_upload(request: Request, max_size_for) -> Dict[str, Any]:
+    """流式接收上传的文件并解析metadata字段，元数据无效时删除已存储的文件"""
+    upload = await receive_upload(request, file_storage, max_size_for)
+    metadata = upload["fields"].get("metadata")
+    try:
+        upload["metadata"] = json.loads(metadata) if metadata else None
+    except ValueError:
+        await run_in_threadpool(file_storage.delete, upload["path"])
+        raise ValueError("metadata必须是有效的JSON")
+    return upload
+
+@router.post("/upload", response_model=DocumentResponse, openapi_extra=UPLOAD_OPENAPI)
 async def upload_document(
-    file: UploadFile = File(...),
-    metadata: Optional[str] = Form(None),
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
-    """上传文档进行处理和索引"""
+    """上传文档进行处理和索引（multipart/form-data，字段file和可选的metadata）"""
     try:
-        # 解析元数据
-        metadata_dict = json.loads(metadata) if metadata else {}
+        # 请求体按块直接写入存储目录，同时增量计算哈希，超出大小限制时立即返回413
+        stored_file = await _receive_upload(request, _upload_max_size)
+        metadata_dict = stored_file["metadata"] or {}
         
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            # 写入上传的文件内容
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        if document_service.is_archive(stored_file["filename"]):
+            return await _upload_archive(stored_file, metadata_dict, current_user)
         
         try:
-            # 创建任务ID
-            task_id = str(uuid.uuid4())
-            
-            # 提交处理任务
-            doc_metadata = document_service.process_document(
-                file=open(temp_file_path, 'rb'),
-                filename=file.filename,
+            # 登记文档并将处理任务加入工作进程队列，不在请求中执行提取和嵌入
+            result = document_service.submit_document(
+                file_path=stored_file["path"],
+                filename=stored_file["filename"],
                 user_id=current_user.id,
+                file_hash=stored_file["file_hash"],
+                file_size=stored_file["file_size"],
                 metadata=metadata_dict
             )
-            
+        except Exception:
+            await run_in_threadpool(file_storage.delete, stored_file["path"])
+            raise
+        
+        if result["duplicate"]:
+            # 重复上传复用已有文档，不再需要存储的文件
+            await run_in_threadpool(file_storage.delete, stored_file["path"])
             return JSONResponse(
-                status_code=202,  # Accepted
-                content={"message": "文档上传已接受处理", "document": doc_metadata, "task_id": task_id}
+                status_code=200,
+                content={"message": "文档已存在，复用已有索引", "document": result["document"], "task_id": None}
             )
-        finally:
-            # 删除临时文件
-            os.unlink(temp_file_path)
         
+        return JSONResponse(
+            status_code=202,  # Accepted
+            content={"message": "文档上传已接受处理", "document": result["document"], "task_id": result["task_id"]}
+        )
+        
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"上传文档错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"文档上传失败: {str(e)}")
 
+async def _upload_archive(stored_file: Dict[str, Any], metadata_dict: Dict[str, Any], current_user: User):
+    """为已存储的压缩包创建导入任务，成员由工作进程逐个作为文档处理"""
+    try:
+        task_id = document_service.submit_archive(
+            file_path=stored_file["path"],
+            filename=stored_file["filename"],
+            user_id=current_user.id,
+            file_hash=stored_file["file_hash"],
+            file_size=stored_file["file_size"],
+            metadata=metadata_dict
+        )
+    except Exception:
+        await run_in_threadpool(file_storage.delete, stored_file["path"])
+        raise
+    
+    # 导入进度通过 GET /task/{task_id} 查询
+    return JSONResponse(
+        status_code=202,
+        content={"message": "压缩包上传已接受处理", "document": None, "task_id": task_id}
+    )
+
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: str,
@@ -88,6 +134,7 @@ async def get_document(
 async def list_documents(
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
     category: Optional[str] = None,
     status: Optional[str] = None,
     current_user: User = Depends(get_current_user)
@@ -101,19 +148,86 @@ async def list_documents(
         if status:
             filters["status"] = status
         
-        # 获取文档列表
-        documents, total_count = document_service.get_all_documents(
+        # 获取文档列表，提供cursor时按游标翻页
+        documents, total_count, next_cursor = document_service.get_all_documents(
             filters=filters,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor
         )
         
-        return {"documents": documents, "total": total_count, "limit": limit, "offset": offset}
+        return {
+            "documents": documents,
+            "total": total_count,
+            "limit": limit,
+            "offset": offset,
+            "next_cursor": next_cursor
+        }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"列出文档错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取文档列表失败: {str(e)}")
 
+@router.put("/{document_id}", response_model=DocumentResponse, openapi_extra=UPLOAD_OPENAPI)
+async def replace_document(
+    document_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """上传文档的新版本，增量重新索引（multipart/form-data，字段file和可选的metadata）"""
+    try:
+        # 检查文档所有权
+        try:
+            doc_metadata = document_service.get_document_metadata(document_id)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        if doc_metadata.get("user_id") != current_user.id:
+            raise HTTPException(status_code=403, detail="无权修改此文档")
+
+        def max_size_for(filename: str) -> int:
+            document_service.check_format(filename)
+            return file_storage.max_size
+
+        stored_file = await _receive_upload(request, max_size_for)
+
+        try:
+            # 只为新增或修改的文本块生成嵌入，旧版本文件在新版本索引成功后删除
+            result = document_service.replace_document(
+                document_id=document_id,
+                file_path=stored_file["path"],
+                filename=stored_file["filename"],
+                file_hash=stored_file["file_hash"],
+                file_size=stored_file["file_size"],
+                metadata=stored_file["metadata"]
+            )
+        except Exception:
+            await run_in_threadpool(file_storage.delete, stored_file["path"])
+            raise
+
+        if result["duplicate"]:
+            await run_in_threadpool(file_storage.delete, stored_file["path"])
+            return JSONResponse(
+                status_code=200,
+                content={"message": "新版本与当前版本相同，无需重新索引", "document": result["document"], "task_id": None}
+            )
+
+        return JSONResponse(
+            status_code=202,
+            content={"message": "文档新版本已接受处理", "document": result["document"], "task_id": result["task_id"]}
+        )
+
+    except HTTPException:
+        raise
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"替换文档 {document_id} 错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"替换文档失败: {str(e)}")
+
 @router.delete("/{document_id}")
 async def delete_document(
     document_id: str,
@@ -160,6 +274,32 @@ async def reindex_document(
         logger.error(f"重新索引文档 {document_id} 错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"重新索引文档失败: {str(e)}")
 
+@router.post("/repair-embeddings")
+async def repair_embeddings(
+    document_id: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user)
+):
+    """重新嵌入当前用户（或其中一个文档）向量为零向量或包含NaN的文本块"""
+    try:
+        if document_id:
+            # 检查文档所有权
+            doc_metadata = document_service.get_document_metadata(document_id)
+            if doc_metadata.get("user_id") != current_user.id:
+                raise HTTPException(status_code=403, detail="无权修复此文档")
+        
+        task_id = document_service.submit_embedding_repair(current_user.id, document_id)
+        
+        # 修复进度通过 GET /task/{task_id} 查询
+        return {"message": "嵌入修复任务已创建", "task_id": task_id}
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"创建嵌入修复任务错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"创建嵌入修复任务失败: {str(e)}")
+
 @router.get("/task/{task_id}", response_model=DocumentStatusResponse)
 async def get_task_status(
     task_id: str,
@@ -180,3 +320,27 @@ async def get_task_status(
     except Exception as e:
         logger.error(f"获取任务 {task_id} 状态错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取任务状态失败: {str(e)}")
+
+@router.get("/stats/dedup")
+async def get_dedup_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """获取文档和文本块去重索引的命中统计"""
+    try:
+        return document_service.get_dedup_stats()
+        
+    except Exception as e:
+        logger.error(f"获取去重统计错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取去重统计失败: {str(e)}")
+
+@router.get("/stats/processors")
+async def get_processors_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """获取文档处理器的登记和加载情况，以及各处理器模块的导入耗时"""
+    try:
+        return get_processor_stats()
+        
+    except Exception as e:
+        logger.error(f"获取处理器统计错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取处理器统计失败: {str(e)}")
@@ -23,7 +23,8 @@ async def search_documents(
 ):
     """搜索文档库"""
     try:
-        results = search_service.search(
+        # 先查结果缓存，未命中时查询嵌入才通过异步嵌入客户端生成，不阻塞事件循环
+        results = await search_service.asearch(
             query=request.query,
             user_id=current_user.id,
             limit=request.limit,
@@ -49,7 +50,7 @@ async def search_within_document(
         # 创建文档过滤器
         filters = {"document_id": document_id}
         
-        results = search_service.search(
+        results = await search_service.asearch(
             query=query,
             user_id=current_user.id,
             limit=limit,
@@ -61,3 +62,15 @@ async def search_within_document(
     except Exception as e:
         logger.error(f"在文档内搜索错误: {str(e)}")
         raise HTTPException(status_code=500, detail="搜索执行失败") 
+
+@router.get("/stats/embedding-cache")
+async def get_embedding_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """获取嵌入缓存的命中率和占用空间（命中次数为本进程的统计）"""
+    try:
+        return llm_service.embedding_cache.get_stats()
+        
+    except Exception as e:
+        logger.error(f"获取嵌入缓存统计错误: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取嵌入缓存统计失败: {str(e)}")
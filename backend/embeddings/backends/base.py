@@ -0,0 +1,136 @@
+import time
+import logging
+import importlib
+import threading
+import yaml
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingUnavailableError(Exception):
+    """嵌入服务持续不可用，等待恢复超时"""
+
+class EmbeddingBackend(ABC):
+    """
+    嵌入后端基类
+
+    后端只负责为一组文本生成向量（embed_batch，在嵌入客户端的事件循环中调用）。
+    缓存、去重、分组、并发和失败重试由EmbeddingClient统一处理，与后端无关。
+
+    实现在configs/ollama.yaml的embedding_backend.type中选择:
+    - ollama: 通过HTTP调用Ollama（默认）
+    - onnx: 进程内ONNX Runtime推理（CPU，可选int8量化模型）
+    - hashing: 确定性的特征哈希向量，用于测试和基准测试，不需要任何外部服务
+    """
+
+    # 后端类型，与配置中的embedding_backend.type对应
+    type = ""
+
+    def __init__(self, config_path: str = "configs/ollama.yaml"):
+        # 加载配置
+        with open(config_path, "r") as f:
+            self.config = yaml.safe_load(f)
+
+        backend_settings = self.config.get("embedding_backend") or {}
+        self.settings = backend_settings.get(self.type) or {}
+
+    @property
+    @abstractmethod
+    def model_name(self) -> str:
+        """默认模型名，同时作为嵌入缓存键的一部分，不同后端或模型的向量不会混用"""
+        pass
+
+    @abstractmethod
+    async def embed_batch(self, texts: List[str], model: str) -> List[List[float]]:
+        """
+        为一组文本生成嵌入向量
+
+        Args:
+            texts: 文本列表（已截断）
+            model: 模型名，只有支持多个模型的后端使用
+
+        Returns:
+            List[List[float]]: 与输入顺序一致的嵌入向量列表
+        """
+        pass
+
+    def classify_error(self, e: Exception) -> Optional[str]:
+        """
+        embed_batch失败的类型，决定EmbeddingClient如何重试
+
+        - unavailable: 服务暂时不可用，整组退避重试
+        - permanent: 与输入无关的错误，不重试
+        - input: 输入无效，拆分以找出无效的文本，单条文本不重试
+        - retry: 其他可能是暂时的错误，拆分后单条文本退避重试
+        - None: 不重试，直接抛出
+
+        进程内后端的错误（如模型文件缺失）不会因为重试而恢复，默认只重试数据错误。
+        """
+        if isinstance(e, EmbeddingUnavailableError):
+            return None
+        if isinstance(e, (ValueError, KeyError)):
+            return "retry"
+        return None
+
+    async def close(self):
+        """释放后端持有的连接或线程"""
+        pass
+
+# 内置后端：类型 -> "模块:类"，模块在选择该后端时才导入，
+# 不使用ONNX后端的进程不需要安装onnxruntime
+BACKEND_ENTRIES: Dict[str, str] = {
+    "ollama": "ollama_backend:OllamaBackend",
+    "onnx": "onnx_backend:OnnxBackend",
+    "hashing": "hashing_backend:HashingBackend",
+}
+
+_BACKENDS: Dict[str, Type[EmbeddingBackend]] = {}
+
+_registry_lock = threading.Lock()
+
+def register_backend_entry(backend_type: str, target: str):
+    """
+    登记延迟加载的嵌入后端
+
+    Args:
+        backend_type: 后端类型，即配置中的embedding_backend.type
+        target: "模块:类"，模块名可以是本包内的相对名称或完整的模块路径
+    """
+    with _registry_lock:
+        BACKEND_ENTRIES[backend_type] = target
+        _BACKENDS.pop(backend_type, None)
+
+def create_embedding_backend(config_path: str = "configs/ollama.yaml",
+                             backend_type: Optional[str] = None) -> EmbeddingBackend:
+    """
+    创建配置中选择的嵌入后端
+
+    Args:
+        config_path: Ollama配置文件路径
+        backend_type: 可选的后端类型，覆盖配置中的embedding_backend.type
+
+    Returns:
+        EmbeddingBackend: 嵌入后端实例
+
+    Raises:
+        ValueError: 如果后端类型未登记
+    """
+    if backend_type is None:
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+        backend_type = (config.get("embedding_backend") or {}).get("type", "ollama")
+
+    with _registry_lock:
+        backend_class = _BACKENDS.get(backend_type)
+        if backend_class is None:
+            if backend_type not in BACKEND_ENTRIES:
+                raise ValueError(f"未知的嵌入后端: {backend_type}")
+
+            module_name, class_name = BACKEND_ENTRIES[backend_type].split(":")
+            start_time = time.perf_counter()
+            module = importlib.import_module(module_name if "." in module_name else f"{__package__}.{module_name}")
+            logger.info(f"加载嵌入后端模块 {module_name}，导入耗时 {(time.perf_counter() - start_time) * 1000:.0f}ms")
+            backend_class = _BACKENDS[backend_type] = getattr(module, class_name)
+
+    return backend_class(config_path)
@@ -0,0 +1,62 @@
+import re
+import zlib
+import asyncio
+import logging
+from typing import List
+import numpy as np
+from .base import EmbeddingBackend
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+class HashingBackend(EmbeddingBackend):
+    """
+    确定性的特征哈希嵌入后端
+
+    把小写化后的词和词内的字符n-gram（中文等不以空格分词的文本主要靠n-gram）
+    用CRC32哈希到固定维度的桶中，带符号累加后做L2归一化。相同文本在任何进程中得到相同的向量，
+    共享词和n-gram越多的文本余弦相似度越高。
+
+    不需要模型文件或外部服务，用于测试、CI和嵌入之外环节的基准测试，不适合生产检索。
+    """
+
+    type = "hashing"
+
+    def __init__(self, config_path: str = "configs/ollama.yaml"):
+        super().__init__(config_path)
+
+        self.dimension = self.settings.get("dimension", 768)
+        self.ngram = self.settings.get("ngram", 3)
+
+    @property
+    def model_name(self) -> str:
+        return f"hashing-{self.dimension}-{self.ngram}"
+
+    async def embed_batch(self, texts: List[str], model: str) -> List[List[float]]:
+        # 计算在线程中进行，不阻塞嵌入客户端的事件循环
+        return await asyncio.to_thread(lambda: [self.embed_text(text) for text in texts])
+
+    def embed_text(self, text: str) -> List[float]:
+        """计算单条文本的哈希向量"""
+        features = []
+        for word in _WORD_PATTERN.findall(text.lower()):
+            features.append(word)
+            if len(word) > self.ngram:
+                features.extend(word[i:i + self.ngram] for i in range(len(word) - self.ngram + 1))
+        if not features:
+            # 没有词的文本（空白、纯标点）按原文哈希，保证不返回零向量
+            features.append(text)
+
+        hashes = np.fromiter((zlib.crc32(feature.encode("utf-8")) for feature in features), dtype=np.uint32,
+                             count=len(features))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        np.add.at(vector, hashes % self.dimension, signs)
+
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            # 符号恰好全部抵消时退回到第一个特征的桶
+            vector[hashes[0] % self.dimension] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
@@ -0,0 +1,173 @@
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional
+import httpx
+from .base import EmbeddingBackend, EmbeddingUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# 表示Ollama暂时不可用（过载、重启中）的响应状态码，计入熔断
+_UNAVAILABLE_STATUS = (429, 502, 503, 504)
+
+class OllamaBackend(EmbeddingBackend):
+    """
+    通过HTTP调用Ollama的嵌入后端
+
+    httpx.AsyncClient连接池保持长连接。同时发往Ollama的批次数由EmbeddingClient的并发上限控制，
+    旧版Ollama逐条请求时的并发受连接池大小限制。
+    Ollama连续不可用时熔断，暂停发送请求，每隔circuit_reset_seconds放行一个探测请求。
+    """
+
+    type = "ollama"
+
+    def __init__(self, config_path: str = "configs/ollama.yaml"):
+        super().__init__(config_path)
+
+        self.base_url = f"http://{self.config['ollama']['host']}:{self.config['ollama']['port']}"
+        self.timeout = self.config["ollama"]["timeout"]
+        self._model_name = self.config["models"]["embeddings"]
+
+        embedding_settings = self.config.get("embedding") or {}
+        self.max_connections = embedding_settings.get("max_connections", 8)
+        self.circuit_threshold = embedding_settings.get("circuit_failure_threshold", 5)
+        self.circuit_reset_seconds = embedding_settings.get("circuit_reset_seconds", 30.0)
+        self.circuit_max_pause = embedding_settings.get("circuit_max_pause_seconds", 600.0)
+
+        # 连接池在嵌入客户端的事件循环中第一次请求时创建
+        self._client: Optional[httpx.AsyncClient] = None
+        # Ollama不支持/api/embed（0.3.0之前的版本）时逐条调用/api/embeddings
+        self._batch_embed_supported = True
+        # 熔断状态只在客户端的事件循环中读写：_open_until不为None时熔断，到期后放行一个探测请求
+        self._failures = 0
+        self._open_until: Optional[float] = None
+        self._probing = False
+
+        self.stats = {"requests": 0, "circuit_opens": 0}
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name
+
+    async def embed_batch(self, texts: List[str], model: str) -> List[List[float]]:
+        """一次/api/embed请求获取一组文本的嵌入"""
+        if not self._batch_embed_supported:
+            return list(await asyncio.gather(*(self._request_embedding(text, model) for text in texts)))
+
+        response = await self._post("/api/embed", {"model": model, "input": texts})
+        if response.status_code == 404 and "model" not in response.text.lower():
+            # 旧版本Ollama没有/api/embed
+            logger.warning("Ollama不支持/api/embed，改为逐条获取向量嵌入")
+            self._batch_embed_supported = False
+            return list(await asyncio.gather(*(self._request_embedding(text, model) for text in texts)))
+        response.raise_for_status()
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"返回 {len(embeddings)} 个嵌入，请求了 {len(texts)} 个")
+        return embeddings
+
+    async def _request_embedding(self, text: str, model: str) -> List[float]:
+        """通过/api/embeddings获取单条文本的向量嵌入"""
+        response = await self._post("/api/embeddings", {"model": model, "prompt": text})
+        response.raise_for_status()
+        return response.json()["embedding"]
+
+    def classify_error(self, e: Exception) -> Optional[str]:
+        """
+        - unavailable: 连接失败，或429/502/503/504
+        - permanent: 与输入无关的客户端错误（如模型不存在）
+        - input: 400/413
+        - retry: 超时、500、响应格式错误
+        """
+        if isinstance(e, httpx.HTTPStatusError):
+            status = e.response.status_code
+            if status in _UNAVAILABLE_STATUS:
+                return "unavailable"
+            if status in (400, 413):
+                return "input"
+            if 400 <= status < 500 and status != 408:
+                return "permanent"
+            return "retry"
+        if isinstance(e, httpx.TransportError) and not isinstance(e, httpx.TimeoutException):
+            return "unavailable"
+        if isinstance(e, httpx.HTTPError):
+            return "retry"
+        return super().classify_error(e)
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> httpx.Response:
+        """在熔断器允许时发送请求，并记录Ollama是否可用"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+
+        probe = await self._wait_for_circuit()
+        try:
+            try:
+                response = await self._client.post(f"{self.base_url}{path}", json=payload)
+            except httpx.TimeoutException:
+                # 超时通常是批次过大或负载较高，由客户端拆分重试，不计入熔断
+                raise
+            except httpx.TransportError:
+                self._record_failure()
+                raise
+            finally:
+                self.stats["requests"] += 1
+
+            if response.status_code in _UNAVAILABLE_STATUS:
+                self._record_failure()
+            else:
+                self._record_success()
+            return response
+        finally:
+            if probe:
+                self._probing = False
+
+    async def _wait_for_circuit(self) -> bool:
+        """
+        熔断期间等待Ollama恢复
+
+        熔断时间结束后只放行一个探测请求，其余请求继续等待探测结果。
+
+        Returns:
+            bool: 当前请求是否为探测请求
+
+        Raises:
+            EmbeddingUnavailableError: 等待超过circuit_max_pause_seconds
+        """
+        wait_start = time.monotonic()
+        while self._open_until is not None:
+            now = time.monotonic()
+            if now - wait_start > self.circuit_max_pause:
+                raise EmbeddingUnavailableError(f"Ollama不可用，已等待 {now - wait_start:.0f} 秒")
+            if now >= self._open_until and not self._probing:
+                self._probing = True
+                return True
+            await asyncio.sleep(min(max(self._open_until - now, 0.1), 1.0))
+        return False
+
+    def _record_failure(self):
+        """记录一次Ollama不可用的请求（连接失败或429/502/503/504），连续失败达到阈值时熔断"""
+        self._failures += 1
+        if self._failures < self.circuit_threshold:
+            return
+        if self._open_until is None:
+            self.stats["circuit_opens"] += 1
+            logger.warning(f"Ollama连续 {self._failures} 次请求失败，暂停发送嵌入请求")
+        self._open_until = time.monotonic() + self.circuit_reset_seconds
+
+    def _record_success(self):
+        """Ollama正常响应，关闭熔断"""
+        self._failures = 0
+        if self._open_until is not None:
+            self._open_until = None
+            logger.info("Ollama已恢复，继续发送嵌入请求")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
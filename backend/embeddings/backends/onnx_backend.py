@@ -0,0 +1,116 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+from .base import EmbeddingBackend
+
+logger = logging.getLogger(__name__)
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    进程内ONNX Runtime嵌入后端（CPU）
+
+    加载导出为ONNX的句向量模型（如bge、e5、MiniLM）和对应的tokenizer.json，在本进程中推理，
+    不经过HTTP。每组文本按长度排序后分成threads份（长度相近的文本一起推理，减少填充），
+    在线程池中并行执行，每次推理使用intra_op_threads个线程做矩阵乘法。
+
+    int8为true时使用动态量化的int8模型，量化模型不存在时在第一次加载时由原模型生成
+    （需要onnx包）。需要安装onnxruntime和tokenizers。
+    """
+
+    type = "onnx"
+
+    def __init__(self, config_path: str = "configs/ollama.yaml"):
+        super().__init__(config_path)
+
+        self.model_path = self.settings["model_path"]
+        self.tokenizer_path = self.settings["tokenizer_path"]
+        self.int8 = self.settings.get("int8", False)
+        self.max_length = self.settings.get("max_length", 512)
+        self.threads = self.settings.get("threads") or os.cpu_count() or 1
+        self.intra_op_threads = self.settings.get("intra_op_threads", 1)
+        self.pooling = self.settings.get("pooling", "mean")
+        self.normalize = self.settings.get("normalize", True)
+
+        model_path = self.model_path
+        if self.int8:
+            model_path = self.settings.get("quantized_model_path") or os.path.splitext(self.model_path)[0] + ".int8.onnx"
+            if not os.path.exists(model_path):
+                self._quantize(self.model_path, model_path)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(self.tokenizer_path)
+        self.tokenizer.enable_truncation(self.max_length)
+        self.tokenizer.enable_padding()
+
+        # 推理线程池，session.run可以在多个线程中同时调用
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="onnx-embed")
+
+        logger.info(f"ONNX嵌入后端初始化完成: {model_path}, 线程数 {self.threads}x{self.intra_op_threads}")
+
+    @property
+    def model_name(self) -> str:
+        # 模型目录名通常是模型名（如bge-small-zh/model.onnx），一起写入以区分不同模型
+        model_file = os.path.join(os.path.basename(os.path.dirname(self.model_path)), os.path.basename(self.model_path))
+        return f"onnx:{model_file}{':int8' if self.int8 else ''}:{self.pooling}"
+
+    @staticmethod
+    def _quantize(model_path: str, quantized_path: str):
+        """把模型权重动态量化为int8"""
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"生成int8量化模型: {quantized_path}")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+
+    async def embed_batch(self, texts: List[str], model: str) -> List[List[float]]:
+        """按长度排序后分成若干份，在线程池中并行推理"""
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        parts = np.array_split(np.array(order), min(self.threads, len(texts)))
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self._run, [texts[i] for i in part]) for part in parts
+        ))
+
+        embeddings: List[List[float]] = [None] * len(texts)
+        for part, vectors in zip(parts, results):
+            for i, vector in zip(part, vectors):
+                embeddings[i] = vector.tolist()
+        return embeddings
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        """对一组文本推理并池化为句向量"""
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs: Dict[str, np.ndarray] = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        outputs = self.session.run(None, {name: value for name, value in inputs.items() if name in self.input_names})
+
+        hidden = outputs[0].astype(np.float32)
+        if hidden.ndim == 3:
+            if self.pooling == "cls":
+                hidden = hidden[:, 0]
+            else:
+                # 按注意力掩码对有效token取平均
+                mask = attention_mask[:, :, None].astype(np.float32)
+                hidden = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+        if self.normalize:
+            hidden = hidden / np.maximum(np.linalg.norm(hidden, axis=1, keepdims=True), 1e-12)
+        return hidden
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
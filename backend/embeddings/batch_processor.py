@@ -1,9 +1,8 @@
- import os
+import os
 import logging
 import yaml
 from typing import List, Optional, Dict, Any
 import numpy as np
-from concurrent.futures import ThreadPoolExecutor
 from .model import get_embeddings
 
 logger = logging.getLogger(__name__)
@@ -27,6 +26,8 @@ class BatchProcessor:
         """
         批量处理文本嵌入
         
+        每batch_size条文本调用一次get_embeddings，其中再按字符预算分组，每组一次请求。
+        
         Args:
             texts: 要处理的文本列表
             
@@ -50,26 +51,13 @@ class BatchProcessor:
         """
         并行批量处理文本嵌入
         
+        所有文本一次交给嵌入客户端，由其分组后在全局并发上限内同时请求，不再为每次调用创建线程池。
+        
         Args:
             texts: 要处理的文本列表
             
         Returns:
             List[List[float]]: 嵌入向量列表
         """
-        # 根据批大小拆分文本
-        batches = [texts[i:i+self.batch_size] for i in range(0, len(texts), self.batch_size)]
-        logger.info(f"拆分为 {len(batches)} 个批次进行并行处理")
-        
-        # 并行处理
-        all_embeddings = []
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交所有批次任务
-            futures = [executor.submit(get_embeddings, batch) for batch in batches]
-            
-            # 收集结果
-            for future in futures:
-                result = future.result()
-                all_embeddings.extend(result)
-        
-        # 确保结果顺序与输入一致
-        return all_embeddings
+        logger.info(f"并行处理 {len(texts)} 条文本")
+        return get_embeddings(texts)
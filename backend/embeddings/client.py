@@ -0,0 +1,280 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Iterator
+import numpy as np
+import yaml
+from ..services.embedding_cache import get_embedding_cache
+from .backends.base import EmbeddingBackend, EmbeddingUnavailableError, create_embedding_backend
+
+logger = logging.getLogger(__name__)
+
+# 批量嵌入失败后减小的文本数上限，在连续多少个满批次成功后再放宽
+_EMBED_GROW_AFTER = 16
+
+class EmbeddingClient:
+    """
+    异步批量嵌入客户端
+    
+    每个进程一个实例（见get_embedding_client）：客户端运行在专用的事件循环线程中，
+    API的协程通过embed_many等待结果，工作进程的线程通过embed_many_sync阻塞等待，
+    所有调用方共享同一个嵌入后端和并发上限，同时在途的大量文本不需要对应数量的线程。
+    向量由configs/ollama.yaml中embedding_backend.type选择的后端生成（见backends.base.EmbeddingBackend）。
+    
+    文本按字符预算和文本数上限分组，每组调用一次后端，各组并发执行。
+    字符预算根据批次的吞吐量调整，使每个批次耗时接近target_batch_seconds；
+    批次失败时把该组拆成两半重试，并减小之后批次的字符预算和文本数；单条文本失败时按
+    带随机抖动的指数退避重试。已缓存的文本和同一次调用中重复的文本不再请求。
+    """
+    
+    def __init__(self, config_path: str = "configs/ollama.yaml", backend_type: Optional[str] = None):
+        # 加载配置
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+        
+        # 嵌入后端，backend_type覆盖配置中的embedding_backend.type
+        self.backend: EmbeddingBackend = create_embedding_backend(config_path, backend_type)
+        self.model = self.backend.model_name
+        
+        embedding_settings = config.get("embedding") or {}
+        self.max_concurrency = embedding_settings.get("max_concurrency", 4)
+        self.max_batch_size = embedding_settings.get("max_batch_size", 64)
+        self.min_batch_chars = embedding_settings.get("min_batch_chars", 4000)
+        self.max_batch_chars = embedding_settings.get("max_batch_chars", 64000)
+        self.target_seconds = embedding_settings.get("target_batch_seconds", 2.0)
+        self.truncate_chars = embedding_settings.get("truncate_chars", 8192)
+        self.batch_chars = embedding_settings.get("initial_batch_chars", 16000)
+        self.batch_size = self.max_batch_size
+        self._full_batches = 0
+        
+        # 失败重试设置
+        self.max_retries = embedding_settings.get("max_retries", 5)
+        self.retry_base_delay = embedding_settings.get("retry_base_delay", 0.5)
+        self.retry_max_delay = embedding_settings.get("retry_max_delay", 30.0)
+        self.circuit_max_pause = embedding_settings.get("circuit_max_pause_seconds", 600.0)
+        
+        # 嵌入缓存，与同一进程中的LLM服务共享
+        self.cache = get_embedding_cache(config_path)
+        
+        # 事件循环和信号量在第一次调用时于专用线程中创建
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock = threading.Lock()
+        
+        self.stats = {
+            "requests": 0, "texts": 0, "in_flight": 0, "max_in_flight": 0, "retries": 0
+        }
+    
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """启动运行事件循环的守护线程，并在其中创建信号量"""
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                
+                def run():
+                    asyncio.set_event_loop(loop)
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    ready.set()
+                    loop.run_forever()
+                
+                threading.Thread(target=run, name="embedding-client", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+    
+    async def embed_many(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """
+        批量获取文本的向量嵌入（协程）
+        
+        Args:
+            texts: 文本列表，超过truncate_chars的文本被截断
+            model: 可选的嵌入模型，默认使用配置的嵌入模型
+        
+        Returns:
+            List[List[float]]: 与输入顺序一致的嵌入向量列表
+        """
+        loop = self._ensure_loop()
+        coroutine = self._embed_many(texts, model or self.model)
+        try:
+            if asyncio.get_running_loop() is loop:
+                return await coroutine
+        except RuntimeError:
+            pass
+        # 在客户端自己的事件循环中执行，后端的连接池和信号量只属于该循环
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coroutine, loop))
+    
+    def embed_many_sync(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """embed_many的同步版本，供工作进程的线程使用，不能在客户端的事件循环中调用"""
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self._embed_many(texts, model or self.model), loop).result()
+    
+    async def _embed_many(self, texts: List[str], model: str) -> List[List[float]]:
+        """查找缓存，把未命中的文本分组并发请求"""
+        texts = [text[:self.truncate_chars] for text in texts]
+        
+        cached = await asyncio.to_thread(self.cache.get_many, model, texts)
+        embeddings = [None if vector is None else vector.tolist() for vector in cached]
+        
+        # 未命中的文本按规范化后的内容去重
+        pending: Dict[bytes, List[int]] = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                pending.setdefault(self.cache.cache_key(model, texts[i]), []).append(i)
+        if not pending:
+            return embeddings
+        
+        missing = [texts[positions[0]] for positions in pending.values()]
+        
+        # 不超过并发上限个协程依次从同一个分组迭代器取批次，
+        # 每个批次在取出时才按当前的字符预算和文本数上限划分，拆分重试后的调整对之后的批次立即生效
+        batches = enumerate(self._iter_batches(missing))
+        results: Dict[int, List[List[float]]] = {}
+        
+        async def embed_batches():
+            for index, batch in batches:
+                results[index] = await self._embed_batch(batch, model)
+        
+        await _gather_or_cancel(*(embed_batches() for _ in range(self.max_concurrency)))
+        new_embeddings = [embedding for index in sorted(results) for embedding in results[index]]
+        await asyncio.to_thread(self.cache.put_many, model, missing, new_embeddings)
+        
+        for positions, embedding in zip(pending.values(), new_embeddings):
+            for i in positions:
+                embeddings[i] = embedding
+        return embeddings
+    
+    def _iter_batches(self, texts: List[str]) -> Iterator[List[str]]:
+        """按当前字符预算和文本数上限把文本依次分组"""
+        batch, batch_chars = [], 0
+        for text in texts:
+            if batch and (batch_chars + len(text) > self.batch_chars or len(batch) >= self.batch_size):
+                yield batch
+                batch, batch_chars = [], 0
+            batch.append(text)
+            batch_chars += len(text)
+        if batch:
+            yield batch
+    
+    async def _request_batch(self, batch: List[str], model: str) -> List[List[float]]:
+        """在并发上限内由后端生成一组文本的嵌入，并按耗时调整之后批次的大小"""
+        batch_chars = sum(len(text) for text in batch)
+        async with self._semaphore:
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            start_time = time.perf_counter()
+            try:
+                embeddings = await self.backend.embed_batch(batch, model)
+            finally:
+                self.stats["in_flight"] -= 1
+                self.stats["requests"] += 1
+        if len(embeddings) != len(batch):
+            raise ValueError(f"返回 {len(embeddings)} 个嵌入，请求了 {len(batch)} 个")
+        
+        self._adjust_batch_chars(batch_chars, time.perf_counter() - start_time)
+        if len(batch) >= self.batch_size < self.max_batch_size:
+            # 连续若干个达到文本数上限的批次成功后，逐步放宽上限
+            self._full_batches += 1
+            if self._full_batches >= _EMBED_GROW_AFTER:
+                self._full_batches = 0
+                self.batch_size = min(self.max_batch_size, self.batch_size + max(1, self.batch_size // 4))
+        return embeddings
+    
+    async def _embed_batch(self, batch: List[str], model: str) -> List[List[float]]:
+        """
+        获取一组文本的嵌入
+        
+        失败按后端的classify_error分类处理：
+        - 后端不可用（连接失败、过载）: 整组按指数退避重试，超过circuit_max_pause_seconds后抛出异常
+        - 其他可重试的失败: 拆成两半分别重试，并减小之后批次的字符预算和文本数
+        - 单条文本失败，或返回零向量/NaN: 只重试该文本，按带随机抖动的指数退避最多重试max_retries次
+        
+        不会返回零向量作为替代，仍然失败时抛出异常。
+        """
+        attempt = 0
+        unavailable_since = None
+        while True:
+            try:
+                embeddings = await self._request_batch(batch, model)
+                invalid = [i for i, embedding in enumerate(embeddings) if not is_valid_vector(embedding)]
+                if invalid and len(batch) == 1:
+                    raise ValueError("返回的嵌入为零向量或包含NaN")
+            
+            except Exception as e:
+                kind = self.backend.classify_error(e)
+                if kind is None:
+                    raise
+                if kind == "unavailable":
+                    unavailable_since = unavailable_since or time.monotonic()
+                    if time.monotonic() - unavailable_since > self.circuit_max_pause:
+                        raise EmbeddingUnavailableError(f"嵌入后端不可用超过 {self.circuit_max_pause} 秒: {str(e)}")
+                
+                if kind in ("input", "retry") and len(batch) > 1:
+                    # 批次过大可能导致超时或显存不足，拆成两半重试，之后的批次也减小
+                    self.batch_chars = max(self.min_batch_chars, sum(len(text) for text in batch) // 2)
+                    self.batch_size = max(1, len(batch) // 2)
+                    self._full_batches = 0
+                    logger.warning(f"批量嵌入 {len(batch)} 条文本失败，拆分重试: {str(e)}")
+                    middle = len(batch) // 2
+                    halves = await _gather_or_cancel(
+                        self._embed_batch(batch[:middle], model), self._embed_batch(batch[middle:], model)
+                    )
+                    return halves[0] + halves[1]
+                
+                if kind in ("permanent", "input") or (kind == "retry" and attempt >= self.max_retries):
+                    logger.error(f"获取向量嵌入失败: {str(e)}")
+                    raise Exception(f"生成向量嵌入失败: {str(e)}")
+                
+                delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt) * (0.5 + random.random())
+                attempt += 1
+                self.stats["retries"] += 1
+                logger.warning(f"获取 {len(batch)} 条文本的嵌入失败，{delay:.1f}秒后第 {attempt} 次重试: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            
+            if invalid:
+                # 只重新请求返回零向量或NaN的文本
+                logger.warning(f"批量嵌入中 {len(invalid)} 条文本返回零向量或NaN，单独重试")
+                retried = await _gather_or_cancel(*(self._embed_batch([batch[i]], model) for i in invalid))
+                for i, (embedding,) in zip(invalid, retried):
+                    embeddings[i] = embedding
+            
+            self.stats["texts"] += len(batch)
+            return embeddings
+    
+    def _adjust_batch_chars(self, batch_chars: int, elapsed: float):
+        """按请求的吞吐量调整字符预算，每次最多变为原来的两倍或一半"""
+        if elapsed <= 0 or batch_chars < self.batch_chars // 2:
+            # 文本不足以填满预算的请求不能反映吞吐量
+            return
+        target = batch_chars / elapsed * self.target_seconds
+        target = min(max(target, self.batch_chars / 2), self.batch_chars * 2)
+        self.batch_chars = int(min(max(target, self.min_batch_chars), self.max_batch_chars))
+
+async def _gather_or_cancel(*coroutines) -> List:
+    """
+    并发执行协程并按顺序返回结果；任一协程出错时取消其余协程，再抛出该错误
+
+    asyncio.gather在一个协程出错后不会停止其他协程，永久错误之后它们仍会继续请求后端。
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+def is_valid_vector(vector: List[float]) -> bool:
+    """嵌入向量非空、不全为零且不包含NaN或无穷大"""
+    array = np.asarray(vector, dtype=np.float32)
+    return array.size > 0 and bool(np.isfinite(array).all()) and bool(array.any())
+
+@lru_cache(maxsize=None)
+def get_embedding_client(config_path: str = "configs/ollama.yaml") -> EmbeddingClient:
+    """获取嵌入客户端，同一进程中使用相同配置的调用方共享嵌入后端和并发上限"""
+    return EmbeddingClient(config_path)
@@ -1,4 +1,4 @@
- import os
+import os
 import logging
 import yaml
 from typing import List, Optional, Dict, Any
@@ -20,31 +20,28 @@ def get_llm_service() -> LLMService:
 
 def get_embeddings(texts: List[str]) -> List[List[float]]:
     """
-    获取文本列表的向量嵌入
+    获取文本列表的向量嵌入，文本按批一次请求多条
+    
+    失败的文本由嵌入客户端退避重试，仍然失败时抛出异常，不返回零向量，
+    避免无效向量写入向量存储。
     
     Args:
         texts: 文本列表
         
     Returns:
         List[List[float]]: 嵌入向量列表
+    
+    Raises:
+        Exception: 重试后仍无法获取嵌入
     """
     try:
-        llm_service = get_llm_service()
-        embeddings = []
-        
-        for text in texts:
-            # 截断长文本
-            max_length = 8192  # 大多数嵌入模型的最大输入长度
-            if len(text) > max_length:
-                text = text[:max_length]
-            
-            # 获取嵌入
-            embedding = llm_service.get_embedding(text)
-            embeddings.append(embedding)
-        
-        return embeddings
+        # 按字符预算分组，每组一次/api/embed请求；长文本由LLM服务截断
+        return get_llm_service().get_embeddings(texts)
         
     except Exception as e:
         logger.error(f"获取嵌入向量失败: {str(e)}")
-        # 返回零向量作为回退方案
-        return [[0.0] * 768] * len(texts)  # 假设维度为768
+        raise Exception(f"获取嵌入向量失败: {str(e)}")
+
+def get_embedding_model() -> str:
+    """获取当前嵌入后端使用的模型名，不同模型生成的向量不能混用"""
+    return get_llm_service().embeddings_model
@@ -0,0 +1,224 @@
+"""
+批量导入本地目录中的文档
+
+用法:
+    python -m backend.ingest /path/to/dir --user-id user_001 [--workers 4] [--checkpoint file]
+
+文本提取在提取沙箱（ExtractionSandbox）的子进程中并行执行，每个文件有时间和内存上限，
+超限或使子进程崩溃的文件记为失败，不影响其他文件；提取结果在主进程中分块、批量嵌入并流式写入向量存储。
+每个文件处理完成后写入检查点文件，中断后重新运行会跳过已完成的文件。
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import yaml
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Set, Iterator
+from .processors.base import get_document_processor
+from .services.file_storage import hash_file_object
+from .services.document_service import DocumentService
+from .services.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+class Checkpoint:
+    """按行追加的导入进度文件，记录每个已处理文件的结果"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: Set[str] = set()
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 中断时可能留下不完整的最后一行
+                        continue
+                    if record.get("status") == "done":
+                        self.completed.add(record["path"])
+
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, path: str, status: str, **fields):
+        """记录一个文件的处理结果并立即落盘"""
+        self._file.write(json.dumps({"path": path, "status": status, **fields}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if status == "done":
+            self.completed.add(path)
+
+    def close(self):
+        self._file.close()
+
+class BulkIngestor:
+    """批量导入器"""
+
+    def __init__(self, document_service: DocumentService, user_id: str,
+                 workers: int, checkpoint: Checkpoint, report_interval: int = 50):
+        self.document_service = document_service
+        self.user_id = user_id
+        self.workers = workers
+        self.checkpoint = checkpoint
+        self.report_interval = report_interval
+
+        self.stats = {"documents": 0, "chunks": 0, "skipped": 0, "errors": 0}
+        self.start_time = None
+
+        # 每个提取线程占用一个沙箱子进程
+        self.sandbox = document_service.extraction_sandbox
+        self.sandbox.max_workers = workers
+
+    def _extract_file(self, path: str) -> Dict[str, Any]:
+        """
+        在沙箱子进程中提取单个文件的文本和元数据，相同内容已提取过时读取提取缓存
+
+        超出时间或内存限制、或子进程崩溃时抛出ExtractionLimitExceeded，沙箱换上新的子进程；
+        沙箱未启用时在提取线程中直接提取。
+        """
+        ext = os.path.splitext(path)[1].lower()
+        with open(path, "rb") as file:
+            file_info = hash_file_object(file)
+            processor = self.sandbox.wrap(get_document_processor(ext))
+            metadata = {}
+            text = "".join(self.document_service.extraction_cache.iter_extract(
+                file_info["file_hash"], processor, file, metadata
+            ))
+
+        return {"path": path, "text": text, "metadata": metadata, **file_info}
+
+    def find_files(self, root: str) -> Iterator[str]:
+        """遍历目录，返回支持格式且尚未完成的文件"""
+        supported = set(self.document_service.supported_formats)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                path = os.path.abspath(os.path.join(dirpath, filename))
+                if os.path.splitext(filename)[1].lower() not in supported:
+                    continue
+                if path in self.checkpoint.completed:
+                    self.stats["skipped"] += 1
+                    continue
+                yield path
+
+    def run(self, root: str) -> Dict[str, Any]:
+        """
+        导入目录中的全部文档
+
+        Returns:
+            Dict[str, Any]: 导入统计信息
+        """
+        self.start_time = time.time()
+        files = self.find_files(root)
+
+        # 限制在途的提取任务数，避免提取结果堆积在内存中；
+        # 提取线程只等待沙箱子进程，每个文件的失败由其future单独报告
+        max_in_flight = self.workers * 2
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-extract") as executor:
+            in_flight = {}
+
+            def submit_next() -> bool:
+                path = next(files, None)
+                if path is None:
+                    return False
+                in_flight[executor.submit(self._extract_file, path)] = path
+                return True
+
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    self._index_result(path, future)
+                    submit_next()
+
+        self.sandbox.shutdown()
+        self.checkpoint.close()
+        return self.report(final=True)
+
+    def _index_result(self, path: str, future):
+        """索引一个文件的提取结果并记录检查点"""
+        try:
+            result = future.result()
+            doc_metadata = self.document_service.ingest_text(
+                filename=os.path.basename(path),
+                user_id=self.user_id,
+                text=result["text"],
+                extracted_metadata=result["metadata"],
+                file_hash=result["file_hash"],
+                file_size=result["file_size"],
+                metadata={"source_path": path}
+            )
+
+            self.stats["documents"] += 1
+            self.stats["chunks"] += doc_metadata.get("chunks_count", 0)
+            self.checkpoint.record(path, "done", document_id=doc_metadata["id"],
+                                   chunks=doc_metadata.get("chunks_count", 0))
+
+        except Exception as e:
+            logger.error(f"导入文件 {path} 失败: {str(e)}")
+            self.stats["errors"] += 1
+            self.checkpoint.record(path, "error", error=str(e))
+
+        processed = self.stats["documents"] + self.stats["errors"]
+        if processed % self.report_interval == 0:
+            self.report()
+
+    def report(self, final: bool = False) -> Dict[str, Any]:
+        """输出导入吞吐量"""
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        report = {
+            **self.stats,
+            "elapsed_seconds": round(elapsed, 2),
+            "docs_per_second": round(self.stats["documents"] / elapsed, 2),
+            "chunks_per_second": round(self.stats["chunks"] / elapsed, 2),
+        }
+
+        logger.info(
+            f"{'导入完成' if final else '导入进度'}: 文档 {report['documents']}, 块 {report['chunks']}, "
+            f"跳过 {report['skipped']}, 失败 {report['errors']}, "
+            f"{report['docs_per_second']} 文档/秒, {report['chunks_per_second']} 块/秒"
+        )
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导入本地目录中的文档")
+    parser.add_argument("directory", help="要导入的目录")
+    parser.add_argument("--user-id", required=True, help="文档所属的用户ID")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="文本提取进程数")
+    parser.add_argument("--checkpoint", default=None,
+                        help="检查点文件路径，默认为目录下的 .ingest_checkpoint.jsonl")
+    args = parser.parse_args()
+
+    config_path = os.getenv("WORKER_CONFIG_PATH", "configs/worker.yaml")
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    logging.basicConfig(
+        level=getattr(logging, config["worker"]["log_level"].upper()),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    if not os.path.isdir(args.directory):
+        logger.error(f"目录不存在: {args.directory}")
+        sys.exit(1)
+
+    checkpoint_path = args.checkpoint or os.path.join(args.directory, ".ingest_checkpoint.jsonl")
+
+    vector_store = VectorStore(os.getenv("QDRANT_CONFIG_PATH", "configs/qdrant.yaml"))
+    document_service = DocumentService(
+        vector_store,
+        config_path=config_path,
+        redis_config_path=os.getenv("REDIS_CONFIG_PATH", "configs/redis.yaml")
+    )
+
+    ingestor = BulkIngestor(document_service, args.user_id, args.workers, Checkpoint(checkpoint_path))
+    ingestor.run(args.directory)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,53 @@
 import os
+import json
+import time
+import hashlib
 import logging
+import importlib
+import threading
+import yaml
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Tuple, List, Optional, BinaryIO, Type
+from functools import lru_cache
+from typing import Dict, Any, Tuple, List, Optional, BinaryIO, Type, Iterator
 
 logger = logging.getLogger(__name__)
 
+# 结构化分段的类型
+SECTION_PAGE = "page"
+SECTION_HEADING = "heading"
+SECTION_PARAGRAPH = "paragraph"
+SECTION_TABLE = "table"
+
 class DocumentProcessor(ABC):
-    """文档处理器基类，定义处理接口"""
+    """
+    文档处理器基类，定义处理接口
+    
+    处理器实现_iter_sections，按文档顺序逐个产出结构化分段（字典）:
+    
+    - type: page / heading / paragraph / table
+    - text: 分段文本；表格为markdown格式的表格行
+    - page: 页码（page分段，以及其他分段所在的页，没有页的格式为None）
+    - level: 标题级别（heading分段）
+    - title: 表格标题，如"表格 1"、"工作表: Sheet1"（table分段）
+    
+    iter_sections在此基础上补充offset和length，即分段经render_section序列化后
+    在完整文本中的字符偏移和长度。内存占用只与单个分段的大小有关。
+    """
+    
+    # 处理器版本，提取结果的格式变化时递增，使旧的提取缓存不再命中
+    version = "1"
+    
+    @property
+    def name(self) -> str:
+        """处理器名称，用于提取缓存键"""
+        return type(self).__name__
+    
+    @property
+    def cache_version(self) -> str:
+        """提取缓存使用的版本：处理器版本加上实例配置的摘要，配置变化时同样不再命中旧缓存"""
+        settings = json.dumps(vars(self), sort_keys=True, default=str)
+        return f"{self.version}-{hashlib.sha1(settings.encode('utf-8')).hexdigest()[:8]}"
     
-    @abstractmethod
     def process(self, file: BinaryIO) -> Tuple[str, Dict[str, Any]]:
         """
         处理文档文件
@@ -19,11 +58,116 @@ class DocumentProcessor(ABC):
         Returns:
             Tuple[str, Dict[str, Any]]: 提取的文本和元数据
         """
+        metadata = {}
+        extracted_text = "".join(render_section(section) for section in self.iter_sections(file, metadata))
+        return extracted_text, metadata
+    
+    def iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        按文档顺序逐个提取结构化分段，供流水线在提取尚未完成时即开始分块和嵌入
+        
+        Args:
+            file: 文件对象
+            metadata: 提取的元数据会写入此字典（生成器结束时完整）
+            
+        Yields:
+            Dict[str, Any]: 分段，包含type、text、offset、length及类型相关字段
+        """
+        offset = 0
+        for section in self._iter_sections(file, metadata):
+            length = len(render_section(section))
+            section["offset"] = offset
+            section["length"] = length
+            offset += length
+            yield section
+    
+    @abstractmethod
+    def _iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """按文档顺序产出分段（不含offset和length）"""
         pass
+    
+    @staticmethod
+    def _get_file_path(file: BinaryIO) -> Optional[str]:
+        """
+        如果文件对象对应磁盘上的真实文件，返回其路径
+        
+        处理器可以直接打开该路径，而不必再把内容复制到临时文件中。
+        """
+        path = getattr(file, "name", None)
+        if isinstance(path, str) and os.path.isfile(path):
+            return path
+        return None
+
+def render_section(section: Dict[str, Any]) -> str:
+    """
+    把分段序列化为送入分块器的文本
+    
+    页和表格带有分块器识别的结构标记（--- 页 N ---、--- 表格 N ---、--- 工作表: X ---），
+    标题使用markdown标题格式。
+    """
+    section_type = section["type"]
+    text = section["text"]
+    
+    if section_type == SECTION_PAGE:
+        return f"\n--- 页 {section['page']} ---\n{text}\n"
+    if section_type == SECTION_HEADING:
+        return f"{'#' * section.get('level', 1)} {text}\n\n"
+    if section_type == SECTION_TABLE:
+        return f"\n--- {section['title']} ---\n{text}\n"
+    return f"{text}\n\n"
+
+def format_table(rows: List[List[str]]) -> str:
+    """把表格行格式化为markdown表格，第一行作为表头"""
+    lines = []
+    for i, row in enumerate(rows):
+        lines.append("| " + " | ".join(cell.replace("\n", " ") for cell in row) + " |")
+        if i == 0:
+            lines.append("|" + "---|" * len(row))
+    return "\n".join(lines) + "\n"
 
-# 存储注册的处理器
+@lru_cache(maxsize=None)
+def get_processor_settings(name: str) -> Dict[str, Any]:
+    """
+    读取工作进程配置中 document_processing.processors.<name> 的处理器设置
+    
+    配置文件不存在或未配置该处理器时返回空字典，处理器使用默认值。
+    """
+    config_path = os.getenv("WORKER_CONFIG_PATH", "configs/worker.yaml")
+    if not os.path.exists(config_path):
+        return {}
+    
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+    
+    processors = (config.get("document_processing") or {}).get("processors") or {}
+    return processors.get(name) or {}
+
+# 内置处理器：扩展名 -> "模块:类"，模块在第一次遇到该格式时才导入，
+# 从不处理某种格式的进程不需要承担其依赖（如pandas、fitz）的导入时间
+PROCESSOR_ENTRIES: Dict[str, str] = {
+    ".pdf": "pdf_processor:PDFProcessor",
+    ".docx": "docx_processor:DocxProcessor",
+    ".doc": "docx_processor:DocxProcessor",
+    ".xlsx": "excel_processor:ExcelProcessor",
+    ".xls": "excel_processor:ExcelProcessor",
+    ".html": "html_processor:HtmlProcessor",
+    ".htm": "html_processor:HtmlProcessor",
+    ".txt": "text_processor:TextProcessor",
+    ".md": "text_processor:MarkdownProcessor",
+    ".pptx": "pptx_processor:PptxProcessor",
+}
+
+# 已加载的处理器类（模块导入时由register_processor登记）
 _PROCESSORS: Dict[str, Type[DocumentProcessor]] = {}
 
+# 处理器实例缓存，处理器不保存单次处理的状态，可在线程间共享
+_INSTANCES: Dict[str, DocumentProcessor] = {}
+
+# 各处理器模块的导入耗时（秒）
+_IMPORT_SECONDS: Dict[str, float] = {}
+
+_registry_lock = threading.Lock()
+
 def register_processor(extensions: List[str]):
     """文档处理器注册装饰器"""
     def decorator(processor_class: Type[DocumentProcessor]):
@@ -32,10 +176,51 @@ def register_processor(extensions: List[str]):
         return processor_class
     return decorator
 
+def register_processor_entry(extensions: List[str], target: str):
+    """
+    登记延迟加载的处理器
+    
+    Args:
+        extensions: 文件扩展名列表（包含点）
+        target: "模块:类"，模块名可以是本包内的相对名称或完整的模块路径
+    """
+    with _registry_lock:
+        for ext in extensions:
+            ext = ext.lower()
+            PROCESSOR_ENTRIES[ext] = target
+            _PROCESSORS.pop(ext, None)
+            _INSTANCES.pop(ext, None)
+
+def has_processor(extension: str) -> bool:
+    """是否有适用于该扩展名的处理器（不导入处理器模块）"""
+    ext = extension.lower()
+    return ext in _PROCESSORS or ext in PROCESSOR_ENTRIES
+
+def _load_processor_class(ext: str) -> Type[DocumentProcessor]:
+    """导入扩展名对应的处理器模块并返回处理器类，调用方需持有_registry_lock"""
+    if ext in _PROCESSORS:
+        return _PROCESSORS[ext]
+    if ext not in PROCESSOR_ENTRIES:
+        raise ValueError(f"未找到支持的处理器: {ext}")
+    
+    module_name, class_name = PROCESSOR_ENTRIES[ext].split(":")
+    start_time = time.perf_counter()
+    module = importlib.import_module(module_name if "." in module_name else f"{__package__}.{module_name}")
+    if module_name not in _IMPORT_SECONDS:
+        # 同一模块可能对应多个扩展名，只记录第一次导入的耗时
+        _IMPORT_SECONDS[module_name] = time.perf_counter() - start_time
+        logger.info(f"加载处理器模块 {module_name}，导入耗时 {_IMPORT_SECONDS[module_name] * 1000:.0f}ms")
+    
+    processor_class = getattr(module, class_name)
+    _PROCESSORS[ext] = processor_class
+    return processor_class
+
 def get_document_processor(extension: str) -> DocumentProcessor:
     """
     根据文件扩展名获取适当的处理器
     
+    处理器模块在第一次请求该格式时导入，处理器实例按扩展名缓存复用。
+    
     Args:
         extension: 文件扩展名（包含点，如'.pdf'）
         
@@ -46,8 +231,24 @@ def get_document_processor(extension: str) -> DocumentProcessor:
         ValueError: 如果找不到适用于该扩展名的处理器
     """
     ext = extension.lower()
-    if ext not in _PROCESSORS:
-        raise ValueError(f"未找到支持的处理器: {ext}")
+    processor = _INSTANCES.get(ext)
+    if processor is not None:
+        return processor
     
-    # 实例化处理器
-    return _PROCESSORS[ext]() 
+    with _registry_lock:
+        if ext not in _INSTANCES:
+            _INSTANCES[ext] = _load_processor_class(ext)()
+        return _INSTANCES[ext]
+
+def get_processor_stats() -> Dict[str, Any]:
+    """
+    处理器注册表状态
+    
+    Returns:
+        Dict[str, Any]: 已登记的扩展名、已加载的扩展名和各处理器模块的导入耗时（毫秒）
+    """
+    return {
+        "registered": sorted(set(PROCESSOR_ENTRIES) | set(_PROCESSORS)),
+        "loaded": sorted(_INSTANCES),
+        "import_ms": {module: round(seconds * 1000, 1) for module, seconds in _IMPORT_SECONDS.items()},
+    }
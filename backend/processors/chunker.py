@@ -0,0 +1,265 @@
+import re
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 句子边界：中英文句末标点（含其后的右引号/括号）、ASCII句点后跟空白、换行
+_BOUNDARY_RE = re.compile(r'[。！？；!?;…]+[”’」』）)"\']*|\.(?=\s)|\n+')
+
+# 处理器输出的结构标记：页码、表格和工作表
+_MARKER_RE = re.compile(r'--- (?:页 (\d+)|表格 \d+|工作表: [^\n]*?) ---')
+
+# 内容锚点：句末标点或换行之后（其后不再是句末标点或右引号/括号），由断点前_ANCHOR_WINDOW个字符的哈希决定
+_ANCHOR_END_CHARS = "。！？；!?;…\n"
+_ANCHOR_CLOSE_CHARS = "”’」』）)\"'"
+_ANCHOR_WINDOW = 16
+
+# 每次处理缓冲区所需的最少字符数，避免分段很小时反复扫描同一段文本
+_MIN_BUFFER_CHARS = 64 * 1024
+
+class TextChunker:
+    """
+    线性时间的文本分块器
+
+    - 按块大小定位每块的最远结束位置后，只在其前面的一小段窗口内用正则查找最近的
+      句子断点（包括 `。！？；` 和换行），整体为线性时间，不再逐字符回看
+    - 处理器输出的 `--- 页 N ---`、`--- 表格 N ---`、`--- 工作表: X ---` 标记作为结构断点：
+      当前块已达到一定大小时在标记处结束，重叠不跨越结构断点，块元数据记录起止页码
+    - 块大小可以按字符数或按估算的token数计算
+    - 可选的内容锚点：块达到最小填充后，在第一个内容哈希满足条件的断点处结束。
+      局部修改只影响附近的块，之后的分块位置会在下一个锚点处与修改前重新对齐，
+      增量重新索引时未修改部分的块保持不变
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 size_unit: str = "chars", min_fill: float = 0.5, anchor_interval: int = 0):
+        """
+        Args:
+            chunk_size: 块大小上限
+            chunk_overlap: 相邻块的重叠大小
+            size_unit: 大小单位，"chars"（字符）或"tokens"（估算token数）
+            min_fill: 在结构标记或内容锚点处提前结束一块所需达到的最小填充比例
+            anchor_interval: 平均每多少个句子断点出现一个内容锚点，0表示不使用锚点
+        """
+        if size_unit not in ("chars", "tokens"):
+            raise ValueError(f"不支持的分块单位: {size_unit}")
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap必须小于chunk_size")
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.size_unit = size_unit
+        self.min_fill = int(chunk_size * min_fill)
+        self.anchor_interval = anchor_interval
+
+    def chunk(self, text: str, doc_id: str) -> List[Dict[str, Any]]:
+        """将完整文本分成块"""
+        return list(self.iter_chunks([text], doc_id))
+
+    def iter_chunks(self, segments: Iterable[str], doc_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        将逐段到达的文本分成块
+
+        缓冲区中只保留尚未确定分块的文本；块的起止位置是相对完整文本的偏移量。
+
+        Args:
+            segments: 文本片段，按顺序拼接即为完整文本
+            doc_id: 文档ID
+
+        Yields:
+            Dict[str, Any]: 文本块
+        """
+        state = {"buffer": "", "base": 0, "page": None, "ordinal": 0}
+        # 按token计算时缓冲区需要更多字符才能容纳若干块
+        min_buffer = max(_MIN_BUFFER_CHARS, self.chunk_size * (16 if self.size_unit == "tokens" else 4))
+
+        pending = []
+        pending_len = 0
+        for segment in segments:
+            pending.append(segment)
+            pending_len += len(segment)
+            if pending_len >= min_buffer:
+                state["buffer"] += "".join(pending)
+                pending, pending_len = [], 0
+                yield from self._split(state, doc_id, final=False)
+
+        state["buffer"] += "".join(pending)
+        yield from self._split(state, doc_id, final=True)
+
+    def _split(self, state: Dict[str, Any], doc_id: str, final: bool) -> Iterator[Dict[str, Any]]:
+        """对缓冲区分块，未到齐的尾部文本留在缓冲区中"""
+        text = state["buffer"]
+        length = len(text)
+        if not length:
+            return
+
+        # 按token计算时，用前缀和在大小与字符位置之间换算
+        if self.size_unit == "tokens":
+            cumulative = count_tokens_cumulative(text)
+            weight = lambda pos: int(cumulative[pos])
+            position = lambda w: int(np.searchsorted(cumulative, w, side="right")) - 1
+        else:
+            weight = position = lambda x: x
+
+        # 结构标记位置及页码，用于提前结束一块和确定每块的起止页
+        markers = [(m.start(), int(m.group(1)) if m.group(1) else None)
+                   for m in _MARKER_RE.finditer(text)]
+        marker_positions = [pos for pos, _ in markers]
+        page_positions = [pos for pos, page in markers if page is not None]
+        page_numbers = [page for _, page in markers if page is not None]
+
+        def page_at(pos: int, inclusive: bool) -> Optional[int]:
+            i = (bisect_right if inclusive else bisect_left)(page_positions, pos) - 1
+            return page_numbers[i] if i >= 0 else state["page"]
+
+        # 整个缓冲区的内容锚点一次找出
+        anchors = find_anchors(text, self.anchor_interval) if self.anchor_interval else []
+
+        start = 0
+        while start < length:
+            # 不超过块大小的最远位置
+            limit = position(weight(start) + self.chunk_size)
+
+            if limit >= length:
+                # 缓冲区还不足以决定本块的结束位置，等待更多文本
+                if not final:
+                    break
+                end = length
+            else:
+                end = None
+                if self.anchor_interval:
+                    # 最小填充之后的第一个锚点
+                    a = bisect_left(anchors, max(position(weight(start) + self.min_fill), start + 1))
+                    if a < len(anchors) and anchors[a] <= limit:
+                        end = anchors[a]
+                if end is None:
+                    # 在该位置之前找最近的句子断点，没有断点时强制切分
+                    end = self._last_boundary(text, start, limit) or max(limit, start + 1)
+
+            # 块内出现结构标记且已达到最小填充时，在标记处结束
+            structural = False
+            m = bisect_right(marker_positions, start)
+            while m < len(marker_positions) and marker_positions[m] < end:
+                if weight(marker_positions[m]) - weight(start) >= self.min_fill:
+                    end = marker_positions[m]
+                    structural = True
+                    break
+                m += 1
+
+            chunk_text = text[start:end]
+            content_start = start + len(chunk_text) - len(chunk_text.lstrip())
+            if content_start < end:
+                yield {
+                    "chunk_id": f"{doc_id}_{state['ordinal']}",
+                    "document_id": doc_id,
+                    "text": chunk_text,
+                    "start_char": state["base"] + start,
+                    "end_char": state["base"] + end,
+                    "length": len(chunk_text),
+                    "page_start": page_at(content_start, inclusive=True),
+                    "page_end": page_at(end, inclusive=False),
+                }
+                state["ordinal"] += 1
+
+            if end >= length:
+                start = length
+                break
+
+            # 下一块从重叠范围内的第一个断点开始，重叠不跨越结构断点
+            next_start = end
+            if not structural and self.chunk_overlap > 0:
+                overlap_start = max(position(weight(end) - self.chunk_overlap), start + 1)
+                match = _BOUNDARY_RE.search(text, overlap_start, end)
+                if match and match.end() < end:
+                    next_start = match.end()
+            start = next_start
+
+        # 丢弃已分块的文本，保留的尾部从下一块的起点开始
+        state["page"] = page_at(start, inclusive=True)
+        state["buffer"] = text[start:]
+        state["base"] += start
+
+    def _last_boundary(self, text: str, start: int, limit: int) -> Optional[int]:
+        """
+        查找(start, limit]范围内最后一个句子断点的结束位置
+
+        从limit开始向前逐步扩大窗口查找，通常只需扫描块末尾的一小段文本。
+        """
+        window = 128
+        while True:
+            lo = max(start + 1, limit - window)
+            last = None
+            for match in _BOUNDARY_RE.finditer(text, lo, limit):
+                last = match.end()
+            if last is not None or lo == start + 1:
+                return last
+            window *= 4
+
+def count_tokens_cumulative(text: str) -> np.ndarray:
+    """
+    用NumPy一次性估算token数的前缀和
+
+    每个汉字（及其他CJK字符）计为一个token，连续的字母数字计为一个token，
+    其他非空白字符各计为一个token。返回长度为len(text)+1的数组，
+    result[i]为text[:i]中的token数。
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+    is_space = (codes == 32) | ((codes >= 9) & (codes <= 13)) | (codes == 0x3000)
+    is_word = ((codes >= 48) & (codes <= 57)) | ((codes >= 65) & (codes <= 90)) | \
+              ((codes >= 97) & (codes <= 122)) | (codes == 95)
+
+    # 连续字母数字只在开头计数
+    word_start = is_word.copy()
+    word_start[1:] &= ~is_word[:-1]
+
+    token_start = word_start | (~is_word & ~is_space)
+
+    cumulative = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(token_start, out=cumulative[1:])
+    return cumulative
+
+# 锚点判断用的字符类别（码点查找表）
+_ANCHOR_END, _ANCHOR_CLOSE, _ANCHOR_DOT, _ANCHOR_SPACE = 1, 2, 3, 4
+_ANCHOR_CLASSES = np.zeros(0x110000, dtype=np.uint8)
+_ANCHOR_CLASSES[[ord(c) for c in " \t\r\x0b\x0c"]] = _ANCHOR_SPACE
+_ANCHOR_CLASSES[ord(".")] = _ANCHOR_DOT
+_ANCHOR_CLASSES[[ord(c) for c in _ANCHOR_CLOSE_CHARS]] = _ANCHOR_CLOSE
+_ANCHOR_CLASSES[[ord(c) for c in _ANCHOR_END_CHARS]] = _ANCHOR_END
+
+def find_anchors(text: str, interval: int) -> List[int]:
+    """
+    用NumPy一次性找出文本中的内容锚点位置
+
+    候选位置是句末标点或换行之后（后面紧跟的仍是句末标点或右引号/括号时不算）、ASCII句点后跟空白处，
+    对候选位置前_ANCHOR_WINDOW个字符计算多项式哈希，哈希能被interval整除的为锚点。
+    锚点只取决于附近的文本，与块的起始位置无关；平均每interval个候选位置出现一个锚点。
+    只对整个文本查一次字符类别表，之后的计算都只在稀疏的候选位置上进行。
+
+    Returns:
+        List[int]: 升序的锚点位置（锚点之前的字符属于前一块）
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    if len(codes) <= _ANCHOR_WINDOW:
+        return []
+
+    classes = _ANCHOR_CLASSES.take(codes)
+    # 候选字符之后的位置，不含文本末尾（之后的字符还未到达）和窗口不完整的开头
+    positions = np.flatnonzero((classes[_ANCHOR_WINDOW - 1:-1] == _ANCHOR_END) |
+                               (classes[_ANCHOR_WINDOW - 1:-1] == _ANCHOR_DOT)) + _ANCHOR_WINDOW
+    previous, following = classes[positions - 1], classes[positions]
+    positions = positions[
+        ((previous == _ANCHOR_END) & (following != _ANCHOR_END) & (following != _ANCHOR_CLOSE)) |
+        ((previous == _ANCHOR_DOT) & (following == _ANCHOR_SPACE))
+    ]
+
+    # 候选位置之前窗口内字符的多项式哈希（uint32自然溢出），再乘以奇数常数打散低位
+    hashes = np.zeros(len(positions), dtype=np.uint32)
+    for k in range(_ANCHOR_WINDOW, 0, -1):
+        hashes = hashes * np.uint32(1000003) + codes[positions - k]
+    hashes = (hashes * np.uint32(0x9E3779B1)) >> np.uint32(16)
+
+    return positions[hashes % np.uint32(interval) == 0].tolist()
@@ -1,113 +1,381 @@
 import os
 import logging
-from typing import Dict, Any, Tuple, List, Optional, BinaryIO
-import tempfile
+import posixpath
+import zipfile
+from datetime import datetime
+from typing import Dict, Any, Tuple, List, Optional, BinaryIO, Iterator
 import docx
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from lxml import etree
 import re
-from .base import DocumentProcessor, register_processor
+from .base import DocumentProcessor, register_processor, get_processor_settings, format_table, \
+    SECTION_HEADING, SECTION_PARAGRAPH, SECTION_TABLE
 
 logger = logging.getLogger(__name__)
 
+# 标题样式名，如"Heading 1"，"Title"视为一级标题
+_HEADING_STYLE_RE = re.compile(r'^(?:Heading|标题)\s*(\d)$')
+
+# WordprocessingML命名空间和常用标签
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W = "{%s}" % _W_NS
+_W_BODY = _W + "body"
+_W_P = _W + "p"
+_W_TBL = _W + "tbl"
+_W_SECTPR = _W + "sectPr"
+_W_R = _W + "r"
+_W_T = _W + "t"
+_W_BR = _W + "br"
+_W_HYPERLINK = _W + "hyperlink"
+_W_TR = _W + "tr"
+_W_TC = _W + "tc"
+_W_TCPR = _W + "tcPr"
+_W_GRID_SPAN = _W + "gridSpan"
+_W_VMERGE = _W + "vMerge"
+_W_GRID_BEFORE_PATH = f"{_W}trPr/{_W}gridBefore"
+_W_VAL = _W + "val"
+_W_TYPE = _W + "type"
+_W_STYLE_ID = _W + "styleId"
+
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_REL_OFFICE_DOCUMENT = "/officeDocument"
+_REL_CORE_PROPERTIES = "/core-properties"
+_REL_STYLES = "/styles"
+
+# 段落内容中各元素对应的文本，与python-docx的Run.text一致
+_RUN_TEXT = {
+    _W + "tab": "\t",
+    _W + "ptab": "\t",
+    _W + "cr": "\n",
+    _W + "noBreakHyphen": "-",
+}
+
+# docProps/core.xml中的字段，对应python-docx的core_properties
+_CORE_PROPERTIES = {
+    "title": "{http://purl.org/dc/elements/1.1/}title",
+    "author": "{http://purl.org/dc/elements/1.1/}creator",
+    "comments": "{http://purl.org/dc/elements/1.1/}description",
+    "keywords": "{http://schemas.openxmlformats.org/package/2006/metadata/core-properties}keywords",
+    "subject": "{http://purl.org/dc/elements/1.1/}subject",
+    "last_modified_by": "{http://schemas.openxmlformats.org/package/2006/metadata/core-properties}lastModifiedBy",
+    "created": "{http://purl.org/dc/terms/}created",
+    "modified": "{http://purl.org/dc/terms/}modified",
+}
+
+class _FastPathUnavailable(Exception):
+    """文档结构不适用于直接解析XML，改用python-docx"""
+
 @register_processor(extensions=['.docx', '.doc'])
 class DocxProcessor(DocumentProcessor):
-    """Word文档处理器"""
+    """
+    Word文档处理器
+    
+    默认直接从zip包中流式解析word/document.xml（lxml iterparse），不创建临时文件，
+    也不构建python-docx对象模型，正文的每个顶层元素处理完即释放。
+    文档包结构不标准（找不到主文档部件或不是WordprocessingML命名空间）时回退到python-docx。
+    """
+    
+    def __init__(self):
+        settings = get_processor_settings("docx")
+        self.fast_path = settings.get("fast_path", True)
     
-    def process(self, file: BinaryIO) -> Tuple[str, Dict[str, Any]]:
+    def _iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
         """
-        处理Word文件，提取文本和元数据
+        按正文顺序提取Word文档的标题、段落和表格
         
         Args:
             file: Word文件对象
-            
-        Returns:
-            Tuple[str, Dict[str, Any]]: 提取的文本和元数据
-        """
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as tmp:
-            # 写入数据
-            tmp.write(file.read())
-            file.seek(0)  # 重置文件指针
-            tmp_path = tmp.name
+            metadata: 提取的元数据会写入此字典
         
+        Yields:
+            Dict[str, Any]: heading、paragraph或table分段
+        """
         try:
-            # 打开Word文档
-            doc = docx.Document(tmp_path)
-            
-            # 提取元数据
-            core_properties = doc.core_properties
-            metadata = {
-                "title": core_properties.title if hasattr(core_properties, 'title') else "",
-                "author": core_properties.author if hasattr(core_properties, 'author') else "",
-                "comments": core_properties.comments if hasattr(core_properties, 'comments') else "",
-                "keywords": core_properties.keywords if hasattr(core_properties, 'keywords') else "",
-                "subject": core_properties.subject if hasattr(core_properties, 'subject') else "",
-                "last_modified_by": core_properties.last_modified_by if hasattr(core_properties, 'last_modified_by') else "",
-                "created": str(core_properties.created) if hasattr(core_properties, 'created') else "",
-                "modified": str(core_properties.modified) if hasattr(core_properties, 'modified') else "",
-                "paragraph_count": len(doc.paragraphs),
-                "section_count": len(doc.sections),
-            }
+            source = self._get_file_path(file) or file
             
-            # 提取文本
-            extracted_text = ""
+            if self.fast_path:
+                try:
+                    package = zipfile.ZipFile(source)
+                    parts = self._resolve_parts(package)
+                except (zipfile.BadZipFile, _FastPathUnavailable) as e:
+                    logger.info(f"无法直接解析Word文档XML，改用python-docx: {str(e)}")
+                    if hasattr(source, "seek"):
+                        source.seek(0)
+                else:
+                    with package:
+                        yield from self._iter_sections_xml(package, parts, metadata)
+                    return
             
-            # 提取标题
-            if doc.paragraphs and doc.paragraphs[0].style.name.startswith('Heading'):
-                metadata["document_title"] = doc.paragraphs[0].text
-            
-            # 提取段落
-            for para in doc.paragraphs:
-                # 添加段落文本
-                if para.text.strip():
-                    extracted_text += para.text + "\n\n"
-            
-            # 提取表格内容
-            table_count = 0
-            for table in doc.tables:
-                table_count += 1
-                extracted_text += f"\n--- 表格 {table_count} ---\n"
+            yield from self._iter_sections_docx(source, metadata)
+        
+        except Exception as e:
+            logger.error(f"处理Word文档时出错: {str(e)}")
+            raise Exception(f"Word文档处理失败: {str(e)}")
+    
+    def _resolve_parts(self, package: zipfile.ZipFile) -> Dict[str, Optional[str]]:
+        """
+        根据关系文件找到主文档、样式和核心属性部件在zip包中的路径
+        
+        Raises:
+            _FastPathUnavailable: 找不到主文档部件或主文档不是WordprocessingML
+        """
+        names = set(package.namelist())
+        package_rels = self._read_relationships(package, "_rels/.rels", "")
+        document_part = package_rels.get(_REL_OFFICE_DOCUMENT)
+        if document_part not in names:
+            raise _FastPathUnavailable("找不到主文档部件")
+        
+        # Strict OOXML等使用其他命名空间的文档交给python-docx处理
+        with package.open(document_part) as f:
+            if _W_NS.encode("ascii") not in f.read(4096):
+                raise _FastPathUnavailable("主文档不是WordprocessingML")
+        
+        document_dir = posixpath.dirname(document_part)
+        document_rels = self._read_relationships(
+            package,
+            posixpath.join(document_dir, "_rels", posixpath.basename(document_part) + ".rels"),
+            document_dir
+        )
+        
+        return {
+            "document": document_part,
+            "styles": document_rels.get(_REL_STYLES) if document_rels.get(_REL_STYLES) in names else None,
+            "core": package_rels.get(_REL_CORE_PROPERTIES) if package_rels.get(_REL_CORE_PROPERTIES) in names else None,
+        }
+    
+    def _read_relationships(self, package: zipfile.ZipFile, rels_path: str, base_dir: str) -> Dict[str, str]:
+        """读取关系文件，返回关系类型后缀到目标部件路径的映射"""
+        try:
+            root = etree.fromstring(package.read(rels_path))
+        except KeyError:
+            return {}
+        
+        relationships = {}
+        for rel in root.iter(_REL_NS + "Relationship"):
+            if rel.get("TargetMode") == "External":
+                continue
+            rel_type = rel.get("Type", "")
+            target = rel.get("Target", "")
+            target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base_dir, target))
+            relationships[rel_type[rel_type.rfind("/"):]] = target
+        return relationships
+    
+    def _iter_sections_xml(self, package: zipfile.ZipFile, parts: Dict[str, Optional[str]],
+                           metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """流式解析主文档XML，产出与python-docx路径相同的分段"""
+        metadata.update(self._read_core_properties(package, parts["core"]))
+        heading_styles = self._read_heading_styles(package, parts["styles"])
+        
+        paragraph_count = 0
+        table_count = 0
+        section_count = 0
+        
+        with package.open(parts["document"]) as f:
+            for _, element in etree.iterparse(f, events=("end",), tag=(_W_P, _W_TBL, _W_SECTPR)):
+                if element.tag == _W_SECTPR:
+                    section_count += 1
                 
-                for i, row in enumerate(table.rows):
-                    if i == 0:
-                        # 表头
-                        extracted_text += "| "
-                        for cell in row.cells:
-                            extracted_text += cell.text + " | "
-                        extracted_text += "\n"
-                        extracted_text += "|" + "---|" * len(row.cells) + "\n"
-                    else:
-                        # 表体
-                        extracted_text += "| "
-                        for cell in row.cells:
-                            extracted_text += cell.text + " | "
-                        extracted_text += "\n"
+                parent = element.getparent()
+                if parent is None or parent.tag != _W_BODY:
+                    # 表格中的段落在表格结束时一起处理
+                    continue
                 
-                extracted_text += "\n"
-            
-            metadata["table_count"] = table_count
+                if element.tag == _W_P:
+                    paragraph_count += 1
+                    text = self._clean_text(self._paragraph_text(element))
+                    if text:
+                        level = heading_styles.get(self._paragraph_style(element))
+                        if level:
+                            # 第一段为标题时作为文档标题
+                            if paragraph_count == 1:
+                                metadata["document_title"] = text
+                            yield {"type": SECTION_HEADING, "level": level, "text": text, "page": None}
+                        else:
+                            yield {"type": SECTION_PARAGRAPH, "text": text, "page": None}
+                
+                elif element.tag == _W_TBL:
+                    table_count += 1
+                    rows = self._table_rows(element)
+                    if rows:
+                        yield {"type": SECTION_TABLE, "title": f"表格 {table_count}",
+                               "text": format_table(rows), "page": None}
+                
+                # 释放已处理的正文元素
+                element.clear()
+                while element.getprevious() is not None:
+                    del parent[0]
+        
+        metadata["section_count"] = section_count
+        metadata["paragraph_count"] = paragraph_count
+        metadata["table_count"] = table_count
+    
+    def _read_core_properties(self, package: zipfile.ZipFile, core_part: Optional[str]) -> Dict[str, str]:
+        """读取docProps/core.xml中的文档属性"""
+        properties = {key: "" for key in _CORE_PROPERTIES}
+        properties["created"] = properties["modified"] = "None"
+        if not core_part:
+            return properties
+        
+        root = etree.fromstring(package.read(core_part))
+        for key, tag in _CORE_PROPERTIES.items():
+            element = root.find(tag)
+            if element is None or not element.text:
+                continue
+            value = element.text.strip()
+            if key in ("created", "modified"):
+                # 与python-docx一致，日期序列化为str(datetime)
+                try:
+                    value = str(datetime.fromisoformat(value))
+                except ValueError:
+                    pass
+            properties[key] = value
+        return properties
+    
+    def _read_heading_styles(self, package: zipfile.ZipFile, styles_part: Optional[str]) -> Dict[str, int]:
+        """读取样式表，返回标题样式ID到标题级别的映射"""
+        if not styles_part:
+            return {}
+        
+        heading_styles = {}
+        root = etree.fromstring(package.read(styles_part))
+        for style in root.iter(_W + "style"):
+            name_element = style.find(_W + "name")
+            if name_element is None:
+                continue
+            level = self._style_level(name_element.get(_W_VAL, ""))
+            if level:
+                heading_styles[style.get(_W_STYLE_ID)] = level
+                # 没有pStyle的段落使用默认段落样式
+                if style.get(_W + "type") == "paragraph" and style.get(_W + "default") in ("1", "true", "on"):
+                    heading_styles[None] = level
+        return heading_styles
+    
+    def _paragraph_style(self, paragraph: etree._Element) -> Optional[str]:
+        """段落样式ID"""
+        style = paragraph.find(f"{_W}pPr/{_W}pStyle")
+        return style.get(_W_VAL) if style is not None else None
+    
+    def _paragraph_text(self, paragraph: etree._Element) -> str:
+        """段落文本，只包含段落直接包含的run和超链接中的run，与python-docx的Paragraph.text一致"""
+        parts = []
+        for child in paragraph:
+            if child.tag == _W_R:
+                runs = (child,)
+            elif child.tag == _W_HYPERLINK:
+                runs = child.iterchildren(_W_R)
+            else:
+                continue
             
-            # 清理文本
-            extracted_text = self._clean_text(extracted_text)
+            for run in runs:
+                for item in run:
+                    if item.tag == _W_T:
+                        parts.append(item.text or "")
+                    elif item.tag == _W_BR:
+                        parts.append("\n" if item.get(_W_TYPE, "textWrapping") == "textWrapping" else "")
+                    else:
+                        parts.append(_RUN_TEXT.get(item.tag, ""))
+        return "".join(parts)
+    
+    def _table_rows(self, table: etree._Element) -> List[List[str]]:
+        """
+        表格各行的单元格文本
+        
+        与python-docx的row.cells一致：横向合并的单元格按跨越的列数重复，
+        纵向合并的后续单元格取合并起始单元格的文本，嵌套表格不计入单元格文本。
+        """
+        rows = []
+        previous = {}
+        for tr in table.iterchildren(_W_TR):
+            grid_before = tr.find(_W_GRID_BEFORE_PATH)
+            offset = int(grid_before.get(_W_VAL, 0)) if grid_before is not None else 0
             
-            return extracted_text, metadata
+            cells = []
+            current = {}
+            for tc in tr.iterchildren(_W_TC):
+                # 一次遍历单元格的子元素，同时读取单元格属性和段落
+                span, merged, texts = 1, False, []
+                for child in tc:
+                    if child.tag == _W_P:
+                        texts.append(self._paragraph_text(child))
+                    elif child.tag == _W_TCPR:
+                        for prop in child:
+                            if prop.tag == _W_GRID_SPAN:
+                                span = int(prop.get(_W_VAL, 1))
+                            elif prop.tag == _W_VMERGE:
+                                merged = prop.get(_W_VAL, "continue") == "continue"
+                
+                text = previous.get(offset, "") if merged else self._clean_text("\n".join(texts))
+                cells.extend([text] * span)
+                current[offset] = text
+                offset += span
             
-        except Exception as e:
-            logger.error(f"处理Word文档时出错: {str(e)}")
-            raise Exception(f"Word文档处理失败: {str(e)}")
-        finally:
-            # 清理临时文件
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
+            rows.append(cells)
+            previous = current
+        return rows
     
-    def _clean_text(self, text: str) -> str:
-        """清理提取的文本"""
-        # 删除多余的空格
-        text = re.sub(r'\s+', ' ', text)
+    def _iter_sections_docx(self, source: Any, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """使用python-docx对象模型提取（回退路径）"""
+        # 打开Word文档（python-docx可直接读取文件对象，无需临时文件）
+        doc = docx.Document(source)
         
-        # 删除多余的换行符
-        text = re.sub(r'\n\s*\n', '\n\n', text)
+        # 提取元数据
+        core_properties = doc.core_properties
+        metadata.update({
+            "title": core_properties.title if hasattr(core_properties, 'title') else "",
+            "author": core_properties.author if hasattr(core_properties, 'author') else "",
+            "comments": core_properties.comments if hasattr(core_properties, 'comments') else "",
+            "keywords": core_properties.keywords if hasattr(core_properties, 'keywords') else "",
+            "subject": core_properties.subject if hasattr(core_properties, 'subject') else "",
+            "last_modified_by": core_properties.last_modified_by if hasattr(core_properties, 'last_modified_by') else "",
+            "created": str(core_properties.created) if hasattr(core_properties, 'created') else "",
+            "modified": str(core_properties.modified) if hasattr(core_properties, 'modified') else "",
+            "section_count": len(doc.sections),
+        })
         
-        # 保持段落结构
-        text = re.sub(r'(\w) *\n *(\w)', r'\1 \2', text)
+        paragraph_count = 0
+        table_count = 0
         
-        return text 
+        # 按正文中的顺序遍历段落和表格
+        for element in doc.element.body.iterchildren():
+            if element.tag.endswith('}p'):
+                paragraph = Paragraph(element, doc)
+                paragraph_count += 1
+                text = self._clean_text(paragraph.text)
+                if not text:
+                    continue
+                
+                level = self._heading_level(paragraph)
+                if level:
+                    # 第一段为标题时作为文档标题
+                    if paragraph_count == 1:
+                        metadata["document_title"] = text
+                    yield {"type": SECTION_HEADING, "level": level, "text": text, "page": None}
+                else:
+                    yield {"type": SECTION_PARAGRAPH, "text": text, "page": None}
+            
+            elif element.tag.endswith('}tbl'):
+                table = Table(element, doc)
+                table_count += 1
+                rows = [[self._clean_text(cell.text) for cell in row.cells] for row in table.rows]
+                if rows:
+                    yield {"type": SECTION_TABLE, "title": f"表格 {table_count}",
+                           "text": format_table(rows), "page": None}
+        
+        metadata["paragraph_count"] = paragraph_count
+        metadata["table_count"] = table_count
+    
+    def _heading_level(self, paragraph: Paragraph) -> Optional[int]:
+        """根据段落样式判断标题级别，不是标题时返回None"""
+        return self._style_level(paragraph.style.name if paragraph.style is not None else "")
+    
+    def _style_level(self, style_name: str) -> Optional[int]:
+        """根据样式名判断标题级别，不是标题时返回None"""
+        if style_name.lower() == "title":
+            return 1
+        match = _HEADING_STYLE_RE.match(style_name[:1].upper() + style_name[1:])
+        return int(match.group(1)) if match else None
+    
+    def _clean_text(self, text: str) -> str:
+        """清理提取的文本：合并段落内连续的空白字符"""
+        return " ".join(text.split())
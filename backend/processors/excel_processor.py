@@ -1,82 +1,192 @@
 import os
 import logging
-from typing import Dict, Any, Tuple, List, Optional, BinaryIO
-import tempfile
+import zipfile
+from datetime import datetime
+from typing import Dict, Any, Tuple, List, Optional, BinaryIO, Iterator, Iterable
+import openpyxl
 import pandas as pd
-from .base import DocumentProcessor, register_processor
+from .base import DocumentProcessor, register_processor, get_processor_settings, SECTION_TABLE
 
 logger = logging.getLogger(__name__)
 
+# 每次按列格式化的行数
+_ROW_BLOCK_SIZE = 512
+
+def _format_cell(value: Any) -> str:
+    """把单元格的值格式化为表格文本"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value.replace("\n", " ").replace("|", "\\|")
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return ""
+        return str(int(value)) if value.is_integer() else str(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+def _format_rows(rows: List[tuple], width: int) -> List[str]:
+    """
+    按列批量格式化一组行，返回markdown表格行
+    
+    先把行转置为列，每列用一次map完成格式化，再按行拼接，避免逐单元格的分支和字符串累加。
+    """
+    columns = zip(*(row[:width] if len(row) >= width else row + (None,) * (width - len(row)) for row in rows))
+    formatted = [list(map(_format_cell, column)) for column in columns]
+    return ["| " + " | ".join(cells) + " |" for cells in zip(*formatted)]
+
 @register_processor(extensions=['.xlsx', '.xls'])
 class ExcelProcessor(DocumentProcessor):
-    """Excel文档处理器"""
+    """
+    Excel文档处理器
+    
+    .xlsx使用openpyxl只读模式逐行流式读取，内存占用与工作簿大小无关；每个工作表按字符数
+    切分为若干行组分段，每个行组重复表头，使每个文本块不依赖上下文也能读懂。
+    每个工作表读取的行数和单元格数有上限，超出部分不再读取并在元数据中标记。
+    """
     
-    def process(self, file: BinaryIO) -> Tuple[str, Dict[str, Any]]:
+    def __init__(self):
+        settings = get_processor_settings("excel")
+        self.section_max_chars = settings.get("section_max_chars", 900)
+        self.max_rows_per_sheet = settings.get("max_rows_per_sheet", 100000)
+        self.max_cells_per_sheet = settings.get("max_cells_per_sheet", 2000000)
+    
+    def _iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
         """
-        处理Excel文件，提取文本和元数据
+        逐个工作表提取Excel表格，每个工作表产出若干重复表头的行组table分段
         
         Args:
             file: Excel文件对象
-            
-        Returns:
-            Tuple[str, Dict[str, Any]]: 提取的文本和元数据
-        """
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as tmp:
-            # 写入数据
-            tmp.write(file.read())
-            file.seek(0)  # 重置文件指针
-            tmp_path = tmp.name
+            metadata: 提取的元数据会写入此字典
         
+        Yields:
+            Dict[str, Any]: table分段
+        """
         try:
-            # 使用pandas读取Excel文件
-            excel_file = pd.ExcelFile(tmp_path)
-            sheet_names = excel_file.sheet_names
+            source = self._get_file_path(file) or file
+            try:
+                workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+            except (zipfile.BadZipFile, openpyxl.utils.exceptions.InvalidFileException):
+                # 旧版.xls不是zip格式，交给pandas读取
+                if hasattr(source, "seek"):
+                    source.seek(0)
+                yield from self._iter_sections_pandas(source, metadata)
+                return
             
-            # 提取元数据
-            metadata = {
-                "sheet_count": len(sheet_names),
-                "sheet_names": sheet_names,
-                "file_path": tmp_path,
-            }
-            
-            # 提取文本
-            extracted_text = ""
-            
-            # 遍历所有工作表
-            for sheet_index, sheet_name in enumerate(sheet_names):
-                df = pd.read_excel(excel_file, sheet_name=sheet_name)
-                
-                # 添加工作表标题
-                extracted_text += f"\n--- 工作表: {sheet_name} ---\n\n"
-                
-                # 处理列名（表头）
-                header_row = "| " + " | ".join(str(col) for col in df.columns) + " |\n"
-                separator = "|" + "---|" * len(df.columns) + "\n"
-                extracted_text += header_row + separator
+            try:
+                sheet_names = workbook.sheetnames
+                metadata.update({
+                    "sheet_count": len(sheet_names),
+                    "sheet_names": sheet_names,
+                })
                 
-                # 处理数据行
-                for _, row in df.iterrows():
-                    row_text = "| " + " | ".join(str(cell) if str(cell) != "nan" else "" for cell in row) + " |\n"
-                    extracted_text += row_text
-                
-                extracted_text += "\n"
-                
-                # 添加工作表级元数据
-                metadata[f"sheet_{sheet_index}_rows"] = len(df)
-                metadata[f"sheet_{sheet_index}_columns"] = len(df.columns)
-            
-            # 统计总行数和列数
-            total_cells = sum(metadata.get(f"sheet_{i}_rows", 0) * metadata.get(f"sheet_{i}_columns", 0) 
-                             for i in range(len(sheet_names)))
-            metadata["total_cells"] = total_cells
-            
-            return extracted_text, metadata
-            
+                sheets = ((name, workbook[name].iter_rows(values_only=True)) for name in sheet_names)
+                yield from self._iter_workbook(sheets, metadata)
+            finally:
+                workbook.close()
+        
         except Exception as e:
             logger.error(f"处理Excel文件时出错: {str(e)}")
             raise Exception(f"Excel处理失败: {str(e)}")
-        finally:
-            # 清理临时文件
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
\ No newline at end of file
+    
+    def _iter_sections_pandas(self, source: Any, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """使用pandas读取旧版.xls工作簿"""
+        excel_file = pd.ExcelFile(source)
+        sheet_names = excel_file.sheet_names
+        metadata.update({
+            "sheet_count": len(sheet_names),
+            "sheet_names": sheet_names,
+        })
+        
+        def sheet_rows(sheet_name: str) -> Iterator[tuple]:
+            df = pd.read_excel(excel_file, sheet_name=sheet_name, header=None, nrows=self.max_rows_per_sheet + 1)
+            # pandas用NaN表示空单元格，转换为None，与openpyxl的读取结果一致
+            df = df.astype(object).where(pd.notna(df), None)
+            return df.itertuples(index=False, name=None)
+        
+        yield from self._iter_workbook(((name, sheet_rows(name)) for name in sheet_names), metadata)
+    
+    def _iter_workbook(self, sheets: Iterable[Tuple[str, Iterator[tuple]]],
+                       metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """把每个工作表的行流切分为行组分段，并统计工作表级元数据"""
+        total_cells = 0
+        for sheet_index, (sheet_name, rows) in enumerate(sheets):
+            stats = {"rows": 0, "columns": 0, "truncated": False}
+            yield from self._iter_sheet(sheet_name, rows, stats)
+            
+            # 添加工作表级元数据
+            metadata[f"sheet_{sheet_index}_rows"] = stats["rows"]
+            metadata[f"sheet_{sheet_index}_columns"] = stats["columns"]
+            if stats["truncated"]:
+                metadata[f"sheet_{sheet_index}_truncated"] = True
+            total_cells += stats["rows"] * stats["columns"]
+        
+        # 统计总单元格数
+        metadata["total_cells"] = total_cells
+    
+    def _iter_sheet(self, sheet_name: str, rows: Iterator[tuple],
+                    stats: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """按字符数把一个工作表的数据行切分为重复表头的行组分段"""
+        # 第一行非空行作为表头，去掉尾部的空列
+        header = None
+        for row in rows:
+            if any(value is not None for value in row):
+                header = list(row)
+                break
+        if header is None:
+            return
+        while header and header[-1] is None:
+            header.pop()
+        width = len(header)
+        if not width:
+            return
+        stats["columns"] = width
+        
+        header_text = "\n".join([
+            "| " + " | ".join(_format_cell(value) or f"列{i + 1}" for i, value in enumerate(header)) + " |",
+            "|" + "---|" * width,
+        ])
+        max_rows = min(self.max_rows_per_sheet, self.max_cells_per_sheet // width)
+        
+        group, group_chars, group_start = [], len(header_text), 1
+        
+        def emit(lines: List[str], start: int) -> Dict[str, Any]:
+            return {
+                "type": SECTION_TABLE,
+                "title": f"工作表: {sheet_name} (行 {start}-{start + len(lines) - 1})",
+                "text": header_text + "\n" + "\n".join(lines) + "\n",
+                "page": None,
+            }
+        
+        for line in self._iter_lines(rows, width, max_rows, stats):
+            if group and group_chars + len(line) + 1 > self.section_max_chars:
+                yield emit(group, group_start)
+                group_start += len(group)
+                group, group_chars = [], len(header_text)
+            group.append(line)
+            group_chars += len(line) + 1
+        if group:
+            yield emit(group, group_start)
+        
+        if stats["truncated"]:
+            logger.warning(f"工作表 {sheet_name} 超出读取上限，只读取了前 {stats['rows']} 行")
+    
+    def _iter_lines(self, rows: Iterator[tuple], width: int, max_rows: int,
+                    stats: Dict[str, Any]) -> Iterator[str]:
+        """逐块读取数据行并按列格式化，跳过空行，超出读取上限时停止"""
+        block = []
+        for row in rows:
+            if stats["rows"] >= max_rows:
+                stats["truncated"] = True
+                break
+            if all(value is None for value in row):
+                continue
+            block.append(row)
+            stats["rows"] += 1
+            if len(block) >= _ROW_BLOCK_SIZE:
+                yield from _format_rows(block, width)
+                block = []
+        
+        if block:
+            yield from _format_rows(block, width)
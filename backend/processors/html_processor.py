@@ -1,98 +1,225 @@
 import os
 import logging
-from typing import Dict, Any, Tuple, List, Optional, BinaryIO
-import tempfile
-from bs4 import BeautifulSoup
-import re
-from .base import DocumentProcessor, register_processor
+from collections import Counter
+from typing import Dict, Any, Tuple, List, Optional, BinaryIO, Iterator, Callable
+from bs4 import BeautifulSoup, Tag, NavigableString
+from bs4.element import PreformattedString
+from .base import DocumentProcessor, register_processor, get_processor_settings, format_table, \
+    SECTION_HEADING, SECTION_PARAGRAPH, SECTION_TABLE
+
+try:
+    import lxml.html
+except ImportError:  # lxml为可选依赖，未安装时使用BeautifulSoup的html.parser
+    lxml = None
 
 logger = logging.getLogger(__name__)
 
+# 不包含正文的元素
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+
+_HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# 块级元素，开始和结束时结束当前段落
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "header", "footer", "nav", "aside",
+    "blockquote", "pre", "figure", "figcaption", "form", "fieldset", "dl", "dt", "dd",
+    "address", "details", "summary", "hr", "body", "html", "head"
+}
+
+# 元数据中统计数量的元素
+_COUNTED_TAGS = {
+    "links_count": "a",
+    "images_count": "img",
+    "tables_count": "table",
+    "scripts_count": "script",
+    "styles_count": "style",
+}
+
+# 从meta标签读取的元数据
+_META_NAMES = ("description", "keywords", "author")
+
+def _normalize(text: str) -> str:
+    """合并连续的空白字符"""
+    return " ".join(text.split())
+
+def _lxml_children(node: Any) -> Iterator[Tuple[Optional[str], Any]]:
+    """lxml元素的子节点：文本为(None, 文本)，元素为(标签名, 元素)"""
+    if node.text:
+        yield None, node.text
+    for child in node:
+        # 注释和处理指令的tag不是字符串，只保留其后的文本
+        if isinstance(child.tag, str):
+            yield child.tag, child
+        if child.tail:
+            yield None, child.tail
+
+def _soup_children(node: Any) -> Iterator[Tuple[Optional[str], Any]]:
+    """BeautifulSoup节点的子节点，跳过注释、文档类型声明等"""
+    for child in node.children:
+        if isinstance(child, Tag):
+            yield child.name, child
+        elif isinstance(child, NavigableString) and not isinstance(child, PreformattedString):
+            yield None, str(child)
+
 @register_processor(extensions=['.html', '.htm'])
 class HtmlProcessor(DocumentProcessor):
-    """HTML文档处理器"""
+    """
+    HTML文档处理器
+    
+    解析后对DOM做一次深度优先遍历，同时产出markdown结构的分段（标题、段落、列表项、表格）
+    和元数据（标题、meta信息、各类元素数量），耗时与文档大小成线性关系。
+    安装了lxml时使用lxml.html解析，否则使用BeautifulSoup的html.parser。
+    """
     
-    def process(self, file: BinaryIO) -> Tuple[str, Dict[str, Any]]:
+    def __init__(self):
+        settings = get_processor_settings("html")
+        self.parser = settings.get("parser", "lxml")
+    
+    def _iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
         """
-        处理HTML文件，提取文本和元数据
+        按文档顺序提取HTML的标题、段落和表格
         
         Args:
             file: HTML文件对象
-            
-        Returns:
-            Tuple[str, Dict[str, Any]]: 提取的文本和元数据
+            metadata: 提取的元数据会写入此字典
+        
+        Yields:
+            Dict[str, Any]: heading、paragraph或table分段
         """
         # 读取文件内容
         content = file.read().decode('utf-8', errors='replace')
         
         try:
-            # 使用BeautifulSoup解析HTML
-            soup = BeautifulSoup(content, 'html.parser')
+            root, children = self._parse(content)
             
-            # 提取元数据
-            metadata = {
-                "title": self._get_title(soup),
-                "description": self._get_meta_content(soup, "description"),
-                "keywords": self._get_meta_content(soup, "keywords"),
-                "author": self._get_meta_content(soup, "author"),
-                "links_count": len(soup.find_all('a')),
-                "images_count": len(soup.find_all('img')),
-                "tables_count": len(soup.find_all('table')),
-                "scripts_count": len(soup.find_all('script')),
-                "styles_count": len(soup.find_all('style')),
-            }
+            info = {"title": "", **{name: "" for name in _META_NAMES}}
+            counts = Counter()
+            sections = self._walk(root, children, info, counts) if root is not None else []
             
-            # 提取并清理文本
-            extracted_text = self._extract_text(soup)
-            
-            return extracted_text, metadata
+            # 元数据在遍历中收集
+            metadata.update(info)
+            metadata.update({key: counts[tag] for key, tag in _COUNTED_TAGS.items()})
             
+            yield from sections
+        
         except Exception as e:
             logger.error(f"处理HTML文件时出错: {str(e)}")
             raise Exception(f"HTML处理失败: {str(e)}")
     
-    def _get_title(self, soup: BeautifulSoup) -> str:
-        """获取HTML标题"""
-        title_tag = soup.find('title')
-        return title_tag.get_text() if title_tag else ""
-    
-    def _get_meta_content(self, soup: BeautifulSoup, meta_name: str) -> str:
-        """获取指定名称的meta标签内容"""
-        meta_tag = soup.find('meta', attrs={'name': meta_name})
-        if meta_tag and meta_tag.get('content'):
-            return meta_tag.get('content')
-        return ""
+    def _parse(self, content: str) -> Tuple[Any, Callable[[Any], Iterator[Tuple[Optional[str], Any]]]]:
+        """解析HTML，返回根节点和对应解析器的子节点遍历函数；文档为空时根节点为None"""
+        if self.parser == "lxml" and lxml is not None:
+            if not content.strip():
+                return None, _lxml_children
+            # 以字节解析，避免带编码声明的文档被lxml拒绝
+            parser = lxml.html.HTMLParser(encoding="utf-8")
+            return lxml.html.document_fromstring(content.encode("utf-8"), parser=parser), _lxml_children
+        
+        return BeautifulSoup(content, 'html.parser'), _soup_children
     
-    def _extract_text(self, soup: BeautifulSoup) -> str:
-        """提取并清理HTML文本内容"""
-        # 删除脚本和样式标签
-        for script_or_style in soup(["script", "style"]):
-            script_or_style.decompose()
+    def _walk(self, root: Any, children: Callable[[Any], Iterator[Tuple[Optional[str], Any]]],
+              info: Dict[str, str], counts: Counter) -> List[Dict[str, Any]]:
+        """
+        深度优先遍历DOM，块级元素结束当前段落，标题和表格各自成为分段
+        
+        每个元素只经过一次children，元素数量和元数据在同一次遍历中收集。
+        遍历函数不是生成器，分段直接追加到列表，嵌套深度不影响每个分段的代价。
+        """
+        inline_text = []
+        sections = []
+        table_count = 0
         
-        # 提取文本
-        text = soup.get_text()
+        def element_children(node: Any) -> Iterator[Tuple[Optional[str], Any]]:
+            for name, child in children(node):
+                if name is not None:
+                    counts[name] += 1
+                yield name, child
         
-        # 处理标题
-        for heading in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            heading_level = int(heading.name[1])
-            heading_text = heading.get_text().strip()
-            text = text.replace(heading_text, f"\n{'#' * heading_level} {heading_text}\n")
+        def flush():
+            text = _normalize("".join(inline_text))
+            inline_text.clear()
+            if text:
+                sections.append({"type": SECTION_PARAGRAPH, "text": text, "page": None})
         
-        # 处理列表
-        for ul in soup.find_all('ul'):
-            for li in ul.find_all('li'):
-                li_text = li.get_text().strip()
-                text = text.replace(li_text, f"- {li_text}")
+        def collect_text(node: Any, parts: List[str]):
+            """收集元素内的全部文本（相当于get_text(" ")），同样统计元素数量"""
+            for name, child in element_children(node):
+                if name is None:
+                    parts.append(child)
+                elif name not in _SKIP_TAGS:
+                    parts.append(" ")
+                    collect_text(child, parts)
+                    parts.append(" ")
         
-        # 处理有序列表
-        for ol in soup.find_all('ol'):
-            for i, li in enumerate(ol.find_all('li')):
-                li_text = li.get_text().strip()
-                text = text.replace(li_text, f"{i+1}. {li_text}")
+        def table_rows(node: Any, rows: List[List[str]]):
+            """收集表格中各行的th/td文本，thead、tbody等包装元素逐层展开"""
+            for name, child in element_children(node):
+                if name == "tr":
+                    cells = []
+                    for cell_name, cell in element_children(child):
+                        if cell_name in ("th", "td"):
+                            parts = []
+                            collect_text(cell, parts)
+                            cells.append(_normalize("".join(parts)))
+                        elif cell_name is not None and cell_name not in _SKIP_TAGS:
+                            collect_text(cell, [])
+                    if cells:
+                        rows.append(cells)
+                elif name is not None and name not in _SKIP_TAGS:
+                    table_rows(child, rows)
         
-        # 清理空白
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
+        def visit(node: Any, list_tag: Optional[str] = None):
+            nonlocal table_count
+            item_number = 0
+            for name, child in element_children(node):
+                if name is None:
+                    inline_text.append(child)
+                elif name in _SKIP_TAGS:
+                    continue
+                elif name == "title":
+                    parts = []
+                    collect_text(child, parts)
+                    if not info["title"]:
+                        info["title"] = _normalize("".join(parts))
+                elif name == "meta":
+                    meta_name = child.get("name")
+                    if meta_name in _META_NAMES and not info[meta_name] and child.get("content"):
+                        info[meta_name] = child.get("content")
+                elif name in _HEADING_TAGS:
+                    flush()
+                    parts = []
+                    collect_text(child, parts)
+                    text = _normalize("".join(parts))
+                    if text:
+                        sections.append({"type": SECTION_HEADING, "level": int(name[1]), "text": text, "page": None})
+                elif name == "table":
+                    flush()
+                    rows = []
+                    table_rows(child, rows)
+                    if rows:
+                        table_count += 1
+                        sections.append({"type": SECTION_TABLE, "title": f"表格 {table_count}",
+                                        "text": format_table(rows), "page": None})
+                elif name == "li":
+                    # 列表项前加项目符号，有序列表按序号编号
+                    flush()
+                    item_number += 1
+                    inline_text.append(f"{item_number}. " if list_tag == "ol" else "- ")
+                    visit(child)
+                    flush()
+                elif name in ("ul", "ol"):
+                    flush()
+                    visit(child, name)
+                    flush()
+                elif name in _BLOCK_TAGS:
+                    flush()
+                    visit(child)
+                    flush()
+                elif name == "br":
+                    inline_text.append(" ")
+                else:
+                    visit(child)
         
-        return text
\ No newline at end of file
+        visit(root)
+        flush()
+        return sections
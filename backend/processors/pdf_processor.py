@@ -1,40 +1,93 @@
 import os
 import logging
-from typing import Dict, Any, Tuple, List, Optional, BinaryIO
-import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Tuple, List, Optional, BinaryIO, Iterator, Union
 import fitz  # PyMuPDF
 import re
-from .base import DocumentProcessor, register_processor
+from .base import DocumentProcessor, register_processor, SECTION_PAGE
 
 logger = logging.getLogger(__name__)
 
+# 页数达到此值时按页范围在进程池中并行提取
+PARALLEL_PAGE_THRESHOLD = 64
+
+# 每个并行任务提取的页数
+PAGES_PER_TASK = 16
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# 进程池中每个工作进程打开一次的PDF文档
+_worker_doc = None
+
+def _init_worker(source: Union[str, bytes]):
+    """工作进程初始化：按路径或从内存打开PDF"""
+    global _worker_doc
+    _worker_doc = _open_document(source)
+
+def _extract_page_range(start: int, stop: int) -> Tuple[List[str], int]:
+    """在工作进程中提取一段页面"""
+    return _extract_pages(_worker_doc, start, stop)
+
+def _open_document(source: Union[str, bytes]) -> fitz.Document:
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def _extract_pages(doc: fitz.Document, start: int, stop: int) -> Tuple[List[str], int]:
+    """
+    一次遍历提取页面文本和图像数量
+
+    Returns:
+        Tuple[List[str], int]: 各页清理后的文本和这些页面中的图像数量
+    """
+    texts = []
+    image_count = 0
+    for page_num in range(start, stop):
+        page = doc[page_num]
+        texts.append(_clean_text(page.get_text()))
+        image_count += len(page.get_images(full=True))
+    return texts, image_count
+
+def _clean_text(text: str) -> str:
+    """清理提取的文本：合并连续的空白字符"""
+    return _WHITESPACE_RE.sub(' ', text)
+
 @register_processor(extensions=['.pdf'])
 class PDFProcessor(DocumentProcessor):
-    """PDF文档处理器"""
+    """
+    PDF文档处理器
+    
+    磁盘文件按路径打开，其他文件对象从内存打开，不复制临时文件。页数达到
+    PARALLEL_PAGE_THRESHOLD时把页范围分配给进程池并行提取，各页的文本和图像数量
+    在同一次遍历中取得，结果按页序产出。
+    """
     
-    def process(self, file: BinaryIO) -> Tuple[str, Dict[str, Any]]:
+    # 并行提取的最大进程数，None表示CPU核数
+    max_workers: Optional[int] = None
+    
+    def _iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
         """
-        处理PDF文件，提取文本和元数据
+        逐页提取PDF文本，每页产出一个page分段
         
         Args:
             file: PDF文件对象
+            metadata: 提取的元数据会写入此字典
             
-        Returns:
-            Tuple[str, Dict[str, Any]]: 提取的文本和元数据
+        Yields:
+            Dict[str, Any]: page分段
         """
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
-            # 写入数据
-            tmp.write(file.read())
-            file.seek(0)  # 重置文件指针
-            tmp_path = tmp.name
-        
         try:
-            # 打开PDF文档
-            doc = fitz.open(tmp_path)
+            # 打开PDF文档，磁盘文件直接按路径打开，避免复制临时文件
+            source = self._get_file_path(file)
+            if source is None:
+                source = file.read()
+                file.seek(0)  # 重置文件指针
+            doc = _open_document(source)
+            page_count = len(doc)
             
             # 提取元数据
-            metadata = {
+            metadata.update({
                 "title": doc.metadata.get("title", ""),
                 "author": doc.metadata.get("author", ""),
                 "subject": doc.metadata.get("subject", ""),
@@ -43,63 +96,66 @@ class PDFProcessor(DocumentProcessor):
                 "producer": doc.metadata.get("producer", ""),
                 "creation_date": doc.metadata.get("creationDate", ""),
                 "modification_date": doc.metadata.get("modDate", ""),
-                "page_count": len(doc),
-            }
-            
-            # 提取文本
-            extracted_text = ""
-            for page_num, page in enumerate(doc):
-                # 获取页面文本
-                page_text = page.get_text()
-                
-                # 清理文本
-                page_text = self._clean_text(page_text)
-                
-                # 添加页码标记
-                extracted_text += f"\n--- 页 {page_num + 1} ---\n{page_text}\n"
+                "page_count": page_count,
+            })
             
             # 提取目录（TOC）
             toc = doc.get_toc()
             if toc:
-                toc_data = []
-                for level, title, page in toc:
-                    toc_data.append({
-                        "level": level,
-                        "title": title,
-                        "page": page
-                    })
-                metadata["toc"] = toc_data
+                metadata["toc"] = [
+                    {"level": level, "title": title, "page": page}
+                    for level, title, page in toc
+                ]
             
-            # 处理图像
+            # 逐页提取文本，同时统计图像
             image_count = 0
-            for page_num, page in enumerate(doc):
-                image_list = page.get_images(full=True)
-                image_count += len(image_list)
+            page_num = 0
+            workers = self._parallel_workers(page_count)
+            if workers > 1:
+                doc.close()
+                ranges = self._extract_parallel(source, page_count, workers)
+            else:
+                ranges = (_extract_pages(doc, start, start + 1) for start in range(page_count))
             
-            metadata["image_count"] = image_count
+            for texts, page_images in ranges:
+                image_count += page_images
+                for text in texts:
+                    page_num += 1
+                    yield {"type": SECTION_PAGE, "page": page_num, "text": text}
+            
+            if not doc.is_closed:
+                doc.close()
             
-            return extracted_text, metadata
+            metadata["image_count"] = image_count
             
         except Exception as e:
             logger.error(f"处理PDF时出错: {str(e)}")
             raise Exception(f"PDF处理失败: {str(e)}")
-        finally:
-            # 清理临时文件
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
     
-    def _clean_text(self, text: str) -> str:
-        """清理提取的文本"""
-        # 删除多余的空格
-        text = re.sub(r'\s+', ' ', text)
-        
-        # 删除多余的换行符
-        text = re.sub(r'\n\s*\n', '\n\n', text)
+    def _parallel_workers(self, page_count: int) -> int:
+        """确定并行提取的进程数，返回1表示在当前进程中逐页提取"""
+        if page_count < PARALLEL_PAGE_THRESHOLD:
+            return 1
         
-        # 删除页眉页脚（假设出现在每页的前几行和后几行）
-        lines = text.split('\n')
-        if len(lines) > 6:
-            # 保留中间部分，去掉可能的页眉页脚
-            text = '\n'.join(lines)
+        # 守护进程不能创建子进程；提取沙箱和批量导入的子进程不是守护进程，可以并行提取
+        if multiprocessing.current_process().daemon:
+            return 1
         
-        return text 
+        max_workers = self.max_workers or os.cpu_count() or 1
+        return max(1, min(max_workers, (page_count + PAGES_PER_TASK - 1) // PAGES_PER_TASK))
+    
+    def _extract_parallel(self, source: Union[str, bytes], page_count: int,
+                          workers: int) -> Iterator[Tuple[List[str], int]]:
+        """把页范围分配给进程池，按页序产出各范围的提取结果"""
+        # 每个工作进程只在初始化时接收一次文档路径或内容
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(source,))
+        try:
+            futures = [
+                executor.submit(_extract_page_range, start, min(start + PAGES_PER_TASK, page_count))
+                for start in range(0, page_count, PAGES_PER_TASK)
+            ]
+            for future in futures:
+                yield future.result()
+        finally:
+            # 下游出错提前停止时取消尚未开始的页范围
+            executor.shutdown(wait=True, cancel_futures=True)
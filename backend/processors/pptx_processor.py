@@ -0,0 +1,206 @@
+import os
+import logging
+import posixpath
+import zipfile
+from typing import Dict, Any, Tuple, List, Optional, BinaryIO, Iterator
+from lxml import etree
+from .base import DocumentProcessor, register_processor, format_table, SECTION_PAGE
+
+logger = logging.getLogger(__name__)
+
+# PresentationML/DrawingML命名空间和常用标签
+_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_REL_OFFICE_DOCUMENT = "/officeDocument"
+_REL_NOTES_SLIDE = "/notesSlide"
+_REL_CORE_PROPERTIES = "/core-properties"
+
+# 标题占位符类型
+_TITLE_PLACEHOLDERS = {"title", "ctrTitle"}
+
+_DC = "{http://purl.org/dc/elements/1.1/}"
+
+@register_processor(extensions=['.pptx'])
+class PptxProcessor(DocumentProcessor):
+    """
+    PowerPoint文档处理器
+    
+    直接从zip包中读取presentation.xml确定幻灯片顺序，再逐页解析幻灯片XML，
+    每页幻灯片产出一个page分段（页码即幻灯片序号），包含标题、文本框、表格和备注。
+    """
+    
+    def _iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        按幻灯片顺序提取文本
+        
+        Args:
+            file: PowerPoint文件对象
+            metadata: 提取的元数据会写入此字典
+        
+        Yields:
+            Dict[str, Any]: 每页幻灯片一个page分段
+        """
+        try:
+            with zipfile.ZipFile(self._get_file_path(file) or file) as package:
+                names = set(package.namelist())
+                package_rels = self._read_relationships(package, "_rels/.rels", "")
+                presentation_part = package_rels.get(_REL_OFFICE_DOCUMENT, {}).get("target")
+                if presentation_part not in names:
+                    raise ValueError("找不到演示文稿主部件")
+                
+                metadata.update(self._read_core_properties(package, package_rels, names))
+                
+                slide_parts = self._slide_parts(package, presentation_part)
+                metadata["slide_count"] = len(slide_parts)
+                
+                table_count = 0
+                notes_count = 0
+                for slide_number, slide_part in enumerate(slide_parts, 1):
+                    if slide_part not in names:
+                        continue
+                    
+                    slide_dir = posixpath.dirname(slide_part)
+                    slide_rels = self._read_relationships(
+                        package, posixpath.join(slide_dir, "_rels", posixpath.basename(slide_part) + ".rels"), slide_dir
+                    )
+                    
+                    blocks, title, tables = self._slide_blocks(etree.fromstring(package.read(slide_part)))
+                    table_count += tables
+                    if slide_number == 1 and title:
+                        metadata.setdefault("document_title", title)
+                    
+                    # 备注页中的文本
+                    notes_part = slide_rels.get(_REL_NOTES_SLIDE, {}).get("target")
+                    if notes_part in names:
+                        notes = self._notes_text(etree.fromstring(package.read(notes_part)))
+                        if notes:
+                            notes_count += 1
+                            blocks.append(f"备注: {notes}")
+                    
+                    text = "\n\n".join(blocks)
+                    if text:
+                        yield {"type": SECTION_PAGE, "page": slide_number, "text": text}
+                
+                metadata["table_count"] = table_count
+                metadata["notes_count"] = notes_count
+        
+        except Exception as e:
+            logger.error(f"处理PowerPoint文件时出错: {str(e)}")
+            raise Exception(f"PowerPoint处理失败: {str(e)}")
+    
+    def _read_relationships(self, package: zipfile.ZipFile, rels_path: str,
+                            base_dir: str) -> Dict[str, Dict[str, str]]:
+        """
+        读取关系文件
+        
+        Returns:
+            Dict[str, Dict[str, str]]: 关系ID和关系类型后缀分别映射到{"target": 部件路径}
+        """
+        try:
+            root = etree.fromstring(package.read(rels_path))
+        except KeyError:
+            return {}
+        
+        relationships = {}
+        for rel in root.iter(_REL_NS + "Relationship"):
+            if rel.get("TargetMode") == "External":
+                continue
+            target = rel.get("Target", "")
+            target = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join(base_dir, target))
+            rel_type = rel.get("Type", "")
+            relationships[rel.get("Id")] = {"target": target}
+            relationships.setdefault(rel_type[rel_type.rfind("/"):], {"target": target})
+        return relationships
+    
+    def _slide_parts(self, package: zipfile.ZipFile, presentation_part: str) -> List[str]:
+        """按presentation.xml中sldIdLst的顺序返回幻灯片部件路径"""
+        presentation_dir = posixpath.dirname(presentation_part)
+        rels = self._read_relationships(
+            package,
+            posixpath.join(presentation_dir, "_rels", posixpath.basename(presentation_part) + ".rels"),
+            presentation_dir
+        )
+        
+        root = etree.fromstring(package.read(presentation_part))
+        return [
+            rels[slide_id.get(_R_ID)]["target"]
+            for slide_id in root.iter(_P + "sldId")
+            if slide_id.get(_R_ID) in rels
+        ]
+    
+    def _read_core_properties(self, package: zipfile.ZipFile, package_rels: Dict[str, Dict[str, str]],
+                              names: set) -> Dict[str, str]:
+        """读取docProps/core.xml中的标题和作者"""
+        properties = {"title": "", "author": "", "subject": ""}
+        core_part = package_rels.get(_REL_CORE_PROPERTIES, {}).get("target")
+        if core_part not in names:
+            return properties
+        
+        root = etree.fromstring(package.read(core_part))
+        for key, tag in (("title", "title"), ("author", "creator"), ("subject", "subject")):
+            element = root.find(_DC + tag)
+            if element is not None and element.text:
+                properties[key] = element.text.strip()
+        return properties
+    
+    def _slide_blocks(self, slide: etree._Element) -> Tuple[List[str], Optional[str], int]:
+        """
+        按形状树顺序提取幻灯片中的文本块
+        
+        Returns:
+            Tuple[List[str], Optional[str], int]: 文本块列表、幻灯片标题和表格数量
+        """
+        blocks = []
+        title = None
+        tables = 0
+        
+        for element in slide.iter(_P + "sp", _A + "tbl"):
+            if element.tag == _A + "tbl":
+                rows = [
+                    [self._text_body(tc) for tc in tr.iterchildren(_A + "tc")]
+                    for tr in element.iterchildren(_A + "tr")
+                ]
+                if rows:
+                    tables += 1
+                    blocks.append(format_table(rows).rstrip("\n"))
+                continue
+            
+            text = self._text_body(element, separator="\n")
+            if not text:
+                continue
+            
+            placeholder = element.find(f"{_P}nvSpPr/{_P}nvPr/{_P}ph")
+            if placeholder is not None and placeholder.get("type") in _TITLE_PLACEHOLDERS:
+                if title is None:
+                    title = " ".join(text.split())
+                blocks.append(f"# {' '.join(text.split())}")
+            else:
+                blocks.append(text)
+        
+        return blocks, title, tables
+    
+    def _text_body(self, element: etree._Element, separator: str = " ") -> str:
+        """形状或单元格中的文本，段落之间用separator连接"""
+        paragraphs = []
+        for paragraph in element.iter(_A + "p"):
+            parts = []
+            for item in paragraph.iter(_A + "t", _A + "br"):
+                parts.append((item.text or "") if item.tag == _A + "t" else " ")
+            text = " ".join("".join(parts).split())
+            if text:
+                paragraphs.append(text)
+        return separator.join(paragraphs)
+    
+    def _notes_text(self, notes: etree._Element) -> str:
+        """备注页正文占位符中的文本（不含幻灯片缩略图和页码）"""
+        texts = []
+        for shape in notes.iter(_P + "sp"):
+            placeholder = shape.find(f"{_P}nvSpPr/{_P}nvPr/{_P}ph")
+            if placeholder is not None and placeholder.get("type") == "body":
+                text = self._text_body(shape)
+                if text:
+                    texts.append(text)
+        return " ".join(texts)
@@ -0,0 +1,198 @@
+import os
+import re
+import mmap
+import codecs
+import logging
+from typing import Dict, Any, Tuple, List, Optional, BinaryIO, Iterator
+from .base import DocumentProcessor, register_processor, get_processor_settings, \
+    SECTION_HEADING, SECTION_PARAGRAPH
+
+logger = logging.getLogger(__name__)
+
+# markdown标题行和代码块围栏
+_MD_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_MD_FENCE_RE = re.compile(r'^\s*(```|~~~)')
+
+# 字节顺序标记及其对应的编码
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+@register_processor(extensions=['.txt'])
+class TextProcessor(DocumentProcessor):
+    """
+    纯文本处理器
+    
+    磁盘上的文件通过内存映射按块读取，按块增量解码，编码按配置的候选顺序检测
+    （默认utf-8、gbk、gb18030）：某一块无法用当前编码解码时，从该块开始改用下一个候选编码，
+    之前已解码的内容不受影响（候选编码对ASCII部分的解码结果相同）。
+    文本按空行切分为段落分段，单个分段不超过section_max_chars，内存占用与文件大小无关。
+    """
+    
+    # 是否识别markdown标题
+    parse_headings = False
+    
+    def __init__(self):
+        settings = get_processor_settings("text")
+        self.encodings = settings.get("encodings", ["utf-8", "gbk", "gb18030"])
+        # 块大小取内存映射分配粒度的整数倍，使每块的起始位置按页对齐
+        granularity = mmap.ALLOCATIONGRANULARITY
+        self.block_size = max(1, settings.get("block_size_kb", 1024) * 1024 // granularity) * granularity
+        self.section_max_chars = settings.get("section_max_chars", 4000)
+    
+    def _iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        按文本顺序产出段落分段（markdown还产出标题分段）
+        
+        Args:
+            file: 文本文件对象
+            metadata: 提取的元数据会写入此字典
+        
+        Yields:
+            Dict[str, Any]: paragraph或heading分段
+        """
+        try:
+            stats = {"line_count": 0, "char_count": 0, "encoding": None, "size_bytes": 0}
+            lines = self._iter_lines(self._iter_text(self._iter_blocks(file, stats), stats), stats)
+            yield from self._iter_paragraphs(lines, metadata)
+            
+            metadata.update(stats)
+        
+        except Exception as e:
+            logger.error(f"处理文本文件时出错: {str(e)}")
+            raise Exception(f"文本处理失败: {str(e)}")
+    
+    def _iter_blocks(self, file: BinaryIO, stats: Dict[str, Any]) -> Iterator[bytes]:
+        """按块读取文件字节，磁盘上的非空文件使用内存映射"""
+        path = self._get_file_path(file)
+        if path and os.path.getsize(path) > 0:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                stats["size_bytes"] = len(mapped)
+                for start in range(0, len(mapped), self.block_size):
+                    yield mapped[start:start + self.block_size]
+                    # 已读取的页不再需要，释放以免常驻内存随文件大小增长
+                    if hasattr(mmap, "MADV_DONTNEED"):
+                        mapped.madvise(mmap.MADV_DONTNEED, start, min(self.block_size, len(mapped) - start))
+            return
+        
+        while True:
+            block = file.read(self.block_size)
+            if not block:
+                break
+            stats["size_bytes"] += len(block)
+            yield block
+    
+    def _iter_text(self, blocks: Iterator[bytes], stats: Dict[str, Any]) -> Iterator[str]:
+        """增量解码字节块，当前编码失败时从失败的块开始改用下一个候选编码"""
+        candidates = list(self.encodings)
+        decoder = None
+        
+        for block in blocks:
+            if decoder is None:
+                # 第一块根据字节顺序标记确定编码
+                for bom, encoding in _BOMS:
+                    if block.startswith(bom):
+                        candidates = [encoding]
+                        break
+                decoder = self._decoder(candidates[0], last=len(candidates) == 1)
+                stats["encoding"] = candidates[0]
+            
+            while True:
+                # 解码器中缓存的不完整多字节序列，换编码时需要一起重新解码
+                pending = decoder.getstate()[0]
+                try:
+                    text = decoder.decode(block)
+                    break
+                except UnicodeDecodeError:
+                    candidates.pop(0)
+                    logger.info(f"文本无法按 {stats['encoding']} 解码，改用 {candidates[0]}")
+                    decoder = self._decoder(candidates[0], last=len(candidates) == 1)
+                    stats["encoding"] = candidates[0]
+                    block = pending + block
+            
+            if text:
+                yield text
+        
+        if decoder is not None:
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+    
+    @staticmethod
+    def _decoder(encoding: str, last: bool) -> codecs.IncrementalDecoder:
+        """创建增量解码器，最后一个候选编码用替换字符代替无法解码的字节"""
+        return codecs.getincrementaldecoder(encoding)(errors="replace" if last else "strict")
+    
+    def _iter_lines(self, texts: Iterator[str], stats: Dict[str, Any]) -> Iterator[str]:
+        """把解码后的文本块切分为行（不含换行符）"""
+        carry = ""
+        for text in texts:
+            stats["char_count"] += len(text)
+            lines = (carry + text).split("\n")
+            carry = lines.pop()
+            stats["line_count"] += len(lines)
+            for line in lines:
+                yield line.rstrip("\r")
+        
+        if carry:
+            stats["line_count"] += 1
+            yield carry.rstrip("\r")
+    
+    def _iter_paragraphs(self, lines: Iterator[str], metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """按空行把行合并为段落分段，超过section_max_chars时在行边界切分"""
+        paragraph = []
+        size = 0
+        in_fence = False
+        heading_count = 0
+        
+        def flush() -> Iterator[Dict[str, Any]]:
+            nonlocal size
+            if paragraph:
+                text = "\n".join(paragraph).strip("\n")
+                if text.strip():
+                    yield {"type": SECTION_PARAGRAPH, "text": text, "page": None}
+                paragraph.clear()
+                size = 0
+        
+        for line in lines:
+            if self.parse_headings:
+                if _MD_FENCE_RE.match(line):
+                    in_fence = not in_fence
+                elif not in_fence:
+                    match = _MD_HEADING_RE.match(line)
+                    if match and match.group(2):
+                        yield from flush()
+                        heading_count += 1
+                        level, text = len(match.group(1)), match.group(2)
+                        if level == 1 and "title" not in metadata:
+                            metadata["title"] = text
+                        yield {"type": SECTION_HEADING, "level": level, "text": text, "page": None}
+                        continue
+            
+            if not line.strip() and not in_fence:
+                yield from flush()
+                continue
+            
+            # 单行超长（如没有换行的导出文件）时按字符数切分
+            while len(line) > self.section_max_chars:
+                yield from flush()
+                yield {"type": SECTION_PARAGRAPH, "text": line[:self.section_max_chars], "page": None}
+                line = line[self.section_max_chars:]
+            
+            if size + len(line) + 1 > self.section_max_chars:
+                yield from flush()
+            paragraph.append(line)
+            size += len(line) + 1
+        
+        yield from flush()
+        
+        if self.parse_headings:
+            metadata["heading_count"] = heading_count
+
+@register_processor(extensions=['.md'])
+class MarkdownProcessor(TextProcessor):
+    """Markdown文档处理器，在纯文本处理的基础上把#标题行识别为标题分段（代码块内除外）"""
+    
+    parse_headings = True
@@ -0,0 +1,54 @@
+"""
+重新嵌入向量存储中向量为零向量或包含NaN的文本块
+
+用法:
+    python -m backend.repair_embeddings [--user-id user_001] [--document-id DOC_ID]
+
+早期版本在嵌入失败时写入零向量。不指定用户或文档时检查整个文档集合，
+从文本块存储读取无效点的正文重新生成嵌入并替换向量。单个用户的修复也可以通过
+POST /documents/repair-embeddings 在工作进程中执行。
+"""
+import os
+import json
+import logging
+import argparse
+import yaml
+from .services.document_service import DocumentService
+from .services.vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description="重新嵌入向量为零向量或包含NaN的文本块")
+    parser.add_argument("--user-id", default=None, help="只检查该用户的文本块")
+    parser.add_argument("--document-id", default=None, help="只检查该文档的文本块")
+    args = parser.parse_args()
+
+    config_path = os.getenv("WORKER_CONFIG_PATH", "configs/worker.yaml")
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    logging.basicConfig(
+        level=getattr(logging, config["worker"]["log_level"].upper()),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+
+    vector_store = VectorStore(os.getenv("QDRANT_CONFIG_PATH", "configs/qdrant.yaml"))
+    document_service = DocumentService(
+        vector_store,
+        config_path=config_path,
+        redis_config_path=os.getenv("REDIS_CONFIG_PATH", "configs/redis.yaml")
+    )
+
+    def on_progress(progress):
+        logger.info(f"修复进度: {progress['points_repaired']}/{progress['points_invalid']}")
+
+    result = document_service.repair_embeddings(
+        user_id=args.user_id,
+        document_id=args.document_id,
+        on_progress=on_progress
+    )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
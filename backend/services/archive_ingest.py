@@ -0,0 +1,285 @@
+import io
+import os
+import time
+import hashlib
+import logging
+import tarfile
+import zipfile
+import threading
+import posixpath
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple, Callable, Iterator
+from .file_storage import FileStorage
+
+logger = logging.getLogger(__name__)
+
+# 支持的压缩包后缀及其格式
+ARCHIVE_SUFFIXES = (
+    (".zip", "zip"),
+    (".tar.gz", "tar"),
+    (".tgz", "tar"),
+)
+
+# 最多记录的失败成员数
+_MAX_RECORDED_ERRORS = 50
+
+def archive_format(filename: str) -> Optional[str]:
+    """返回压缩包格式（zip或tar），不是支持的压缩包时返回None"""
+    lowered = filename.lower()
+    for suffix, fmt in ARCHIVE_SUFFIXES:
+        if lowered.endswith(suffix):
+            return fmt
+    return None
+
+class ArchiveIngestor:
+    """
+    压缩包导入
+    
+    从存储的.zip或.tar.gz中按顺序流式读取成员：每个成员读入内存（不超过max_member_size_mb），
+    与已有文档不重复时写入文件存储（供之后重新索引和替换），再作为独立文档交给DocumentService处理，
+    成员在压缩包中的路径记录在文档的自定义元数据中。多个成员由线程池并行处理，同时在内存中的成员不超过workers的两倍，
+    内存占用约为 2 * workers * max_member_size_mb，与压缩包大小无关。
+    
+    .tar.gz以流模式顺序读取，总成员数在读完之前未知。
+    """
+    
+    def __init__(self, document_service, config_path: str = "configs/worker.yaml"):
+        # 加载配置
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+        
+        self.document_service = document_service
+        
+        # 成员文件写入上传文件的存储目录
+        self.file_storage = FileStorage(config_path)
+        
+        processing_settings = config["document_processing"]
+        archive_settings = processing_settings.get("archives") or {}
+        self.max_size = archive_settings.get("max_size_mb", 4096) * 1024 * 1024
+        self.max_member_size = archive_settings.get(
+            "max_member_size_mb", processing_settings["storage"]["max_size_mb"]
+        ) * 1024 * 1024
+        self.max_members = archive_settings.get("max_members", 10000)
+        self.workers = archive_settings.get("workers") or config["worker"]["threads"]
+    
+    def ingest(self, archive_path: str, filename: str, user_id: str,
+               metadata: Optional[Dict[str, Any]] = None,
+               on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        导入压缩包中所有支持格式的文件
+        
+        Args:
+            archive_path: 存储目录中的压缩包路径
+            filename: 压缩包的原始文件名
+            user_id: 用户ID
+            metadata: 可选的自定义元数据，附加到每个成员文档
+            on_progress: 进度回调，每个成员处理完成后以进度字典调用
+        
+        Returns:
+            Dict[str, Any]: 进度统计（见_new_progress）以及document_ids和errors
+        
+        Raises:
+            ValueError: 如果不是支持的压缩包格式
+        """
+        fmt = archive_format(filename)
+        if fmt is None:
+            raise ValueError(f"不支持的压缩包格式: {filename}")
+        
+        start_time = time.time()
+        progress = self._new_progress(os.path.getsize(archive_path))
+        document_ids: List[str] = []
+        errors: List[Dict[str, str]] = []
+        lock = threading.Lock()
+        # 本压缩包中已出现的内容哈希，内容相同的成员只处理一次
+        seen_hashes: Dict[str, str] = {}
+        # 限制同时在内存中的成员数
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        
+        def report():
+            if on_progress:
+                try:
+                    on_progress(dict(progress))
+                except Exception as e:
+                    logger.warning(f"更新压缩包导入进度失败: {str(e)}")
+        
+        def process_member(member_path: str, data: bytes):
+            try:
+                file_hash = hashlib.sha256(data).hexdigest()
+                with lock:
+                    first_path = seen_hashes.setdefault(file_hash, member_path)
+                if first_path != member_path:
+                    logger.debug(f"压缩包成员 {member_path} 与 {first_path} 内容相同")
+                    result = {"duplicate": True, "id": None}
+                else:
+                    result = self._process_member(member_path, data, file_hash, filename, user_id, metadata)
+                with lock:
+                    progress["members_processed"] += 1
+                    if result["duplicate"]:
+                        progress["members_duplicate"] += 1
+                    else:
+                        progress["members_indexed"] += 1
+                    if result["id"]:
+                        document_ids.append(result["id"])
+            except Exception as e:
+                logger.error(f"处理压缩包成员 {member_path} 失败: {str(e)}")
+                with lock:
+                    progress["members_processed"] += 1
+                    progress["members_failed"] += 1
+                    if len(errors) < _MAX_RECORDED_ERRORS:
+                        errors.append({"path": member_path, "error": str(e)})
+            finally:
+                slots.release()
+            report()
+        
+        try:
+            reader = self._iter_zip if fmt == "zip" else self._iter_tar
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="archive") as executor:
+                for member_path, data in reader(archive_path, progress, lock):
+                    slots.acquire()
+                    executor.submit(process_member, member_path, data)
+            
+            if progress["members_total"] is None:
+                progress["members_total"] = progress["members_processed"] + progress["members_skipped"]
+            progress["bytes_read"] = progress["archive_bytes"]
+            report()
+        
+        except Exception as e:
+            logger.error(f"读取压缩包 {filename} 失败: {str(e)}")
+            raise Exception(f"压缩包导入失败: {str(e)}")
+        
+        elapsed = time.time() - start_time
+        logger.info(
+            f"压缩包 {filename} 导入完成: 索引 {progress['members_indexed']} 个, "
+            f"重复 {progress['members_duplicate']} 个, 跳过 {progress['members_skipped']} 个, "
+            f"失败 {progress['members_failed']} 个, 耗时 {elapsed:.2f}秒"
+        )
+        
+        return {**progress, "document_ids": document_ids, "errors": errors, "processing_time": elapsed}
+    
+    @staticmethod
+    def _new_progress(archive_bytes: int) -> Dict[str, Any]:
+        """压缩包级别的进度：成员计数和已读取的压缩包字节数"""
+        return {
+            "archive_bytes": archive_bytes,
+            "bytes_read": 0,
+            "members_total": None,
+            "members_processed": 0,
+            "members_indexed": 0,
+            "members_duplicate": 0,
+            "members_failed": 0,
+            "members_skipped": 0,
+        }
+    
+    def _process_member(self, member_path: str, data: bytes, file_hash: str, archive_filename: str,
+                        user_id: str, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """把一个成员作为独立文档处理，返回文档ID和是否与已有文档重复"""
+        # 去重检查只在这里做一次，登记后的文档由process_document直接处理
+        existing_doc = self.document_service._find_duplicate(user_id, file_hash)
+        if existing_doc:
+            return {"id": existing_doc["id"], "duplicate": True}
+        
+        filename = posixpath.basename(member_path)
+        ext = self.document_service.check_format(filename)
+        member_metadata = dict(metadata or {})
+        member_metadata.update({"archive_filename": archive_filename, "archive_path": member_path})
+        
+        stored_file = self.file_storage.save_file(io.BytesIO(data), filename, self.max_member_size)
+        try:
+            doc_metadata = self.document_service._register_document(
+                filename, ext, user_id, file_hash, len(data), member_metadata, stored_file["path"]
+            )
+        except Exception:
+            self.file_storage.delete(stored_file["path"])
+            raise
+        
+        # 从存储的文件提取：提取沙箱只把路径传给子进程，处理器（如PDF）可以直接按路径打开
+        with open(stored_file["path"], "rb") as file:
+            doc_metadata = self.document_service.process_document(
+                file=file,
+                filename=filename,
+                user_id=user_id,
+                metadata=member_metadata,
+                file_hash=file_hash,
+                file_size=len(data),
+                document_id=doc_metadata["id"],
+                file_path=stored_file["path"]
+            )
+        return {"id": doc_metadata["id"], "duplicate": False}
+    
+    def _skip_reason(self, member_path: str, size: int) -> Optional[str]:
+        """成员不需要处理时返回原因"""
+        name = posixpath.basename(member_path)
+        if not name or name.startswith("._") or member_path.startswith("__MACOSX/"):
+            return "系统文件"
+        if archive_format(name) is not None:
+            return "嵌套的压缩包"
+        if os.path.splitext(name)[1].lower() not in self.document_service.supported_formats:
+            return "不支持的格式"
+        if size > self.max_member_size:
+            return "超过大小限制"
+        return None
+    
+    def _read_members(self, members: Iterator[Tuple[str, int, Callable]], progress: Dict[str, Any],
+                      lock: threading.Lock) -> Iterator[Tuple[str, bytes]]:
+        """
+        筛选并读取成员内容
+        
+        Args:
+            members: (成员路径, 声明的大小, 打开成员的函数)
+            progress: 进度字典，跳过的成员计入members_skipped
+        
+        Yields:
+            Tuple[str, bytes]: 成员路径和内容
+        """
+        accepted = 0
+        for member_path, size, open_member in members:
+            reason = self._skip_reason(member_path, size)
+            data = None
+            if reason is None and accepted >= self.max_members:
+                reason = "超过成员数限制"
+            if reason is None:
+                # 不信任压缩包中声明的大小，最多读取限制加一个字节
+                with open_member() as file:
+                    data = file.read(self.max_member_size + 1)
+                if len(data) > self.max_member_size:
+                    reason = "超过大小限制"
+            
+            if reason is not None:
+                logger.debug(f"跳过压缩包成员 {member_path}: {reason}")
+                with lock:
+                    progress["members_skipped"] += 1
+                continue
+            
+            accepted += 1
+            yield member_path, data
+    
+    def _iter_zip(self, archive_path: str, progress: Dict[str, Any],
+                  lock: threading.Lock) -> Iterator[Tuple[str, bytes]]:
+        """按中央目录顺序读取zip成员"""
+        with zipfile.ZipFile(archive_path) as archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            progress["members_total"] = len(members)
+            
+            def entries():
+                for info in members:
+                    with lock:
+                        progress["bytes_read"] = info.header_offset + info.compress_size
+                    yield info.filename, info.file_size, lambda info=info: archive.open(info)
+            
+            yield from self._read_members(entries(), progress, lock)
+    
+    def _iter_tar(self, archive_path: str, progress: Dict[str, Any],
+                  lock: threading.Lock) -> Iterator[Tuple[str, bytes]]:
+        """以流模式顺序读取tar.gz成员，不回退读取位置"""
+        with open(archive_path, "rb") as raw, tarfile.open(fileobj=raw, mode="r|gz") as archive:
+            def entries():
+                for info in archive:
+                    with lock:
+                        progress["bytes_read"] = raw.tell()
+                    if not info.isfile():
+                        continue
+                    member_path = info.name[2:] if info.name.startswith("./") else info.name
+                    yield member_path, info.size, lambda info=info: archive.extractfile(info)
+            
+            yield from self._read_members(entries(), progress, lock)
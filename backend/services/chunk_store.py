@@ -0,0 +1,118 @@
+import os
+import logging
+import sqlite3
+import threading
+import zlib
+import yaml
+from typing import Dict, List, Any, Iterable
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数上限（保守取值）
+_MAX_SQL_PARAMS = 500
+
+class ChunkStore:
+    """
+    文本块正文存储
+
+    文本块的正文按点ID压缩保存在SQLite（WAL模式、内存映射读取）中，
+    Qdrant有效载荷中只保留过滤和定位所需的字段。搜索和问答只为最终返回的
+    top-k结果批量读取正文（get_many）。
+
+    API和工作进程通过共享的数据目录访问同一个数据库文件，每个线程使用独立的连接。
+    """
+
+    def __init__(self, config_path: str = "configs/worker.yaml"):
+        # 加载配置
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+
+        store_settings = config["chunk_store"]
+        self.path = store_settings["path"]
+        self.compression_level = store_settings.get("compression_level", 6)
+        self.mmap_size = store_settings.get("mmap_size_mb", 256) * 1024 * 1024
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "id TEXT PRIMARY KEY, document_id TEXT NOT NULL, text BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks (document_id)")
+
+        logger.info(f"文本块存储初始化完成: {self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+            self._local.conn = conn
+        return conn
+
+    def put_many(self, chunks: Iterable[Dict[str, Any]]):
+        """
+        批量写入文本块正文（已存在的ID会被覆盖）
+
+        Args:
+            chunks: 包含chunk_id、document_id和text的文本块
+        """
+        rows = [
+            (chunk["chunk_id"], chunk["document_id"],
+             zlib.compress(chunk["text"].encode("utf-8"), self.compression_level))
+            for chunk in chunks
+        ]
+        if not rows:
+            return
+
+        try:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO chunks (id, document_id, text) VALUES (?, ?, ?)", rows)
+        except Exception as e:
+            logger.error(f"写入文本块正文失败: {str(e)}")
+            raise Exception(f"写入文本块正文失败: {str(e)}")
+
+    def get_many(self, ids: List[str]) -> Dict[str, str]:
+        """
+        按点ID批量读取文本块正文
+
+        Args:
+            ids: 点ID列表
+
+        Returns:
+            Dict[str, str]: 点ID到正文的映射，不存在的ID不包含在结果中
+        """
+        texts = {}
+        conn = self._connect()
+
+        try:
+            for i in range(0, len(ids), _MAX_SQL_PARAMS):
+                batch = ids[i:i + _MAX_SQL_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                for chunk_id, blob in conn.execute(f"SELECT id, text FROM chunks WHERE id IN ({placeholders})", batch):
+                    texts[chunk_id] = zlib.decompress(blob).decode("utf-8")
+        except Exception as e:
+            logger.error(f"读取文本块正文失败: {str(e)}")
+            raise Exception(f"读取文本块正文失败: {str(e)}")
+
+        return texts
+
+    def delete_many(self, ids: List[str]):
+        """按点ID删除文本块正文"""
+        if not ids:
+            return
+
+        with self._connect() as conn:
+            for i in range(0, len(ids), _MAX_SQL_PARAMS):
+                batch = ids[i:i + _MAX_SQL_PARAMS]
+                conn.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+
+    def delete_document(self, document_id: str):
+        """删除文档的全部文本块正文"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM chunks WHERE document_id = ?", (document_id,))
@@ -0,0 +1,132 @@
+import logging
+import hashlib
+from typing import Dict, List, Optional, Any
+import redis
+from .vector_store import VectorStore
+from ..embeddings.client import is_valid_vector
+
+logger = logging.getLogger(__name__)
+
+class DedupIndex:
+    """
+    基于内容哈希的去重索引
+
+    - 文档索引: (user_id, file_hash) -> document_id，字节完全相同的重复上传直接复用已有文档
+    - 文本块索引: (嵌入模型, sha256(text)) -> 向量点ID，相同文本块复用同一模型已存储的向量，不再调用嵌入模型。
+      切换嵌入后端或模型后不会复用旧模型的向量
+
+    索引保存在Redis中且不设置过期时间，命中/未命中计数保存在 `dedup:stats` 哈希中。
+    """
+
+    STATS_KEY = "dedup:stats"
+
+    def __init__(self, redis_client: redis.Redis, vector_store: VectorStore, embedding_model: str):
+        self.redis = redis_client
+        self.vector_store = vector_store
+        self.embedding_model = embedding_model
+        # 文本块键中的模型摘要，模型名可能很长或包含路径
+        self._model_digest = hashlib.sha256(embedding_model.encode("utf-8")).hexdigest()[:16]
+        # 文档集合的向量维度，维度不同的已存储向量不复用
+        self.vector_size = vector_store.config["collections"]["default"]["vector_size"]
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """计算文本块的内容哈希"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def find_document(self, user_id: str, file_hash: str) -> Optional[str]:
+        """
+        查找同一用户已上传的相同文件
+
+        Args:
+            user_id: 用户ID
+            file_hash: 文件SHA-256
+
+        Returns:
+            Optional[str]: 已存在的文档ID，未找到时为None
+        """
+        doc_id = self.redis.get(self._doc_key(user_id, file_hash))
+        self.redis.hincrby(self.STATS_KEY, "document_hits" if doc_id else "document_misses", 1)
+        return doc_id
+
+    def register_document(self, user_id: str, file_hash: str, doc_id: str):
+        """登记文档的内容哈希"""
+        self.redis.set(self._doc_key(user_id, file_hash), doc_id)
+
+    def remove_document(self, user_id: str, file_hash: str, doc_id: Optional[str] = None):
+        """删除文档的内容哈希登记，指定doc_id时只在登记仍指向该文档时删除"""
+        key = self._doc_key(user_id, file_hash)
+        if doc_id is not None and self.redis.get(key) != doc_id:
+            return
+        self.redis.delete(key)
+
+    def lookup_chunks(self, texts: List[str]) -> Dict[int, List[float]]:
+        """
+        查找已经嵌入过的相同文本块
+
+        Args:
+            texts: 文本块列表
+
+        Returns:
+            Dict[int, List[float]]: 命中的文本序号到已存储向量的映射
+        """
+        if not texts:
+            return {}
+
+        hashes = [self.text_hash(text) for text in texts]
+        point_ids = self.redis.mget([self._chunk_key(h) for h in hashes])
+
+        # 从向量存储中批量取回命中的向量
+        known_ids = list({point_id for point_id in point_ids if point_id})
+        vectors = self.vector_store.get_vectors(known_ids) if known_ids else {}
+
+        found = {}
+        stale = set()
+        for i, point_id in enumerate(point_ids):
+            if point_id and point_id in vectors:
+                # 零向量、NaN或维度不符的向量不复用，重新嵌入（已存储的零向量和NaN由修复任务处理）
+                if len(vectors[point_id]) == self.vector_size and is_valid_vector(vectors[point_id]):
+                    found[i] = vectors[point_id]
+            elif point_id:
+                # 对应的点已被删除
+                stale.add(hashes[i])
+
+        if stale:
+            self.redis.delete(*[self._chunk_key(h) for h in stale])
+
+        hits = len(found)
+        misses = len(texts) - hits
+        if hits:
+            self.redis.hincrby(self.STATS_KEY, "chunk_hits", hits)
+        if misses:
+            self.redis.hincrby(self.STATS_KEY, "chunk_misses", misses)
+
+        return found
+
+    def register_chunks(self, texts: List[str], point_ids: List[str]):
+        """登记文本块哈希到向量点ID的映射（已存在的映射保持不变）"""
+        if not texts:
+            return
+
+        pipe = self.redis.pipeline()
+        for text, point_id in zip(texts, point_ids):
+            pipe.setnx(self._chunk_key(self.text_hash(text)), point_id)
+        pipe.execute()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取去重命中统计"""
+        raw = self.redis.hgetall(self.STATS_KEY)
+        stats = {key: int(raw.get(key, 0)) for key in
+                 ("document_hits", "document_misses", "chunk_hits", "chunk_misses")}
+
+        for kind in ("document", "chunk"):
+            total = stats[f"{kind}_hits"] + stats[f"{kind}_misses"]
+            stats[f"{kind}_hit_rate"] = stats[f"{kind}_hits"] / total if total else 0.0
+
+        return stats
+
+    def _doc_key(self, user_id: str, file_hash: str) -> str:
+        return f"dedup:doc:{user_id}:{file_hash}"
+
+    def _chunk_key(self, text_hash: str) -> str:
+        return f"dedup:chunk:{self._model_digest}:{text_hash}"
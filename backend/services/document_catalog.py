@@ -0,0 +1,170 @@
+import os
+import json
+import base64
+import logging
+import sqlite3
+import threading
+import yaml
+from typing import Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 可用于过滤的列，对应文档元数据中的字段
+FILTER_COLUMNS = ("user_id", "status", "category", "file_hash")
+
+class DocumentCatalog:
+    """
+    文档目录
+
+    文档元数据以JSON保存在SQLite（WAL模式）中，user_id、status、category、
+    upload_date和file_hash单独成列并建立索引，按ID查找和按用户列出文档都走索引。
+    API和工作进程通过共享的数据目录访问同一个数据库文件，每个线程使用独立的连接。
+    """
+
+    def __init__(self, config_path: str = "configs/worker.yaml"):
+        # 加载配置
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+
+        self.path = config["catalog"]["path"]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, status TEXT, category TEXT, "
+                "upload_date TEXT, file_hash TEXT, metadata TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_date ON documents (user_id, upload_date, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_category ON documents (category)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_upload_date ON documents (upload_date, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_file_hash ON documents (file_hash)")
+
+        logger.info(f"文档目录初始化完成: {self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _category(doc_metadata: Dict[str, Any]) -> Optional[str]:
+        """文档分类取自顶层或自定义元数据中的category字段"""
+        return doc_metadata.get("category") or (doc_metadata.get("custom_metadata") or {}).get("category")
+
+    def upsert(self, doc_metadata: Dict[str, Any]):
+        """写入或更新文档元数据"""
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO documents "
+                    "(id, user_id, status, category, upload_date, file_hash, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        doc_metadata["id"],
+                        doc_metadata["user_id"],
+                        doc_metadata.get("status"),
+                        self._category(doc_metadata),
+                        doc_metadata.get("upload_date"),
+                        doc_metadata.get("file_hash"),
+                        json.dumps(doc_metadata)
+                    )
+                )
+        except Exception as e:
+            logger.error(f"写入文档目录失败: {str(e)}")
+            raise Exception(f"写入文档目录失败: {str(e)}")
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """按ID获取文档元数据，不存在时返回None"""
+        row = self._connect().execute(
+            "SELECT metadata FROM documents WHERE id = ?", (document_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, document_id: str):
+        """删除文档元数据"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+    def list_documents(self, filters: Dict[str, Any], limit: int = 100, offset: int = 0,
+                       cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按过滤条件列出文档，按上传时间倒序
+
+        使用游标时按(upload_date, id)键集分页，从索引中直接定位到上一页末尾，
+        任意页的代价相同；offset仅为兼容保留，深分页时需要跳过前面的行。
+
+        Args:
+            filters: 过滤条件，键为FILTER_COLUMNS中的字段
+            limit: 最大返回数量
+            offset: 偏移量，提供cursor时忽略
+            cursor: 上一页返回的next_cursor
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: 文档元数据列表和下一页的游标，没有下一页时为None
+
+        Raises:
+            ValueError: 过滤字段不支持或游标无效
+        """
+        where, params = self._where(filters)
+
+        if cursor:
+            upload_date, doc_id = self._decode_cursor(cursor)
+            where += (" AND " if where else " WHERE ") + "(upload_date, id) < (?, ?)"
+            params += [upload_date, doc_id]
+            offset = 0
+
+        # 多取一行用于判断是否还有下一页
+        rows = self._connect().execute(
+            f"SELECT upload_date, id, metadata FROM documents{where} "
+            f"ORDER BY upload_date DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limit + 1, offset]
+        ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self._encode_cursor(rows[-1][0], rows[-1][1])
+
+        return [json.loads(row[2]) for row in rows], next_cursor
+
+    def count_documents(self, filters: Dict[str, Any]) -> int:
+        """符合过滤条件的文档总数"""
+        where, params = self._where(filters)
+        return self._connect().execute(f"SELECT COUNT(*) FROM documents{where}", params).fetchone()[0]
+
+    @staticmethod
+    def _encode_cursor(upload_date: str, doc_id: str) -> str:
+        """把分页位置编码为不透明的游标"""
+        return base64.urlsafe_b64encode(json.dumps([upload_date, doc_id]).encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, str]:
+        """解析游标"""
+        try:
+            upload_date, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return str(upload_date), str(doc_id)
+        except Exception:
+            raise ValueError("无效的分页游标")
+
+    def count(self) -> int:
+        """文档总数"""
+        return self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _where(self, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        """把过滤条件转换为WHERE子句"""
+        conditions, params = [], []
+        for key, value in filters.items():
+            if key not in FILTER_COLUMNS:
+                raise ValueError(f"不支持的过滤字段: {key}")
+            conditions.append(f"{key} = ?")
+            params.append(value)
+
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
@@ -1,19 +1,47 @@
 import os
 import logging
 import yaml
-from typing import Dict, List, Optional, Any, BinaryIO, Tuple
+from typing import Dict, List, Optional, Any, BinaryIO, Tuple, Iterable, Iterator, Callable
 import uuid
-import hashlib
 import mimetypes
 from datetime import datetime
+import time
 import redis
 import json
+from qdrant_client.http import models as rest
 from .vector_store import VectorStore
-from ..processors.base import get_document_processor
-from ..embeddings.model import get_embeddings
+from .file_storage import hash_file_object
+from .dedup_index import DedupIndex
+from .chunk_store import ChunkStore
+from .extraction_cache import ExtractionCache
+from .extraction_sandbox import ExtractionSandbox
+from .document_catalog import DocumentCatalog
+from .ingest_pipeline import IngestPipeline
+from .archive_ingest import ArchiveIngestor, archive_format
+from ..processors.base import get_document_processor, has_processor
+from ..processors.chunker import TextChunker
+from ..embeddings.model import get_embeddings, get_embedding_model
 
 logger = logging.getLogger(__name__)
 
+# 文本块点ID的UUID命名空间
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2b9e-8d4a-5e3f-9a7b-2c1d0e4f5a6b")
+
+# 内容不变时可能随上下文修改而变化的文本块位置字段
+CHUNK_POSITION_FIELDS = ("ordinal", "start_char", "end_char", "page_start", "page_end")
+
+# 写入Qdrant有效载荷的文本块字段（另加user_id），正文保存在ChunkStore中
+CHUNK_PAYLOAD_FIELDS = ("document_id",) + CHUNK_POSITION_FIELDS
+
+# 压缩包导入任务状态中的整数进度字段
+ARCHIVE_PROGRESS_FIELDS = (
+    "archive_bytes", "bytes_read", "members_total", "members_processed",
+    "members_indexed", "members_duplicate", "members_failed", "members_skipped"
+)
+
+# 嵌入修复任务状态中的整数进度字段
+REPAIR_PROGRESS_FIELDS = ("points_scanned", "points_invalid", "points_repaired", "points_missing_text")
+
 class DocumentService:
     def __init__(self, vector_store: VectorStore, config_path: str = "configs/worker.yaml",
                 redis_config_path: str = "configs/redis.yaml"):
@@ -33,108 +61,476 @@ class DocumentService:
             decode_responses=True
         )
         
+        # 文档元数据缓存时间
+        self.document_ttl = redis_config["cache"]["document_ttl"]
+        
         # 存储向量存储引用
         self.vector_store = vector_store
         
+        # 文档目录
+        self.catalog = DocumentCatalog(config_path)
+        
+        # 内容哈希去重索引，文本块按当前嵌入模型分别登记
+        self.dedup_index = DedupIndex(self.redis, vector_store, get_embedding_model())
+        
+        # 文本块正文存储
+        self.chunk_store = ChunkStore(config_path)
+        
+        # 提取结果缓存
+        self.extraction_cache = ExtractionCache(config_path)
+        
+        # 提取沙箱，处理器在有时间和内存限制的子进程中运行
+        self.extraction_sandbox = ExtractionSandbox(config_path)
+        
         # 加载文档处理设置
         self.doc_settings = self.config["document_processing"]
         self.supported_formats = self.doc_settings["supported_formats"]
         self.chunk_size = self.doc_settings["chunk_size"]
         self.chunk_overlap = self.doc_settings["chunk_overlap"]
+        self.chunker = TextChunker(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            size_unit=self.doc_settings.get("chunk_unit", "chars"),
+            anchor_interval=self.doc_settings.get("chunk_anchor_interval", 0)
+        )
+        
+        # 加载流水线设置
+        self.pipeline_settings = self.config["pipeline"]
+        
+        # 压缩包导入，成员逐个作为文档处理
+        self.archive_ingestor = ArchiveIngestor(self, config_path)
+        
+        # 处理器模块在第一次遇到对应格式时才导入，这里只检查登记表
+        missing = [ext for ext in self.supported_formats if not has_processor(ext)]
+        if missing:
+            logger.warning(f"以下格式没有可用的处理器，上传后将处理失败: {missing}")
         
         logger.info(f"文档服务初始化完成，支持格式: {self.supported_formats}")
     
-    def process_document(self, file: BinaryIO, filename: str, user_id: str,
-                        metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """处理文档文件，提取文本并准备索引"""
-        # 验证文件格式
+    def check_format(self, filename: str) -> str:
+        """验证文件格式，返回小写扩展名"""
         ext = os.path.splitext(filename)[1].lower()
         if ext not in self.supported_formats:
             raise ValueError(f"不支持的文件格式: {ext}. 支持的格式: {self.supported_formats}")
+        return ext
+    
+    def is_archive(self, filename: str) -> bool:
+        """是否为支持导入的压缩包（.zip、.tar.gz、.tgz）"""
+        return archive_format(filename) is not None
+    
+    def submit_archive(self, file_path: str, filename: str, user_id: str,
+                      file_hash: str, file_size: int,
+                      metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        将已写入存储目录的压缩包的导入任务加入队列后立即返回
         
-        # 生成文档ID和文件哈希
-        doc_id = str(uuid.uuid4())
-        file_content = file.read()
-        file_hash = hashlib.sha256(file_content).hexdigest()
-        file.seek(0)
+        工作进程的archive任务流式读取成员，每个支持格式的成员作为独立文档处理，
+        导入进度记录在任务状态中。
         
-        # 确定MIME类型
-        mime_type, _ = mimetypes.guess_type(filename)
-        if not mime_type:
-            mime_type = "application/octet-stream"
+        Args:
+            file_path: 存储目录中的压缩包路径
+            filename: 压缩包的原始文件名
+            user_id: 用户ID
+            file_hash: 压缩包SHA-256
+            file_size: 压缩包大小
+            metadata: 可选的自定义元数据，附加到每个成员文档
         
-        # 创建文档元数据
-        doc_metadata = {
-            "id": doc_id,
+        Returns:
+            str: 任务ID
+        
+        Raises:
+            ValueError: 如果不是支持的压缩包格式
+        """
+        if not self.is_archive(filename):
+            raise ValueError(f"不支持的压缩包格式: {filename}")
+        
+        task_id = str(uuid.uuid4())
+        task_data = {
+            "type": "archive",
+            "task_id": task_id,
+            "file_path": file_path,
             "filename": filename,
-            "file_extension": ext,
-            "mime_type": mime_type,
-            "file_size": len(file_content),
-            "file_hash": file_hash,
-            "upload_date": datetime.now().isoformat(),
             "user_id": user_id,
-            "status": "processing",
-            "chunks_count": 0
+            "metadata": metadata or {},
+            "file_hash": file_hash,
+            "file_size": file_size,
+            "created_at": time.time()
         }
         
-        # 添加自定义元数据
-        if metadata:
-            doc_metadata.update({"custom_metadata": metadata})
+        # 存储任务状态
+        self.redis.hset(
+            f"task:{task_id}",
+            mapping={
+                "status": "queued",
+                "type": "archive",
+                "filename": filename,
+                "archive_bytes": file_size,
+                "created_at": time.time(),
+                "user_id": user_id
+            }
+        )
         
-        # 临时存储文档元数据
-        self.redis.set(
-            f"doc:{doc_id}:metadata", 
-            json.dumps(doc_metadata),
-            ex=3600  # 1小时过期
+        # 将任务添加到队列
+        self.redis.rpush("task_queue", json.dumps(task_data))
+        
+        return task_id
+    
+    def submit_document(self, file_path: str, filename: str, user_id: str,
+                       file_hash: str, file_size: int,
+                       metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        登记已写入存储目录的文档，并将处理任务加入队列后立即返回
+        
+        提取、分块、嵌入和索引由工作进程的document任务完成。
+        
+        Args:
+            file_path: 存储目录中的文件路径
+            filename: 原始文件名
+            user_id: 用户ID
+            file_hash: 文件SHA-256
+            file_size: 文件大小
+            metadata: 可选的自定义元数据
+            
+        Returns:
+            Dict[str, Any]: 包含document和task_id；重复上传时duplicate为True且task_id为None
+        """
+        ext = self.check_format(filename)
+        
+        # 字节完全相同的重复上传直接返回已有文档
+        existing_doc = self._find_duplicate(user_id, file_hash)
+        if existing_doc:
+            logger.info(f"文档 {filename} 与已有文档 {existing_doc['id']} 内容相同，跳过处理")
+            return {"document": existing_doc, "task_id": None, "duplicate": True}
+        
+        doc_metadata = self._register_document(filename, ext, user_id, file_hash, file_size, metadata)
+        
+        task_id = self._enqueue_document_task(doc_metadata, file_path, metadata)
+        
+        return {"document": doc_metadata, "task_id": task_id, "duplicate": False}
+    
+    def _register_document(self, filename: str, ext: str, user_id: str, file_hash: str, file_size: int,
+                           metadata: Optional[Dict[str, Any]] = None,
+                           file_path: Optional[str] = None) -> Dict[str, Any]:
+        """为已做过去重检查的文件登记新文档（状态为queued），之后以document_id交给process_document处理"""
+        doc_id = str(uuid.uuid4())
+        doc_metadata = self._create_metadata(doc_id, filename, ext, user_id, file_hash, file_size, metadata)
+        doc_metadata["status"] = "queued"
+        if file_path:
+            doc_metadata["file_path"] = file_path
+        
+        self._save_metadata(doc_metadata)
+        return doc_metadata
+    
+    def replace_document(self, document_id: str, file_path: str, filename: str,
+                        file_hash: str, file_size: int,
+                        metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        用新版本文件替换已有文档，并将增量重新索引任务加入队列
+        
+        工作进程重新分块后只为新增或修改的文本块生成嵌入，未修改的块保持不变。
+        
+        Args:
+            document_id: 已有文档ID
+            file_path: 存储目录中的新文件路径
+            filename: 新文件的原始文件名
+            file_hash: 新文件SHA-256
+            file_size: 新文件大小
+            metadata: 可选的自定义元数据，未提供时沿用原有的自定义元数据
+            
+        Returns:
+            Dict[str, Any]: 包含document和task_id；新文件与当前版本相同时duplicate为True且task_id为None
+        
+        Raises:
+            ValueError: 如果文档不存在或格式不支持
+        """
+        self.check_format(filename)
+        doc_metadata = self.get_document_metadata(document_id)
+        
+        if doc_metadata.get("file_hash") == file_hash and doc_metadata.get("status") == "indexed":
+            logger.info(f"文档 {document_id} 的新版本与当前版本内容相同，跳过处理")
+            return {"document": doc_metadata, "task_id": None, "duplicate": True}
+        
+        doc_metadata["status"] = "reindexing"
+        self._save_metadata(doc_metadata)
+        
+        if metadata is None:
+            metadata = doc_metadata.get("custom_metadata")
+        
+        task_id = self._enqueue_document_task(
+            doc_metadata, file_path, metadata,
+            filename=filename, file_hash=file_hash, file_size=file_size, incremental=True
+        )
+        
+        return {"document": doc_metadata, "task_id": task_id, "duplicate": False}
+    
+    def _enqueue_document_task(self, doc_metadata: Dict[str, Any], file_path: str,
+                              metadata: Optional[Dict[str, Any]] = None,
+                              filename: Optional[str] = None,
+                              file_hash: Optional[str] = None,
+                              file_size: Optional[int] = None,
+                              incremental: bool = False) -> str:
+        """创建文档处理任务并加入队列，返回任务ID"""
+        doc_id = doc_metadata["id"]
+        user_id = doc_metadata["user_id"]
+        
+        task_id = str(uuid.uuid4())
+        task_data = {
+            "type": "document",
+            "task_id": task_id,
+            "document_id": doc_id,
+            "file_path": file_path,
+            "filename": filename or doc_metadata["filename"],
+            "user_id": user_id,
+            "metadata": metadata or {},
+            "file_hash": file_hash or doc_metadata["file_hash"],
+            "file_size": file_size if file_size is not None else doc_metadata["file_size"],
+            "incremental": incremental,
+            "created_at": time.time()
+        }
+        
+        # 存储任务状态
+        self.redis.hset(
+            f"task:{task_id}",
+            mapping={
+                "status": "queued",
+                "type": "document",
+                "document_ids": json.dumps([doc_id]),
+                "created_at": time.time(),
+                "user_id": user_id
+            }
         )
         
+        # 将任务添加到队列
+        self.redis.rpush("task_queue", json.dumps(task_data))
+        
+        return task_id
+    
+    def process_document(self, file: BinaryIO, filename: str, user_id: str,
+                        metadata: Optional[Dict[str, Any]] = None,
+                        file_hash: Optional[str] = None,
+                        file_size: Optional[int] = None,
+                        document_id: Optional[str] = None,
+                        file_path: Optional[str] = None,
+                        incremental: bool = False) -> Dict[str, Any]:
+        """
+        处理文档文件，提取文本并准备索引
+        
+        如果调用方在写入文件时已经计算了哈希和大小（见FileStorage），
+        可通过file_hash和file_size传入，避免再次读取整个文件。
+        document_id为submit_document已登记的文档ID时，沿用该文档的元数据。
+        file_path为文件在存储目录中的位置，记录在元数据中供之后重新索引使用。
+        incremental为True时与该文档已存储的文本块比较，只为新增或修改的块生成嵌入。
+        """
+        # 验证文件格式
+        ext = self.check_format(filename)
+        
+        # 计算文件哈希（按块增量计算，不把整个文件读入内存）
+        if file_hash is None or file_size is None:
+            file_info = hash_file_object(file)
+            file_hash = file_info["file_hash"]
+            file_size = file_info["file_size"]
+        
+        previous_metadata = None
+        if document_id:
+            # 已在提交时登记并做过去重检查
+            doc_id = document_id
+            doc_metadata = self._create_metadata(doc_id, filename, ext, user_id, file_hash, file_size, metadata)
+            try:
+                previous_metadata = self.get_document_metadata(doc_id)
+                doc_metadata["upload_date"] = previous_metadata.get("upload_date", doc_metadata["upload_date"])
+            except Exception:
+                pass
+        else:
+            # 字节完全相同的重复上传直接返回已有文档
+            existing_doc = self._find_duplicate(user_id, file_hash)
+            if existing_doc:
+                logger.info(f"文档 {filename} 与已有文档 {existing_doc['id']} 内容相同，跳过处理")
+                return existing_doc
+            
+            doc_id = str(uuid.uuid4())
+            doc_metadata = self._create_metadata(doc_id, filename, ext, user_id, file_hash, file_size, metadata)
+        
+        if file_path:
+            doc_metadata["file_path"] = file_path
+        
+        # 存储文档元数据
+        self._save_metadata(doc_metadata)
+        
+        # 获取适当的处理器，按结构化分段流式提取，提取的元数据写入extracted_metadata；
+        # 同一文件已由相同版本的处理器提取过时直接读取缓存的文本
+        def extract(extracted_metadata: Dict[str, Any]) -> Iterator[str]:
+            processor = self.extraction_sandbox.wrap(get_document_processor(ext))
+            yield from self.extraction_cache.iter_extract(file_hash, processor, file, extracted_metadata)
+        
+        doc_metadata = self._index_document(doc_metadata, extract, incremental=incremental)
+        
+        if previous_metadata:
+            self._cleanup_previous_version(previous_metadata, doc_metadata)
+        
+        return doc_metadata
+    
+    def _cleanup_previous_version(self, previous_metadata: Dict[str, Any], doc_metadata: Dict[str, Any]):
+        """新版本索引成功后，删除旧版本的存储文件和内容哈希登记"""
+        previous_path = previous_metadata.get("file_path")
+        if previous_path and previous_path != doc_metadata.get("file_path") and os.path.exists(previous_path):
+            try:
+                os.unlink(previous_path)
+            except Exception as e:
+                logger.warning(f"删除旧版本文件{previous_path}失败: {str(e)}")
+        
+        previous_hash = previous_metadata.get("file_hash")
+        if previous_hash and previous_hash != doc_metadata["file_hash"]:
+            self.dedup_index.remove_document(previous_metadata["user_id"], previous_hash)
+    
+    def ingest_text(self, filename: str, user_id: str, text: str,
+                    extracted_metadata: Dict[str, Any], file_hash: str, file_size: int,
+                    metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        索引已经提取好的文档文本（用于批量导入等在其他进程中完成提取的场景）
+        
+        Args:
+            filename: 原始文件名
+            user_id: 用户ID
+            text: 提取的文本
+            extracted_metadata: 提取的元数据
+            file_hash: 文件SHA-256
+            file_size: 文件大小
+            metadata: 可选的自定义元数据
+            
+        Returns:
+            Dict[str, Any]: 文档元数据；相同文件已索引时返回已有文档的元数据
+        """
+        ext = self.check_format(filename)
+        
+        # 字节完全相同的文件直接返回已有文档
+        existing_doc = self._find_duplicate(user_id, file_hash)
+        if existing_doc:
+            return existing_doc
+        
+        doc_id = str(uuid.uuid4())
+        doc_metadata = self._create_metadata(doc_id, filename, ext, user_id, file_hash, file_size, metadata)
+        self._save_metadata(doc_metadata)
+        
+        def extract(extracted: Dict[str, Any]) -> Iterator[str]:
+            extracted.update(extracted_metadata)
+            yield text
+        
+        return self._index_document(doc_metadata, extract)
+    
+    def _index_document(self, doc_metadata: Dict[str, Any],
+                        extract: Callable[[Dict[str, Any]], Iterable[str]],
+                        incremental: bool = False) -> Dict[str, Any]:
+        """
+        以流水线方式提取、分块、嵌入并写入文档，完成后更新文档状态
+        
+        增量模式下先读取该文档已存储的文本块点ID。文本块的点ID由内容决定（见_assign_chunk_ids），
+        ID已存在的块不再嵌入和写入，只在位置发生变化时更新有效载荷；新版本中不再出现的旧块最后删除。
+        
+        Args:
+            doc_metadata: 文档元数据
+            extract: 接收元数据字典并逐段产出文本的函数
+            incremental: 是否与已存储的文本块比较，只处理变化的块
+            
+        Returns:
+            Dict[str, Any]: 更新后的文档元数据
+        """
+        doc_id = doc_metadata["id"]
+        
         try:
-            # 获取适当的处理器
-            processor = get_document_processor(ext)
+            # 该文档已存储的文本块: 点ID -> 位置字段
+            existing = {}
+            if incremental:
+                existing = {
+                    point["id"]: point["payload"]
+                    for point in self.vector_store.scroll_points(
+                        {"document_id": doc_id}, payload_fields=list(CHUNK_POSITION_FIELDS)
+                    )
+                }
             
-            # 提取文本和元数据
-            extracted_text, extracted_metadata = processor.process(file)
+            # 提取、分块、嵌入和写入以流水线方式重叠执行
+            extracted_metadata = {}
+            progress = {"text_length": 0, "chunks_count": 0, "started": False}
+            reindex_stats = {"reused": 0, "embedded": 0, "updated": 0, "deleted": 0}
+            seen_ids = set()
             
-            # 更新元数据
-            doc_metadata.update({
-                "extracted_metadata": extracted_metadata,
-                "text_length": len(extracted_text),
-                "status": "chunking"
-            })
+            def segments():
+                for segment in extract(extracted_metadata):
+                    progress["text_length"] += len(segment)
+                    yield segment
             
-            # 更新Redis
-            self.redis.set(
-                f"doc:{doc_id}:metadata", 
-                json.dumps(doc_metadata),
-                ex=3600
+            def embed(chunks):
+                # 已存储的块不再嵌入，对应位置的向量为None
+                new_chunks = [chunk for chunk in chunks if chunk["chunk_id"] not in existing]
+                vectors = iter(self._embed_chunks(new_chunks) if new_chunks else [])
+                return [None if chunk["chunk_id"] in existing else next(vectors) for chunk in chunks]
+            
+            def upsert(chunks, vectors):
+                if not progress["started"]:
+                    # 第一批文本块写入时进入索引状态
+                    progress["started"] = True
+                    doc_metadata["status"] = "indexing"
+                    self._save_metadata(doc_metadata)
+                
+                new_chunks, new_vectors = [], []
+                payload_updates = {}
+                for chunk, vector in zip(chunks, vectors):
+                    seen_ids.add(chunk["chunk_id"])
+                    if vector is not None:
+                        new_chunks.append(chunk)
+                        new_vectors.append(vector)
+                        continue
+                    
+                    # 内容未变的块只在位置变化时更新有效载荷
+                    stored = existing[chunk["chunk_id"]]
+                    changed = {field: chunk[field] for field in CHUNK_POSITION_FIELDS if stored.get(field) != chunk[field]}
+                    if changed:
+                        payload_updates[chunk["chunk_id"]] = changed
+                    reindex_stats["reused"] += 1
+                
+                if payload_updates:
+                    self.vector_store.set_payloads(payload_updates)
+                    reindex_stats["updated"] += len(payload_updates)
+                if new_chunks:
+                    self._upsert_chunks(new_chunks, new_vectors, doc_metadata["user_id"])
+                    reindex_stats["embedded"] += len(new_chunks)
+                progress["chunks_count"] += len(chunks)
+            
+            pipeline = IngestPipeline(
+                chunk_fn=lambda stream: self._assign_chunk_ids(self.chunker.iter_chunks(stream, doc_id), doc_id),
+                embed_fn=embed,
+                upsert_fn=upsert,
+                queue_size=self.pipeline_settings["queue_size"],
+                embed_batch_size=self.config["embedding"]["batch_size"],
+                upsert_batch_size=self.pipeline_settings["upsert_batch_size"]
             )
+            pipeline_stats = pipeline.run(segments())
             
-            # 分块文档
-            chunks = self._chunk_document(extracted_text, doc_id)
+            # 删除新版本中不再出现的文本块
+            removed_ids = [point_id for point_id in existing if point_id not in seen_ids]
+            self.vector_store.delete_points(removed_ids)
+            self.chunk_store.delete_many(removed_ids)
+            reindex_stats["deleted"] = len(removed_ids)
             
-            # 更新元数据
+            # 更新最终状态
             doc_metadata.update({
-                "chunks_count": len(chunks),
-                "status": "embedding"
+                "extracted_metadata": extracted_metadata,
+                "text_length": progress["text_length"],
+                "chunks_count": progress["chunks_count"],
+                "pipeline_stats": pipeline_stats,
+                "status": "indexed"
             })
+            if incremental:
+                doc_metadata["reindex_stats"] = reindex_stats
+                logger.info(
+                    f"文档 {doc_id} 增量重新索引: 沿用 {reindex_stats['reused']} 块, "
+                    f"嵌入 {reindex_stats['embedded']} 块, 删除 {reindex_stats['deleted']} 块"
+                )
             
-            # 更新Redis
-            self.redis.set(
-                f"doc:{doc_id}:metadata", 
-                json.dumps(doc_metadata),
-                ex=3600
-            )
+            # 存储文档元数据
+            self._save_metadata(doc_metadata)
             
-            # 处理文档嵌入和索引
-            self._process_embeddings_and_index(chunks, doc_id, doc_metadata)
-            
-            # 更新最终状态
-            doc_metadata["status"] = "indexed"
-            self.redis.set(
-                f"doc:{doc_id}:metadata", 
-                json.dumps(doc_metadata),
-                ex=3600
-            )
+            # 登记内容哈希，供后续重复上传复用
+            self.dedup_index.register_document(doc_metadata["user_id"], doc_metadata["file_hash"], doc_id)
             
             # 返回元数据
             return doc_metadata
@@ -145,330 +541,510 @@ class DocumentService:
                 "status": "error",
                 "processing_error": str(e)
             })
+            if getattr(e, "reason", None):
+                # 提取沙箱终止的文件记录原因: timeout、memory或crash
+                doc_metadata["error_reason"] = e.reason
             
-            # 更新Redis
-            self.redis.set(
-                f"doc:{doc_id}:metadata", 
-                json.dumps(doc_metadata),
-                ex=3600
-            )
+            # 更新文档目录
+            self._save_metadata(doc_metadata)
             
-            logger.error(f"处理文档 {filename} (ID: {doc_id}) 错误: {str(e)}")
+            logger.error(f"处理文档 {doc_metadata['filename']} (ID: {doc_id}) 错误: {str(e)}")
             raise Exception(f"文档处理失败: {str(e)}")
     
-    def _chunk_document(self, text: str, doc_id: str) -> List[Dict[str, Any]]:
-        """将文档文本分成块"""
-        chunks = []
+    def _assign_chunk_ids(self, chunks: Iterable[Dict[str, Any]], doc_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        为文本块分配由内容决定的点ID
         
-        # 基于字符的分块，带重叠
-        start = 0
-        chunk_id = 0
-        
-        while start < len(text):
-            # 计算结束位置
-            end = min(start + self.chunk_size, len(text))
-            
-            # 如果不是最后一块，尝试找到自然断点
-            if end < len(text):
-                # 尝试找到句子断点（句号、问号、感叹号）
-                for i in range(min(100, end - start)):
-                    if text[end - i - 1] in ['.', '?', '!', '\n'] and text[end - i] in [' ', '\n']:
-                        end = end - i
-                        break
-            
-            # 提取块文本
-            chunk_text = text[start:end]
-            
-            # 创建块元数据
-            chunk = {
-                "chunk_id": f"{doc_id}_{chunk_id}",
-                "document_id": doc_id,
-                "text": chunk_text,
-                "start_char": start,
-                "end_char": end,
-                "length": len(chunk_text)
-            }
+        点ID为文档ID、文本哈希和该文本在文档中第几次出现的UUID5，
+        同一文档的新版本中内容未变的块得到与旧版本相同的ID。
+        """
+        occurrences = {}
+        for ordinal, chunk in enumerate(chunks):
+            text_hash = DedupIndex.text_hash(chunk["text"])
+            occurrence = occurrences.get(text_hash, 0)
+            occurrences[text_hash] = occurrence + 1
             
-            chunks.append(chunk)
-            
-            # 移动到下一块位置，考虑重叠
-            start = end - self.chunk_overlap
-            chunk_id += 1
-            
-            # 确保我们有进展
-            if start >= end:
-                start = end
+            chunk.update({
+                "chunk_id": str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{doc_id}:{text_hash}:{occurrence}")),
+                "ordinal": ordinal,
+                "text_hash": text_hash
+            })
+            yield chunk
+    
+    def _create_metadata(self, doc_id: str, filename: str, ext: str, user_id: str,
+                        file_hash: str, file_size: int,
+                        metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """创建文档元数据"""
+        # 确定MIME类型
+        mime_type, _ = mimetypes.guess_type(filename)
+        if not mime_type:
+            mime_type = "application/octet-stream"
+        
+        doc_metadata = {
+            "id": doc_id,
+            "filename": filename,
+            "file_extension": ext,
+            "mime_type": mime_type,
+            "file_size": file_size,
+            "file_hash": file_hash,
+            "upload_date": datetime.now().isoformat(),
+            "user_id": user_id,
+            "status": "processing",
+            "chunks_count": 0
+        }
         
-        return chunks
+        # 添加自定义元数据
+        if metadata:
+            doc_metadata.update({"custom_metadata": metadata})
+        
+        return doc_metadata
+    
+    def _find_duplicate(self, user_id: str, file_hash: str) -> Optional[Dict[str, Any]]:
+        """查找同一用户已成功索引的相同文件"""
+        doc_id = self.dedup_index.find_document(user_id, file_hash)
+        if not doc_id:
+            return None
+        
+        try:
+            doc_metadata = self.get_document_metadata(doc_id)
+        except Exception:
+            # 文档已不存在，清理过期的登记
+            self.dedup_index.remove_document(user_id, file_hash)
+            return None
+        
+        if doc_metadata.get("status") != "indexed":
+            return None
+        
+        return doc_metadata
+    
+    def get_dedup_stats(self) -> Dict[str, Any]:
+        """获取去重索引的命中统计"""
+        return self.dedup_index.get_stats()
     
-    def _process_embeddings_and_index(self, chunks: List[Dict[str, Any]], 
-                                     doc_id: str, doc_metadata: Dict[str, Any]):
-        """处理文档块嵌入和索引"""
-        # 提取文本列表
+    def _embed_chunks(self, chunks: List[Dict[str, Any]]) -> List[List[float]]:
+        """为一批文本块生成嵌入向量，相同文本块直接复用已存储的向量"""
         texts = [chunk["text"] for chunk in chunks]
         
-        # 批量获取嵌入
-        batch_size = self.config["embedding"]["batch_size"]
-        all_embeddings = []
+        embeddings = self.dedup_index.lookup_chunks(texts)
+        missing = [i for i in range(len(texts)) if i not in embeddings]
         
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i+batch_size]
-            batch_embeddings = get_embeddings(batch_texts)
-            all_embeddings.extend(batch_embeddings)
+        if missing:
+            missing_embeddings = get_embeddings([texts[i] for i in missing])
+            embeddings.update(zip(missing, missing_embeddings))
         
-        # 准备向量和有效载荷
-        vectors = all_embeddings
-        payloads = chunks
+        return [embeddings[i] for i in range(len(texts))]
+    
+    def _upsert_chunks(self, chunks: List[Dict[str, Any]], vectors: List[List[float]], user_id: str):
+        """将一批文本块的正文写入文本块存储，向量和过滤字段写入向量存储"""
         chunk_ids = [chunk["chunk_id"] for chunk in chunks]
         
-        # 存储在向量存储中
+        # 先写入正文，保证点可被搜索到时正文已经存在
+        self.chunk_store.put_many(chunks)
+        
+        # 存储在向量存储中，有效载荷只保留过滤和定位字段
+        payloads = [
+            {"user_id": user_id, **{field: chunk[field] for field in CHUNK_PAYLOAD_FIELDS}}
+            for chunk in chunks
+        ]
         self.vector_store.add_documents(
             vectors=vectors,
             payloads=payloads,
             ids=chunk_ids
         )
         
-        # 存储文档元数据
-        doc_vector = all_embeddings[0] if all_embeddings else [0.0] * 768  # 默认向量大小
-        self.vector_store.add_documents(
-            vectors=[doc_vector],
-            payloads=[doc_metadata],
-            ids=[doc_id],
-            collection_name=self.vector_store.metadata_collection
-        ) 
+        # 登记文本块哈希
+        self.dedup_index.register_chunks([chunk["text"] for chunk in chunks], chunk_ids)
+    
+    def _save_metadata(self, doc_metadata: Dict[str, Any]):
+        """写入文档目录并更新Redis缓存，同时使该用户的文档计数失效"""
+        self.catalog.upsert(doc_metadata)
+        self.redis.delete(self._count_cache_key(doc_metadata["user_id"]), self._count_cache_key(None))
+        self.redis.set(
+            f"doc:{doc_metadata['id']}:metadata", 
+            json.dumps(doc_metadata),
+            ex=self.document_ttl
+        )
+
+    def import_metadata_collection(self) -> int:
+        """
+        把向量存储元数据集合中的文档导入文档目录
+        
+        用于从早期版本升级：文档元数据原先保存在metadata集合中。
+        
+        Returns:
+            int: 导入的文档数
+        """
+        points = self.vector_store.scroll_points({}, collection_name=self.vector_store.metadata_collection)
+        for point in points:
+            self.catalog.upsert(point["payload"])
+        
+        logger.info(f"从{self.vector_store.metadata_collection}集合导入了{len(points)}个文档到文档目录")
+        return len(points)
 
     def get_document_metadata(self, document_id: str) -> Dict[str, Any]:
-    """
-    获取文档元数据
+        """
+        获取文档元数据
     
-    Args:
-        document_id: 文档ID
-        
-    Returns:
-        Dict[str, Any]: 文档元数据
-        
-    Raises:
-        ValueError: 如果文档不存在
-    """
-    try:
-        # 从Redis检查缓存
-        cached_metadata = self.redis.get(f"doc:{document_id}:metadata")
-        if cached_metadata:
-            return json.loads(cached_metadata)
-        
-        # 如果缓存中没有，从向量存储中获取
-        results = self.vector_store.query(
-            query_vector=[0.0] * 768,  # 使用空向量
-            limit=1,
-            filter_={"id": document_id},
-            collection_name=self.vector_store.metadata_collection
-        )
+        Args:
+            document_id: 文档ID
         
-        if not results:
-            raise ValueError(f"文档 {document_id} 不存在")
+        Returns:
+            Dict[str, Any]: 文档元数据
         
-        # 返回文档元数据
-        return results[0]["payload"]
+        Raises:
+            ValueError: 如果文档不存在
+        """
+        try:
+            # 从Redis检查缓存
+            cached_metadata = self.redis.get(f"doc:{document_id}:metadata")
+            if cached_metadata:
+                return json.loads(cached_metadata)
         
-    except Exception as e:
-        logger.error(f"获取文档元数据错误: {str(e)}")
-        raise Exception(f"获取文档元数据失败: {str(e)}")
+            # 如果缓存中没有，从文档目录中按主键获取并回填缓存
+            doc_metadata = self.catalog.get(document_id)
+            if doc_metadata is None:
+                raise ValueError(f"文档 {document_id} 不存在")
+            
+            self.redis.set(
+                f"doc:{document_id}:metadata", 
+                json.dumps(doc_metadata),
+                ex=self.document_ttl
+            )
+        
+            # 返回文档元数据
+            return doc_metadata
+        
+        except ValueError as e:
+            raise e
+        except Exception as e:
+            logger.error(f"获取文档元数据错误: {str(e)}")
+            raise Exception(f"获取文档元数据失败: {str(e)}")
 
-def get_all_documents(self, filters: Dict[str, Any], limit: int = 100, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
-    """
-    获取所有文档的元数据
+    def get_all_documents(self, filters: Dict[str, Any], limit: int = 100, offset: int = 0,
+                          cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+        """
+        获取所有文档的元数据
     
-    Args:
-        filters: 过滤条件
-        limit: 最大返回数量
-        offset: 偏移量
-        
-    Returns:
-        Tuple[List[Dict[str, Any]], int]: 文档元数据列表和总数
-    """
-    try:
-        # 从向量存储中获取所有文档
-        results = self.vector_store.query(
-            query_vector=[0.0] * 768,  # 使用空向量
-            limit=limit + offset,
-            filter_=filters,
-            collection_name=self.vector_store.metadata_collection
-        )
+        Args:
+            filters: 过滤条件
+            limit: 最大返回数量
+            offset: 偏移量，提供cursor时忽略
+            cursor: 上一页返回的分页游标
         
-        # 获取总数
-        total_count = len(results)
+        Returns:
+            Tuple[List[Dict[str, Any]], int, Optional[str]]: 文档元数据列表、总数和下一页的游标
+        
+        Raises:
+            ValueError: 如果过滤条件或游标无效
+        """
+        try:
+            # 从文档目录中按索引获取
+            documents, next_cursor = self.catalog.list_documents(filters, limit=limit, offset=offset, cursor=cursor)
+            
+            return documents, self.count_documents(filters), next_cursor
         
-        # 应用偏移和限制
-        results = results[offset:offset+limit]
+        except ValueError as e:
+            raise e
+        except Exception as e:
+            logger.error(f"获取所有文档错误: {str(e)}")
+            raise Exception(f"获取文档列表失败: {str(e)}")
+    
+    def count_documents(self, filters: Dict[str, Any]) -> int:
+        """
+        获取符合过滤条件的文档总数
         
-        # 提取元数据
-        documents = [result["payload"] for result in results]
+        计数按用户缓存在Redis哈希中，该用户的文档元数据变化时整体失效，
+        翻页时不再重复计数。
+        """
+        cache_key = self._count_cache_key(filters.get("user_id"))
+        field = json.dumps(filters, sort_keys=True)
         
-        return documents, total_count
+        cached_count = self.redis.hget(cache_key, field)
+        if cached_count is not None:
+            return int(cached_count)
         
-    except Exception as e:
-        logger.error(f"获取所有文档错误: {str(e)}")
-        raise Exception(f"获取文档列表失败: {str(e)}")
+        total_count = self.catalog.count_documents(filters)
+        self.redis.hset(cache_key, field, total_count)
+        self.redis.expire(cache_key, self.document_ttl)
+        return total_count
+    
+    def _count_cache_key(self, user_id: Optional[str]) -> str:
+        return f"doc:count:{user_id or '*'}"
 
-def delete_document(self, document_id: str) -> bool:
-    """
-    删除文档及其索引
+    def delete_document(self, document_id: str) -> bool:
+        """
+        删除文档及其索引
     
-    Args:
-        document_id: 文档ID
+        Args:
+            document_id: 文档ID
         
-    Returns:
-        bool: 操作是否成功
+        Returns:
+            bool: 操作是否成功
         
-    Raises:
-        ValueError: 如果文档不存在
-    """
-    try:
-        # 检查文档是否存在
-        doc_metadata = self.get_document_metadata(document_id)
+        Raises:
+            ValueError: 如果文档不存在
+        """
+        try:
+            # 检查文档是否存在
+            doc_metadata = self.get_document_metadata(document_id)
         
-        # 删除文档块
-        self.vector_store.client.delete(
-            collection_name=self.vector_store.default_collection,
-            points_selector=rest.Filter(
-                must=[
-                    rest.FieldCondition(
-                        key="document_id",
-                        match=rest.MatchValue(value=document_id)
-                    )
-                ]
+            # 删除文档块
+            self.vector_store.client.delete(
+                collection_name=self.vector_store.default_collection,
+                points_selector=rest.Filter(
+                    must=[
+                        rest.FieldCondition(
+                            key="document_id",
+                            match=rest.MatchValue(value=document_id)
+                        )
+                    ]
+                )
             )
-        )
         
-        # 删除文档元数据
-        self.vector_store.client.delete(
-            collection_name=self.vector_store.metadata_collection,
-            points_selector=rest.Filter(
-                must=[
-                    rest.FieldCondition(
-                        key="id",
-                        match=rest.MatchValue(value=document_id)
-                    )
-                ]
-            )
-        )
+            # 删除文档元数据
+            self.catalog.delete(document_id)
+            self.redis.delete(self._count_cache_key(doc_metadata.get("user_id")), self._count_cache_key(None))
         
-        # 删除Redis缓存
-        self.redis.delete(f"doc:{document_id}:metadata")
+            # 删除文本块正文
+            self.chunk_store.delete_document(document_id)
         
-        # 创建一个删除文档的后台任务来清理相关资源
-        task_id = str(uuid.uuid4())
-        task_data = {
-            "type": "document_cleanup",
-            "task_id": task_id,
-            "document_id": document_id,
-            "created_at": time.time()
-        }
+            # 删除内容哈希登记，之后上传相同文件时重新索引
+            if doc_metadata.get("file_hash"):
+                self.dedup_index.remove_document(doc_metadata["user_id"], doc_metadata["file_hash"], document_id)
         
-        # 将任务添加到队列
-        self.redis.rpush("task_queue", json.dumps(task_data))
+            # 删除Redis缓存
+            self.redis.delete(f"doc:{document_id}:metadata")
+            
+            # 删除存储的文件
+            file_path = doc_metadata.get("file_path")
+            if file_path and os.path.exists(file_path):
+                try:
+                    os.unlink(file_path)
+                except Exception as e:
+                    logger.warning(f"删除文件{file_path}失败: {str(e)}")
+        
+            # 创建一个删除文档的后台任务来清理相关资源
+            task_id = str(uuid.uuid4())
+            task_data = {
+                "type": "document_cleanup",
+                "task_id": task_id,
+                "document_id": document_id,
+                "created_at": time.time()
+            }
+        
+            # 将任务添加到队列
+            self.redis.rpush("task_queue", json.dumps(task_data))
         
-        return True
+            return True
         
-    except ValueError as e:
-        raise e
-    except Exception as e:
-        logger.error(f"删除文档错误: {str(e)}")
-        raise Exception(f"删除文档失败: {str(e)}")
+        except ValueError as e:
+            raise e
+        except Exception as e:
+            logger.error(f"删除文档错误: {str(e)}")
+            raise Exception(f"删除文档失败: {str(e)}")
 
-def reindex_document(self, document_id: str) -> str:
-    """
-    重新索引文档
+    def reindex_document(self, document_id: str) -> str:
+        """
+        重新索引文档
     
-    Args:
-        document_id: 文档ID
+        Args:
+            document_id: 文档ID
         
-    Returns:
-        str: 任务ID
+        Returns:
+            str: 任务ID
         
-    Raises:
-        ValueError: 如果文档不存在
-    """
-    try:
-        # 检查文档是否存在
-        doc_metadata = self.get_document_metadata(document_id)
+        Raises:
+            ValueError: 如果文档不存在
+        """
+        try:
+            # 检查文档是否存在
+            doc_metadata = self.get_document_metadata(document_id)
+            
+            file_path = doc_metadata.get("file_path")
+            if file_path and os.path.exists(file_path):
+                # 重新处理存储的文件，只为变化的文本块生成嵌入
+                doc_metadata["status"] = "reindexing"
+                self._save_metadata(doc_metadata)
+                return self._enqueue_document_task(
+                    doc_metadata, file_path, doc_metadata.get("custom_metadata"), incremental=True
+                )
         
-        # 创建一个重新索引任务
+            # 没有存储的文件时只更新知识图谱
+            task_id = str(uuid.uuid4())
+            task_data = {
+                "type": "indexing",
+                "task_id": task_id,
+                "document_ids": [document_id],
+                "user_id": doc_metadata.get("user_id", ""),
+                "rebuild_all": False,
+                "created_at": time.time()
+            }
+        
+            # 将任务添加到队列
+            self.redis.rpush("task_queue", json.dumps(task_data))
+        
+            # 更新文档状态
+            doc_metadata["status"] = "reindexing"
+            self._save_metadata(doc_metadata)
+        
+            # 存储任务状态
+            self.redis.hset(
+                f"task:{task_id}",
+                mapping={
+                    "status": "queued",
+                    "type": "indexing",
+                    "document_ids": json.dumps([document_id]),
+                    "created_at": time.time(),
+                    "user_id": doc_metadata.get("user_id", "")
+                }
+            )
+        
+            return task_id
+        
+        except ValueError as e:
+            raise e
+        except Exception as e:
+            logger.error(f"重新索引文档错误: {str(e)}")
+            raise Exception(f"重新索引文档失败: {str(e)}")
+
+    def submit_embedding_repair(self, user_id: str, document_id: Optional[str] = None) -> str:
+        """
+        将嵌入修复任务加入队列后立即返回
+        
+        工作进程的embedding任务找出该用户（或其中一个文档）向量为零向量或包含NaN的文本块并重新嵌入，
+        进度记录在任务状态中。
+        
+        Args:
+            user_id: 用户ID
+            document_id: 可选的文档ID，只修复该文档的文本块
+        
+        Returns:
+            str: 任务ID
+        """
         task_id = str(uuid.uuid4())
         task_data = {
-            "type": "indexing",
+            "type": "embedding",
             "task_id": task_id,
-            "document_ids": [document_id],
-            "user_id": doc_metadata.get("user_id", ""),
-            "rebuild_all": False,
+            "user_id": user_id,
+            "document_id": document_id,
             "created_at": time.time()
         }
         
-        # 将任务添加到队列
-        self.redis.rpush("task_queue", json.dumps(task_data))
-        
-        # 更新文档状态
-        doc_metadata["status"] = "reindexing"
-        self.redis.set(
-            f"doc:{document_id}:metadata", 
-            json.dumps(doc_metadata),
-            ex=3600
-        )
-        
         # 存储任务状态
         self.redis.hset(
             f"task:{task_id}",
             mapping={
                 "status": "queued",
-                "type": "indexing",
-                "document_ids": json.dumps([document_id]),
+                "type": "embedding",
+                "document_ids": json.dumps([document_id] if document_id else []),
                 "created_at": time.time(),
-                "user_id": doc_metadata.get("user_id", "")
+                "user_id": user_id
             }
         )
         
+        # 将任务添加到队列
+        self.redis.rpush("task_queue", json.dumps(task_data))
+        
         return task_id
+    
+    def repair_embeddings(self, user_id: Optional[str] = None, document_id: Optional[str] = None,
+                          on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        重新嵌入向量为零向量或包含NaN的文本块
         
-    except ValueError as e:
-        raise e
-    except Exception as e:
-        logger.error(f"重新索引文档错误: {str(e)}")
-        raise Exception(f"重新索引文档失败: {str(e)}")
-
-def get_task_status(self, task_id: str) -> Dict[str, Any]:
-    """
-    获取任务状态
+        早期版本在嵌入失败时写入零向量，这些点无法被检索到。遍历向量存储（可按用户或文档限定）
+        找出无效的点，从文本块存储读取正文重新生成嵌入并替换向量，有效载荷不变。
+        文本块存储中没有正文的点无法修复，需要重新索引对应的文档。
+        
+        Args:
+            user_id: 可选用户ID，只检查该用户的文本块
+            document_id: 可选文档ID，只检查该文档的文本块
+            on_progress: 可选的进度回调，每修复一批后以当前进度调用
+        
+        Returns:
+            Dict[str, Any]: 检查的点数、无效点数、已修复数、缺少正文的点数和处理时间
+        """
+        start_time = time.time()
+        
+        filter_ = {}
+        if user_id:
+            filter_["user_id"] = user_id
+        if document_id:
+            filter_["document_id"] = document_id
+        scan = self.vector_store.find_invalid_vectors(filter_)
+        invalid_ids = scan["invalid_ids"]
+        
+        progress = {
+            "points_scanned": scan["scanned"],
+            "points_invalid": len(invalid_ids),
+            "points_repaired": 0,
+            "points_missing_text": 0
+        }
+        if on_progress:
+            on_progress(dict(progress))
+        
+        batch_size = self.config["embedding"]["batch_size"]
+        for start in range(0, len(invalid_ids), batch_size):
+            batch_ids = invalid_ids[start:start + batch_size]
+            texts = self.chunk_store.get_many(batch_ids)
+            point_ids = [point_id for point_id in batch_ids if point_id in texts]
+            progress["points_missing_text"] += len(batch_ids) - len(point_ids)
+            
+            if point_ids:
+                vectors = get_embeddings([texts[point_id] for point_id in point_ids])
+                self.vector_store.update_vectors(dict(zip(point_ids, vectors)))
+                progress["points_repaired"] += len(point_ids)
+            
+            if on_progress:
+                on_progress(dict(progress))
+        
+        logger.info(
+            f"嵌入修复完成: 检查 {progress['points_scanned']} 个点, 无效 {progress['points_invalid']} 个, "
+            f"修复 {progress['points_repaired']} 个, 缺少正文 {progress['points_missing_text']} 个"
+        )
+        return {**progress, "processing_time": time.time() - start_time}
     
-    Args:
-        task_id: 任务ID
+    def get_task_status(self, task_id: str) -> Dict[str, Any]:
+        """
+        获取任务状态
+    
+        Args:
+            task_id: 任务ID
         
-    Returns:
-        Dict[str, Any]: 任务状态信息
+        Returns:
+            Dict[str, Any]: 任务状态信息
         
-    Raises:
-        ValueError: 如果任务不存在
-    """
-    try:
-        # 从Redis获取任务状态
-        task_data = self.redis.hgetall(f"task:{task_id}")
+        Raises:
+            ValueError: 如果任务不存在
+        """
+        try:
+            # 从Redis获取任务状态
+            task_data = self.redis.hgetall(f"task:{task_id}")
         
-        if not task_data:
-            raise ValueError(f"任务 {task_id} 不存在")
+            if not task_data:
+                raise ValueError(f"任务 {task_id} 不存在")
         
-        # 转换某些字段
-        if "document_ids" in task_data and task_data["document_ids"]:
-            task_data["document_ids"] = json.loads(task_data["document_ids"])
+            # 转换某些字段
+            if "document_ids" in task_data and task_data["document_ids"]:
+                task_data["document_ids"] = json.loads(task_data["document_ids"])
         
-        if "created_at" in task_data and task_data["created_at"]:
-            task_data["created_at"] = float(task_data["created_at"])
+            if "created_at" in task_data and task_data["created_at"]:
+                task_data["created_at"] = float(task_data["created_at"])
         
-        if "completed_at" in task_data and task_data["completed_at"]:
-            task_data["completed_at"] = float(task_data["completed_at"])
+            if "completed_at" in task_data and task_data["completed_at"]:
+                task_data["completed_at"] = float(task_data["completed_at"])
         
-        return task_data
+            # 压缩包导入和嵌入修复进度
+            for field in ARCHIVE_PROGRESS_FIELDS + REPAIR_PROGRESS_FIELDS:
+                if task_data.get(field):
+                    task_data[field] = int(task_data[field])
+            if "errors" in task_data and task_data["errors"]:
+                task_data["errors"] = json.loads(task_data["errors"])
+            
+            return task_data
         
-    except ValueError as e:
-        raise e
-    except Exception as e:
-        logger.error(f"获取任务状态错误: {str(e)}")
-        raise Exception(f"获取任务状态失败: {str(e)}")
\ No newline at end of file
+        except ValueError as e:
+            raise e
+        except Exception as e:
+            logger.error(f"获取任务状态错误: {str(e)}")
+            raise Exception(f"获取任务状态失败: {str(e)}")
\ No newline at end of file
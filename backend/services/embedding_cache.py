@@ -0,0 +1,255 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Sequence
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# SQLite单条语句的参数个数上限（保守取值）
+_MAX_SQL_PARAMS = 500
+
+# 每写入多少个向量检查一次磁盘层的总大小
+_EVICT_CHECK_INTERVAL = 1000
+
+class EmbeddingCache:
+    """
+    按内容寻址的两级嵌入缓存
+    
+    键为 sha256(模型名, 规范化文本)，规范化只合并空白字符。
+    - 内存层: 进程内按字节数限制的LRU，保存float32数组
+    - 磁盘层: SQLite（WAL模式），向量以float32原始字节保存，API和工作进程通过共享的
+      数据目录使用同一个数据库；总大小超过上限时按最近访问时间淘汰
+    
+    重复的搜索查询、跨文档重复的段落和重新索引时未变化的文本块不再调用嵌入模型。
+    """
+    
+    def __init__(self, config_path: str = "configs/ollama.yaml"):
+        # 加载配置
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+        
+        cache_settings = config.get("embedding_cache") or {}
+        self.enabled = cache_settings.get("enabled", True)
+        self.memory_max_bytes = cache_settings.get("memory_max_mb", 64) * 1024 * 1024
+        self.path = cache_settings.get("path", "/app/data/embedding_cache.db")
+        self.disk_max_bytes = cache_settings.get("disk_max_size_mb", 2048) * 1024 * 1024
+        
+        self._memory: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_check = 0
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if self.enabled and self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS vectors ("
+                    "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL) WITHOUT ROWID"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_vectors_last_access ON vectors (last_access)")
+        
+        logger.info(
+            f"嵌入缓存初始化完成: 内存 {self.memory_max_bytes // (1024 * 1024)}MB, "
+            f"磁盘 {self.path if self.enabled and self.path else '未启用'}"
+        )
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化文本：合并连续空白字符并去掉首尾空白"""
+        return " ".join(text.split())
+    
+    @classmethod
+    def cache_key(cls, model: str, text: str) -> bytes:
+        """缓存键：模型名和规范化文本的SHA-256摘要（32字节）"""
+        return hashlib.sha256(f"{model}\0{cls.normalize(text)}".encode("utf-8")).digest()
+    
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        查找一组文本的缓存向量
+        
+        Args:
+            model: 嵌入模型名
+            texts: 文本列表
+        
+        Returns:
+            List[Optional[np.ndarray]]: 与输入顺序一致的float32向量，未命中的位置为None
+        """
+        if not self.enabled:
+            self.misses += len(texts)
+            return [None] * len(texts)
+        
+        keys = [self.cache_key(model, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+        memory_hits = sum(1 for vector in results if vector is not None)
+        
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        disk_hits = 0
+        if missing and self.path:
+            found = self._disk_get([keys[i] for i in missing])
+            for i in missing:
+                vector = found.get(keys[i])
+                if vector is not None:
+                    results[i] = vector
+                    disk_hits += 1
+                    self._memory_put(keys[i], vector)
+        
+        self.memory_hits += memory_hits
+        self.disk_hits += disk_hits
+        self.misses += len(texts) - memory_hits - disk_hits
+        return results
+    
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """把新生成的向量写入两级缓存"""
+        if not self.enabled or not texts:
+            return
+        
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            key = self.cache_key(model, text)
+            array = np.asarray(vector, dtype=np.float32)
+            entries[key] = array
+            self._memory_put(key, array)
+        
+        if self.path:
+            self._disk_put(entries)
+    
+    def _memory_put(self, key: bytes, vector: np.ndarray):
+        """写入内存层，超过字节上限时淘汰最久未使用的向量"""
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous.nbytes
+            self._memory[key] = vector
+            self._memory_bytes += vector.nbytes
+            
+            while self._memory_bytes > self.memory_max_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.nbytes
+    
+    def _disk_get(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """从磁盘层批量读取向量并更新访问时间"""
+        found = {}
+        try:
+            conn = self._connect()
+            for start in range(0, len(keys), _MAX_SQL_PARAMS):
+                batch = keys[start:start + _MAX_SQL_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({placeholders})", batch
+                ):
+                    found[bytes(key)] = np.frombuffer(blob, dtype=np.float32)
+            
+            if found:
+                now = time.time()
+                with conn:
+                    conn.executemany(
+                        "UPDATE vectors SET last_access = ? WHERE key = ?", [(now, key) for key in found]
+                    )
+        except Exception as e:
+            # 磁盘层不可用时只使用内存层
+            logger.warning(f"读取嵌入缓存失败: {str(e)}")
+        return found
+    
+    def _disk_put(self, entries: Dict[bytes, np.ndarray]):
+        """写入磁盘层，定期按最近访问时间淘汰"""
+        try:
+            now = time.time()
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO vectors (key, vector, last_access) VALUES (?, ?, ?)",
+                    [(key, vector.tobytes(), now) for key, vector in entries.items()]
+                )
+            
+            with self._lock:
+                self._writes_since_check += len(entries)
+                check = self._writes_since_check >= _EVICT_CHECK_INTERVAL
+                if check:
+                    self._writes_since_check = 0
+            if check:
+                self._evict()
+        except Exception as e:
+            logger.warning(f"写入嵌入缓存失败: {str(e)}")
+    
+    def _evict(self):
+        """按最近访问时间淘汰磁盘层的向量，直到总大小不超过上限的90%"""
+        conn = self._connect()
+        total = conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM vectors").fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        
+        target = int(self.disk_max_bytes * 0.9)
+        evicted = []
+        for key, size in conn.execute("SELECT key, LENGTH(vector) FROM vectors ORDER BY last_access"):
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        
+        with conn:
+            conn.executemany("DELETE FROM vectors WHERE key = ?", evicted)
+        logger.info(f"嵌入缓存淘汰 {len(evicted)} 个向量")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        缓存统计
+        
+        Returns:
+            Dict[str, Any]: 本进程的各层命中次数和命中率、内存层和磁盘层的条目数及占用字节数
+        """
+        with self._lock:
+            memory_entries, memory_bytes = len(self._memory), self._memory_bytes
+        
+        disk_entries, disk_bytes = 0, 0
+        if self.enabled and self.path:
+            disk_entries, disk_bytes = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM vectors"
+            ).fetchone()
+        
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "memory_bytes": memory_bytes,
+            "memory_max_bytes": self.memory_max_bytes,
+            "disk_entries": disk_entries,
+            "disk_bytes": disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+        }
+
+@lru_cache(maxsize=None)
+def get_embedding_cache(config_path: str = "configs/ollama.yaml") -> EmbeddingCache:
+    """获取嵌入缓存，同一进程中使用相同配置的LLM服务共享内存层"""
+    return EmbeddingCache(config_path)
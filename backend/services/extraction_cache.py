@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import codecs
+import hashlib
+import logging
+import sqlite3
+import threading
+import yaml
+from typing import Dict, Any, Optional, BinaryIO, Iterator
+from ..processors.base import DocumentProcessor, render_section
+
+logger = logging.getLogger(__name__)
+
+# 命中时每次产出的文本片段大小（字节，解压前）
+_READ_BLOCK_SIZE = 64 * 1024
+
+class ExtractionCache:
+    """
+    文本提取结果缓存
+    
+    以(file_hash, processor_name, processor_version)为键，把处理器产出的文本（zlib压缩）
+    写入本地磁盘上的独立文件，提取的元数据、大小和最近访问时间记录在SQLite索引中。
+    总大小超过上限时按最近访问时间淘汰（LRU）。
+    
+    重新索引、更换分块策略或嵌入模型时，命中的文档直接流式解压缓存的文本，不再解析原文件。
+    处理器代码或配置变化时processor_version随之变化，旧条目不再命中并逐渐被淘汰。
+    """
+    
+    def __init__(self, config_path: str = "configs/worker.yaml"):
+        # 加载配置
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+        
+        cache_settings = config.get("extraction_cache") or {}
+        self.enabled = cache_settings.get("enabled", True)
+        self.directory = cache_settings.get("path", "/app/data/extraction_cache")
+        self.max_size = cache_settings.get("max_size_mb", 2048) * 1024 * 1024
+        self.compression_level = cache_settings.get("compression_level", 6)
+        
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL, metadata TEXT NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        
+        logger.info(f"提取缓存初始化完成: {self.directory if self.enabled else '未启用'}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的索引数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def cache_key(file_hash: str, processor: DocumentProcessor) -> str:
+        """缓存键：文件哈希、处理器名称和处理器版本的摘要"""
+        raw = f"{file_hash}:{processor.name}:{processor.cache_version}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def _data_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.z")
+    
+    def iter_extract(self, file_hash: str, processor: DocumentProcessor, file: BinaryIO,
+                     metadata: Dict[str, Any]) -> Iterator[str]:
+        """
+        逐段产出文档的提取文本，命中缓存时不解析原文件
+        
+        未命中时调用处理器流式提取，同时把文本压缩写入临时文件，提取完整结束后才登记到缓存；
+        提取失败或调用方提前停止读取时丢弃临时文件。
+        
+        Args:
+            file_hash: 文件内容哈希
+            processor: 文档处理器
+            file: 文件对象（命中缓存时不读取）
+            metadata: 提取的元数据会写入此字典
+        
+        Yields:
+            str: 渲染后的文本片段
+        """
+        if not self.enabled:
+            for section in processor.iter_sections(file, metadata):
+                yield render_section(section)
+            return
+        
+        key = self.cache_key(file_hash, processor)
+        cached = self._lookup(key)
+        if cached is not None:
+            self.hits += 1
+            logger.info(f"提取缓存命中: {file_hash[:12]} ({processor.name})")
+            metadata.update(cached)
+            yield from self._read(key)
+            return
+        
+        self.misses += 1
+        yield from self._extract_and_store(key, processor, file, metadata)
+    
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """查找缓存条目并更新访问时间，返回提取的元数据；不存在或数据文件丢失时返回None"""
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT metadata FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            
+            if not os.path.exists(self._data_path(key)):
+                with conn:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            
+            with conn:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+        except Exception as e:
+            # 缓存不可用时退回到正常提取
+            logger.warning(f"读取提取缓存索引失败: {str(e)}")
+            return None
+    
+    def _read(self, key: str) -> Iterator[str]:
+        """流式解压缓存的文本"""
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        with open(self._data_path(key), "rb") as f:
+            while True:
+                block = f.read(_READ_BLOCK_SIZE)
+                if not block:
+                    break
+                text = decoder.decode(decompressor.decompress(block))
+                if text:
+                    yield text
+        text = decoder.decode(decompressor.flush(), final=True)
+        if text:
+            yield text
+    
+    def _extract_and_store(self, key: str, processor: DocumentProcessor, file: BinaryIO,
+                           metadata: Dict[str, Any]) -> Iterator[str]:
+        """提取文本并写入缓存"""
+        data_path = self._data_path(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        temp_path = f"{data_path}.{uuid.uuid4().hex}.tmp"
+        compressor = zlib.compressobj(self.compression_level)
+        completed = False
+        
+        try:
+            with open(temp_path, "wb") as f:
+                for section in processor.iter_sections(file, metadata):
+                    text = render_section(section)
+                    f.write(compressor.compress(text.encode("utf-8")))
+                    yield text
+                f.write(compressor.flush())
+            completed = True
+        finally:
+            if completed:
+                self._commit(key, temp_path, data_path, metadata)
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def _commit(self, key: str, temp_path: str, data_path: str, metadata: Dict[str, Any]):
+        """登记新的缓存条目，并在总大小超过上限时淘汰最久未访问的条目"""
+        try:
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, data_path)
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, size, last_access, metadata) VALUES (?, ?, ?, ?)",
+                    (key, size, time.time(), json.dumps(metadata, default=str))
+                )
+            self._evict()
+        except Exception as e:
+            logger.warning(f"写入提取缓存失败: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def _evict(self):
+        """按最近访问时间淘汰条目，直到总大小不超过上限"""
+        conn = self._connect()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+        
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            if total <= self.max_size:
+                break
+            evicted.append(key)
+            total -= size
+        
+        with conn:
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+        for key in evicted:
+            try:
+                os.remove(self._data_path(key))
+            except FileNotFoundError:
+                pass
+        logger.info(f"提取缓存淘汰 {len(evicted)} 个条目")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        缓存统计
+        
+        Returns:
+            Dict[str, Any]: 条目数、占用字节数、大小上限以及本进程的命中和未命中次数
+        """
+        entries, size = 0, 0
+        if self.enabled:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,392 @@
+import io
+import os
+import time
+import signal
+import resource
+import logging
+import importlib
+import threading
+import multiprocessing
+import multiprocessing.util
+import yaml
+from typing import Dict, Any, List, Optional, BinaryIO, Iterator, Union
+from ..processors.base import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+# 子进程每次发送的分段文本量（字符）
+_SEND_BATCH_CHARS = 256 * 1024
+
+# 所有存活的提取子进程，进程退出时连同其进程组一起终止
+_live_workers = set()
+_live_workers_lock = threading.Lock()
+
+class ExtractionLimitExceeded(Exception):
+    """提取超出时间或内存限制，或子进程异常退出"""
+    
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+def _is_memory_error(e: BaseException) -> bool:
+    """异常或其链上的原因是否为内存分配失败（处理器通常把底层异常包装为Exception）"""
+    while e is not None:
+        if isinstance(e, MemoryError):
+            return True
+        e = e.__cause__ or e.__context__
+    return False
+
+def _sandbox_main(conn, max_tasks: int, address_space_limit: Optional[int]):
+    """
+    提取子进程主循环
+    
+    接收(处理器"模块:类", 文件路径或文件内容)，把处理器产出的分段按批发回父进程，
+    完成后发送提取的元数据；处理max_tasks个文件后退出，由父进程换上新的子进程。
+    
+    子进程是自己进程组的组长，处理器创建的进程（如PDF按页并行提取的进程池）属于同一进程组，
+    父进程终止子进程时整个进程组一起终止。
+    
+    address_space_limit为地址空间硬上限（RLIMIT_AS，由子进程创建的进程继承）：父进程每隔
+    poll_interval_seconds检查一次常驻内存，两次检查之间的突发分配在此上限处以MemoryError失败，
+    不会耗尽整个容器的内存。内存分配失败后子进程状态未知，报告后直接退出。
+    """
+    os.setpgrp()
+    if address_space_limit:
+        _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+        if hard_limit != resource.RLIM_INFINITY:
+            address_space_limit = min(address_space_limit, hard_limit)
+        resource.setrlimit(resource.RLIMIT_AS, (address_space_limit, hard_limit))
+    
+    processors = {}
+    for _ in range(max_tasks):
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        
+        target, source = task
+        try:
+            if target not in processors:
+                module_name, class_name = target.split(":")
+                processors[target] = getattr(importlib.import_module(module_name), class_name)()
+            processor = processors[target]
+            
+            metadata = {}
+            batch, batch_chars = [], 0
+            with (open(source, "rb") if isinstance(source, str) else io.BytesIO(source)) as file:
+                for section in processor._iter_sections(file, metadata):
+                    batch.append(section)
+                    batch_chars += len(section.get("text", ""))
+                    if batch_chars >= _SEND_BATCH_CHARS:
+                        conn.send(("sections", batch))
+                        batch, batch_chars = [], 0
+            if batch:
+                conn.send(("sections", batch))
+            conn.send(("done", metadata))
+        
+        except Exception as e:
+            if _is_memory_error(e):
+                conn.send(("memory", str(e)))
+                return
+            conn.send(("error", str(e)))
+
+class _SandboxWorker:
+    """一个提取子进程及其通信管道"""
+    
+    def __init__(self, context, max_tasks: int, address_space_limit: Optional[int] = None):
+        self.conn, child_conn = context.Pipe()
+        # 不是守护进程，处理器可以在子进程中再创建进程池；退出时由_kill_live_workers终止
+        self.process = context.Process(target=_sandbox_main, args=(child_conn, max_tasks, address_space_limit))
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        with _live_workers_lock:
+            _live_workers.add(self)
+    
+    def rss_bytes(self) -> Optional[int]:
+        """子进程及其创建的进程当前的常驻内存之和，无法读取时返回None"""
+        total = None
+        for pid in _process_tree(self.process.pid):
+            try:
+                with open(f"/proc/{pid}/status", "r") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total = (total or 0) + int(line.split()[1]) * 1024
+                            break
+            except (OSError, ValueError):
+                # 进程已退出
+                pass
+        return total
+    
+    def _kill_group(self):
+        """终止子进程的整个进程组"""
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            # 进程组已经全部退出，或子进程还未成为进程组组长，直接终止子进程本身
+            self.process.kill()
+    
+    def kill(self):
+        """立即终止子进程及其创建的进程"""
+        self._kill_group()
+        self.process.join()
+        self.conn.close()
+        with _live_workers_lock:
+            _live_workers.discard(self)
+    
+    def stop(self):
+        """通知子进程退出"""
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=5)
+        # 子进程已退出时仍清理进程组中可能残留的进程
+        self._kill_group()
+        self.process.join()
+        self.conn.close()
+        with _live_workers_lock:
+            _live_workers.discard(self)
+
+def _process_tree(pid: int) -> List[int]:
+    """进程及其全部后代进程的PID（读取/proc/<pid>/task/<tid>/children）"""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            for tid in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{tid}/children", "r") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return pids
+
+def _kill_live_workers():
+    """进程退出时终止全部提取子进程；子进程不是守护进程，否则multiprocessing会在退出时等待它们"""
+    with _live_workers_lock:
+        workers = list(_live_workers)
+    for worker in workers:
+        worker._kill_group()
+
+# 在multiprocessing退出时等待非守护子进程之前执行
+multiprocessing.util.Finalize(None, _kill_live_workers, exitpriority=10)
+
+class ExtractionSandbox:
+    """
+    提取沙箱
+    
+    文档处理器在子进程池中运行，每个文件有墙钟时间和常驻内存上限（子进程及其创建的进程之和）。
+    常驻内存按poll_interval_seconds检查；子进程还设置了max_memory_mb加address_space_headroom_mb的
+    地址空间硬上限，两次检查之间的突发分配（如压缩炸弹）以MemoryError失败。
+    超限的子进程被立即终止，该文件以ExtractionLimitExceeded失败（reason为timeout、memory或crash），
+    其他文件的提取不受影响。子进程处理max_tasks_per_child个文件后退出并由新进程替换，
+    避免内存碎片积累。
+    
+    墙钟时间只计父进程等待子进程产出的时间：流水线下游处理较慢时子进程因管道写满而阻塞，
+    这段时间不计入限制。另有从开始提取起计算的总时间上限max_total_seconds，
+    不断产出分段的失控提取也会被终止。子进程在第一次提取时才启动，API进程不会创建子进程。
+    """
+    
+    def __init__(self, config_path: str = "configs/worker.yaml"):
+        # 加载配置
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+        
+        sandbox_settings = config.get("extraction_sandbox") or {}
+        self.enabled = sandbox_settings.get("enabled", True)
+        self.max_workers = sandbox_settings.get("workers") or config["worker"]["threads"]
+        self.timeout = sandbox_settings.get("timeout_seconds", 300)
+        self.max_total_time = sandbox_settings.get("max_total_seconds", 900)
+        self.max_memory = sandbox_settings.get("max_memory_mb", 2048) * 1024 * 1024
+        # 地址空间包含未使用的映射（线程栈、malloc区域），硬上限比常驻内存上限留出余量；None表示不设置
+        headroom_mb = sandbox_settings.get("address_space_headroom_mb", 1024)
+        self.address_space_limit = None if headroom_mb is None else self.max_memory + headroom_mb * 1024 * 1024
+        self.max_tasks_per_child = sandbox_settings.get("max_tasks_per_child", 50)
+        self.poll_interval = sandbox_settings.get("poll_interval_seconds", 0.2)
+        
+        start_method = sandbox_settings.get("start_method", "forkserver")
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = "spawn"
+        self._context = multiprocessing.get_context(start_method)
+        
+        self._idle: List[_SandboxWorker] = []
+        self._worker_count = 0
+        self._condition = threading.Condition()
+        self.stats = {"tasks": 0, "timeouts": 0, "memory_kills": 0, "crashes": 0, "recycled": 0}
+    
+    def wrap(self, processor: DocumentProcessor) -> DocumentProcessor:
+        """返回在沙箱中运行的处理器；未启用沙箱时原样返回"""
+        if not self.enabled:
+            return processor
+        return SandboxedProcessor(processor, self)
+    
+    def _acquire(self) -> _SandboxWorker:
+        """取一个空闲子进程，没有时在上限内启动新的子进程，否则等待"""
+        with self._condition:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.process.is_alive():
+                        return worker
+                    worker.kill()
+                    self._worker_count -= 1
+                if self._worker_count < self.max_workers:
+                    self._worker_count += 1
+                    break
+                self._condition.wait()
+        
+        try:
+            return _SandboxWorker(self._context, self.max_tasks_per_child, self.address_space_limit)
+        except Exception:
+            with self._condition:
+                self._worker_count -= 1
+                self._condition.notify()
+            raise
+    
+    def _release(self, worker: _SandboxWorker, healthy: bool):
+        """归还子进程；异常或达到任务数上限的子进程被回收"""
+        if healthy and worker.tasks >= self.max_tasks_per_child:
+            # 子进程已自行退出循环
+            worker.stop()
+            self.stats["recycled"] += 1
+            healthy = False
+        elif not healthy:
+            worker.kill()
+        
+        with self._condition:
+            if healthy:
+                self._idle.append(worker)
+            else:
+                self._worker_count -= 1
+            self._condition.notify()
+    
+    def run(self, processor: DocumentProcessor, source: Union[str, bytes],
+            metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        在子进程中提取文件，逐个产出分段
+        
+        Args:
+            processor: 文档处理器，子进程中按其类重新创建
+            source: 文件路径，或内存中文件的内容（如压缩包成员）
+            metadata: 提取的元数据会写入此字典
+        
+        Yields:
+            Dict[str, Any]: 处理器产出的分段（不含offset和length）
+        
+        Raises:
+            ExtractionLimitExceeded: 超出时间或内存限制，或子进程异常退出
+        """
+        target = f"{type(processor).__module__}:{type(processor).__qualname__}"
+        filename = os.path.basename(source) if isinstance(source, str) else f"内存文件({len(source)}字节)"
+        worker = self._acquire()
+        healthy = False
+        waited = 0.0
+        peak_rss = 0
+        
+        try:
+            deadline = time.monotonic() + self.max_total_time
+            worker.conn.send((target, source))
+            worker.tasks += 1
+            self.stats["tasks"] += 1
+            
+            while True:
+                start_time = time.monotonic()
+                ready = worker.conn.poll(self.poll_interval)
+                waited += time.monotonic() - start_time
+                
+                if ready:
+                    try:
+                        kind, payload = worker.conn.recv()
+                    except (EOFError, OSError):
+                        # 子进程退出时管道被关闭
+                        ready = False
+                    else:
+                        if kind == "sections":
+                            yield from payload
+                        elif kind == "done":
+                            metadata.update(payload)
+                            healthy = True
+                            return
+                        elif kind == "memory":
+                            # 地址空间硬上限处的分配失败，子进程已退出
+                            self.stats["memory_kills"] += 1
+                            raise ExtractionLimitExceeded(
+                                f"提取 {filename} 时内存分配失败，超过地址空间上限 "
+                                f"{self.address_space_limit // (1024 * 1024)}MB", "memory"
+                            )
+                        else:
+                            # 处理器自身的错误，子进程仍可继续使用
+                            healthy = True
+                            raise Exception(payload)
+                
+                if not ready and not worker.process.is_alive():
+                    if self.address_space_limit and peak_rss > self.max_memory // 2:
+                        # 扩展模块在地址空间硬上限处分配失败时可能直接使进程崩溃，而不是抛出MemoryError
+                        self.stats["memory_kills"] += 1
+                        raise ExtractionLimitExceeded(
+                            f"提取 {filename} 时子进程在内存占用 {peak_rss // (1024 * 1024)}MB 后异常退出"
+                            f"（退出码 {worker.process.exitcode}），可能超过地址空间上限", "memory"
+                        )
+                    self.stats["crashes"] += 1
+                    raise ExtractionLimitExceeded(
+                        f"提取 {filename} 时子进程异常退出（退出码 {worker.process.exitcode}）", "crash"
+                    )
+                
+                if waited > self.timeout:
+                    self.stats["timeouts"] += 1
+                    raise ExtractionLimitExceeded(f"提取 {filename} 超过时间限制 {self.timeout} 秒", "timeout")
+                if time.monotonic() > deadline:
+                    self.stats["timeouts"] += 1
+                    raise ExtractionLimitExceeded(
+                        f"提取 {filename} 超过总时间限制 {self.max_total_time} 秒", "timeout"
+                    )
+                
+                rss = worker.rss_bytes()
+                peak_rss = max(peak_rss, rss or 0)
+                if rss is not None and rss > self.max_memory:
+                    self.stats["memory_kills"] += 1
+                    raise ExtractionLimitExceeded(
+                        f"提取 {filename} 超过内存限制 {self.max_memory // (1024 * 1024)}MB"
+                        f"（{rss // (1024 * 1024)}MB）", "memory"
+                    )
+        finally:
+            # 未正常结束（超限、调用方提前停止读取）的子进程状态未知，直接终止
+            if not healthy:
+                logger.warning(f"终止提取子进程 {worker.process.pid}: {filename}")
+            self._release(worker, healthy)
+    
+    def shutdown(self):
+        """停止全部空闲子进程"""
+        with self._condition:
+            workers, self._idle = self._idle, []
+            self._worker_count -= len(workers)
+        for worker in workers:
+            worker.stop()
+
+class SandboxedProcessor(DocumentProcessor):
+    """在提取沙箱子进程中运行的处理器，缓存键和版本与被包装的处理器相同"""
+    
+    def __init__(self, processor: DocumentProcessor, sandbox: ExtractionSandbox):
+        self.processor = processor
+        self.sandbox = sandbox
+    
+    @property
+    def name(self) -> str:
+        return self.processor.name
+    
+    @property
+    def cache_version(self) -> str:
+        return self.processor.cache_version
+    
+    def _iter_sections(self, file: BinaryIO, metadata: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """磁盘上的文件和内存中的BytesIO在子进程中提取，其他文件对象仍在当前进程中提取"""
+        file_path = self._get_file_path(file)
+        if file_path is not None:
+            yield from self.sandbox.run(self.processor, file_path, metadata)
+        elif isinstance(file, io.BytesIO):
+            yield from self.sandbox.run(self.processor, file.getvalue(), metadata)
+        else:
+            yield from self.processor._iter_sections(file, metadata)
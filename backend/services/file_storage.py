@@ -0,0 +1,152 @@
+import os
+import logging
+import yaml
+import uuid
+import hashlib
+from typing import Dict, Any, BinaryIO, Optional
+
+logger = logging.getLogger(__name__)
+
+# 默认的读写块大小（1MB）
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+class FileTooLargeError(ValueError):
+    """上传文件超过大小限制"""
+    pass
+
+def hash_file_object(file: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE) -> Dict[str, Any]:
+    """
+    按块增量计算文件对象的SHA-256，不把整个文件读入内存
+
+    Args:
+        file: 文件对象
+        block_size: 每次读取的字节数
+
+    Returns:
+        Dict[str, Any]: 包含file_hash和file_size
+    """
+    hasher = hashlib.sha256()
+    file_size = 0
+
+    for block in iter(lambda: file.read(block_size), b""):
+        hasher.update(block)
+        file_size += len(block)
+
+    file.seek(0)  # 重置文件指针
+
+    return {"file_hash": hasher.hexdigest(), "file_size": file_size}
+
+class FileStorage:
+    """上传文件存储，按固定大小的块流式落盘并增量计算哈希"""
+
+    def __init__(self, config_path: str = "configs/worker.yaml"):
+        # 加载配置
+        with open(config_path, "r") as f:
+            self.config = yaml.safe_load(f)
+
+        storage_settings = self.config["document_processing"]["storage"]
+        self.storage_path = storage_settings["path"]
+        self.max_size = storage_settings["max_size_mb"] * 1024 * 1024
+        self.block_size = storage_settings.get("block_size_kb", DEFAULT_BLOCK_SIZE // 1024) * 1024
+
+        # 确保存储目录存在
+        os.makedirs(self.storage_path, exist_ok=True)
+
+        logger.info(f"文件存储初始化完成: {self.storage_path}, 大小限制: {storage_settings['max_size_mb']}MB")
+
+    def check_size(self, size: Optional[int], max_size: Optional[int] = None):
+        """检查声明的文件大小（如Content-Length）是否超过限制，max_size未指定时使用配置的限制"""
+        max_size = max_size or self.max_size
+        if size is not None and size > max_size:
+            raise FileTooLargeError(f"文件大小超过限制: {max_size // (1024 * 1024)}MB")
+
+    def open_writer(self, filename: str) -> "UploadWriter":
+        """
+        在存储目录中创建一个按块写入的新文件，用于边接收边落盘的上传
+
+        Args:
+            filename: 原始文件名（只用于保留扩展名）
+
+        Returns:
+            UploadWriter: 写入完成后调用commit，失败时调用abort
+        """
+        return UploadWriter(self._new_path(filename))
+
+    def save_file(self, file: BinaryIO, filename: str, max_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        将同步文件对象按块写入存储目录，同时计算哈希并检查大小限制
+
+        Args:
+            file: 文件对象
+            filename: 原始文件名
+            max_size: 可选的大小限制（字节），如压缩包成员使用单独的限制
+
+        Returns:
+            Dict[str, Any]: 包含path、file_hash和file_size
+
+        Raises:
+            FileTooLargeError: 如果文件超过大小限制
+        """
+        writer = self.open_writer(filename)
+        try:
+            for block in iter(lambda: file.read(self.block_size), b""):
+                self.check_size(writer.file_size + len(block), max_size)
+                writer.write(block)
+            return writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def delete(self, path: str):
+        """删除存储的文件"""
+        try:
+            if os.path.exists(path):
+                os.unlink(path)
+        except Exception as e:
+            logger.warning(f"删除文件{path}失败: {str(e)}")
+
+    def _new_path(self, filename: str) -> str:
+        """生成存储路径，保留原始扩展名（.tar.gz保留两级后缀）"""
+        ext = os.path.splitext(filename)[1].lower()
+        if filename.lower().endswith(".tar.gz"):
+            ext = ".tar.gz"
+        return os.path.join(self.storage_path, f"{uuid.uuid4()}{ext}")
+
+class UploadWriter:
+    """
+    存储目录中正在写入的文件
+
+    数据写入<path>.part并增量计算哈希，commit后才移动到最终路径，abort删除不完整的文件。
+    write、commit和abort都是阻塞的文件操作，异步调用方应在线程池中执行。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = path + ".part"
+        self.file_size = 0
+        self._hasher = hashlib.sha256()
+        self._file = open(self.tmp_path, "wb")
+
+    def write(self, block: bytes):
+        """追加一块数据"""
+        self._hasher.update(block)
+        self._file.write(block)
+        self.file_size += len(block)
+
+    def commit(self) -> Dict[str, Any]:
+        """
+        完成写入
+
+        Returns:
+            Dict[str, Any]: 包含path、file_hash和file_size
+        """
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        logger.debug(f"文件已写入 {self.path}, 大小: {self.file_size}")
+        return {"path": self.path, "file_hash": self._hasher.hexdigest(), "file_size": self.file_size}
+
+    def abort(self):
+        """放弃写入并删除不完整的文件"""
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
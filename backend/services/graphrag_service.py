@@ -6,12 +6,14 @@ import networkx as nx
 import numpy as np
 from .vector_store import VectorStore
 from .llm_service import LLMService
+from .chunk_store import ChunkStore
 
 logger = logging.getLogger(__name__)
 
 class GraphRAGService:
     def __init__(self, vector_store: VectorStore, llm_service: LLMService,
-                config_path: str = "configs/worker.yaml"):
+                config_path: str = "configs/worker.yaml",
+                chunk_store: Optional[ChunkStore] = None):
         # 加载配置
         with open(config_path, "r") as f:
             self.config = yaml.safe_load(f)
@@ -20,6 +22,9 @@ class GraphRAGService:
         self.vector_store = vector_store
         self.llm_service = llm_service
         
+        # 图节点不保存正文，返回上下文时从文本块存储读取
+        self.chunk_store = chunk_store or ChunkStore(config_path)
+        
         # 加载GraphRAG设置
         self.rag_settings = self.config["graphrag"]
         self.similarity_threshold = self.rag_settings["similarity_threshold"]
@@ -44,12 +49,14 @@ class GraphRAGService:
             if document_id:
                 filter_dict = {"document_id": document_id}
             
-            # 获取所有块
-            all_chunks = self.vector_store.query(
-                query_vector=[0.0] * 768,  # 使用空向量，将获取所有文档而不是相似匹配
-                limit=10000,  # 大量限制，实际上取决于数据库能返回的最大记录数
-                filter_=filter_dict
+            # 获取所有块及其向量（不含正文）
+            all_chunks = self.vector_store.scroll_points(
+                filter_dict,
+                payload_fields=["document_id", "ordinal"],
+                with_vectors=True
             )
+            # 按文档和块序号排列，使相邻节点对应文档中的相邻块
+            all_chunks.sort(key=lambda chunk: (chunk["payload"]["document_id"], chunk["payload"].get("ordinal") or 0))
             
             # 清理图形（如果更新特定文档）
             if document_id:
@@ -69,20 +76,13 @@ class GraphRAGService:
                 self.graph.add_node(
                     chunk_id,
                     document_id=doc_id,
-                    text=chunk["payload"]["text"],
-                    embedding=chunk["payload"].get("embedding", [])
+                    embedding=chunk["vector"]
                 )
             
             # 计算相似度并创建边
             chunk_ids = list(self.graph.nodes)
             for i, chunk_id in enumerate(chunk_ids):
                 # 获取当前块的向量嵌入
-                if not self.graph.nodes[chunk_id].get("embedding"):
-                    # 如果没有嵌入，获取文本并生成嵌入
-                    text = self.graph.nodes[chunk_id]["text"]
-                    embedding = self.llm_service.get_embedding(text)
-                    self.graph.nodes[chunk_id]["embedding"] = embedding
-                
                 current_embedding = self.graph.nodes[chunk_id]["embedding"]
                 current_doc_id = self.graph.nodes[chunk_id]["document_id"]
                 
@@ -99,12 +99,6 @@ class GraphRAGService:
                         continue
                     
                     # 计算其他相似块
-                    if not self.graph.nodes[other_id].get("embedding"):
-                        # 如果没有嵌入，获取文本并生成嵌入
-                        text = self.graph.nodes[other_id]["text"]
-                        embedding = self.llm_service.get_embedding(text)
-                        self.graph.nodes[other_id]["embedding"] = embedding
-                    
                     other_embedding = self.graph.nodes[other_id]["embedding"]
                     
                     # 计算余弦相似度
@@ -122,7 +116,8 @@ class GraphRAGService:
     
     def get_context_for_query(self, query: str, user_id: Optional[str] = None, 
                              document_ids: Optional[List[str]] = None, 
-                             max_results: int = 5) -> List[Dict[str, Any]]:
+                             max_results: int = 5,
+                             query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """
         为查询获取上下文信息
         
@@ -131,13 +126,15 @@ class GraphRAGService:
             user_id: 可选用户ID过滤
             document_ids: 可选文档ID列表过滤
             max_results: 最大返回结果数量
+            query_embedding: 可选的查询嵌入，异步路由通过嵌入客户端生成后传入
             
         Returns:
             List[Dict[str, Any]]: 相关上下文信息列表
         """
         try:
             # 生成查询嵌入
-            query_embedding = self.llm_service.get_embedding(query)
+            if query_embedding is None:
+                query_embedding = self.llm_service.get_embedding(query)
             
             # 准备过滤器
             filter_dict = {}
@@ -171,25 +168,20 @@ class GraphRAGService:
                 # 从图中获取节点信息
                 if chunk_id in self.graph:
                     node_data = self.graph.nodes[chunk_id]
-                    if "text" in node_data:
-                        # 计算与查询的相似度
-                        similarity = self._cosine_similarity(
-                            query_embedding, 
-                            node_data.get("embedding", self.llm_service.get_embedding(node_data["text"]))
-                        )
-                        
-                        detailed_results.append({
-                            "id": chunk_id,
-                            "text": node_data["text"],
-                            "score": similarity,
-                            "metadata": {
-                                "document_id": node_data.get("document_id", ""),
-                            }
-                        })
+                    # 计算与查询的相似度
+                    similarity = self._cosine_similarity(query_embedding, node_data["embedding"])
+                    
+                    detailed_results.append({
+                        "id": chunk_id,
+                        "score": similarity,
+                        "metadata": {
+                            "document_id": node_data.get("document_id", ""),
+                        }
+                    })
             
-            # 排序并限制结果数量
+            # 排序并限制结果数量，只为最终结果读取正文
             detailed_results.sort(key=lambda x: x["score"], reverse=True)
-            return detailed_results[:max_results]
+            return self._hydrate_text(detailed_results[:max_results])
             
         except Exception as e:
             logger.error(f"获取查询上下文时出错: {str(e)}")
@@ -202,14 +194,13 @@ class GraphRAGService:
                 )
                 
                 # 格式化结果
-                return [{
+                return self._hydrate_text([{
                     "id": result["id"],
-                    "text": result["payload"]["text"],
                     "score": result["score"],
                     "metadata": {
                         "document_id": result["payload"].get("document_id", ""),
                     }
-                } for result in fallback_results]
+                } for result in fallback_results])
             except:
                 logger.error("回退搜索也失败")
                 return []
@@ -242,10 +233,6 @@ class GraphRAGService:
                     continue
                 
                 # 获取向量嵌入
-                if "embedding" not in self.graph.nodes[neighbor]:
-                    text = self.graph.nodes[neighbor]["text"]
-                    self.graph.nodes[neighbor]["embedding"] = self.llm_service.get_embedding(text)
-                
                 embedding = self.graph.nodes[neighbor]["embedding"]
                 
                 # 计算相似度
@@ -264,6 +251,13 @@ class GraphRAGService:
         
         return relevant_nodes
     
+    def _hydrate_text(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """为结果批量读取文本块正文"""
+        texts = self.chunk_store.get_many([result["id"] for result in results]) if results else {}
+        for result in results:
+            result["text"] = texts.get(result["id"], "")
+        return results
+    
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """计算余弦相似度"""
         vec1 = np.array(vec1)
@@ -0,0 +1,234 @@
+import logging
+import threading
+import queue
+import time
+from typing import Dict, List, Any, Iterable, Iterator, Callable
+
+logger = logging.getLogger(__name__)
+
+# 队列结束标记
+_END = object()
+
+class StageStats:
+    """单个流水线阶段的统计信息"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.items / self.busy_seconds, 2) if self.busy_seconds > 0 else 0.0
+        }
+
+class IngestPipeline:
+    """
+    文档摄取流水线: 提取 -> 分块 -> 嵌入 -> 写入
+
+    每个阶段在独立线程中运行，阶段之间通过有界队列连接。前面的页面提取出来后
+    即可开始分块和嵌入，嵌入结果按批写入向量存储，而不必等待整个文档处理完毕。
+    有界队列保证下游变慢时上游会被阻塞，内存占用不随文档大小增长。
+    """
+
+    def __init__(self, chunk_fn: Callable[[Iterable[str]], Iterator[Dict[str, Any]]],
+                 embed_fn: Callable[[List[Dict[str, Any]]], List[List[float]]],
+                 upsert_fn: Callable[[List[Dict[str, Any]], List[List[float]]], None],
+                 queue_size: int = 16, embed_batch_size: int = 10, upsert_batch_size: int = 64):
+        """
+        Args:
+            chunk_fn: 把文本片段流转换为文本块流的函数
+            embed_fn: 为一批文本块生成嵌入向量的函数
+            upsert_fn: 把一批文本块及其向量写入向量存储的函数
+            queue_size: 阶段之间队列的最大长度
+            embed_batch_size: 每次嵌入调用的文本块数
+            upsert_batch_size: 每次写入的文本块数
+        """
+        self.chunk_fn = chunk_fn
+        self.embed_fn = embed_fn
+        self.upsert_fn = upsert_fn
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+
+    def run(self, segments: Iterable[str]) -> Dict[str, Any]:
+        """
+        运行流水线直到所有文本片段处理完毕
+
+        Args:
+            segments: 文本片段的可迭代对象，通常是处理器的增量提取生成器
+
+        Returns:
+            Dict[str, Any]: 各阶段的统计信息
+
+        Raises:
+            Exception: 任一阶段出错时抛出第一个错误
+        """
+        self._stop = threading.Event()
+        self._errors = []
+        self._stats = {name: StageStats(name) for name in ("extract", "chunk", "embed", "upsert")}
+
+        text_queue = queue.Queue(maxsize=self.queue_size)
+        chunk_queue = queue.Queue(maxsize=self.queue_size * self.embed_batch_size)
+        vector_queue = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            ("extract", self._extract_stage, (segments, text_queue)),
+            ("chunk", self._chunk_stage, (text_queue, chunk_queue)),
+            ("embed", self._embed_stage, (chunk_queue, vector_queue)),
+            ("upsert", self._upsert_stage, (vector_queue,)),
+        ]
+
+        start_time = time.time()
+        threads = [
+            threading.Thread(target=self._run_stage, args=(name, target, args), name=f"ingest-{name}", daemon=True)
+            for name, target, args in stages
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        elapsed = time.time() - start_time
+        stats = {name: stage.to_dict() for name, stage in self._stats.items()}
+        stats["elapsed_seconds"] = round(elapsed, 3)
+
+        logger.info(
+            "流水线完成，耗时 %.2f秒: " % elapsed +
+            ", ".join(f"{name} {s['items']}项/{s['items_per_second']}项每秒"
+                      for name, s in stats.items() if isinstance(s, dict))
+        )
+        return stats
+
+    def _run_stage(self, name: str, target: Callable, args: tuple):
+        """运行单个阶段，出错时通知其他阶段停止"""
+        try:
+            target(*args)
+        except Exception as e:
+            logger.error(f"流水线阶段 {name} 出错: {str(e)}")
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q: queue.Queue, item: Any):
+        """向有界队列放入数据，其他阶段出错时放弃等待"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _iter_queue(self, q: queue.Queue) -> Iterator[Any]:
+        """从队列读取数据直到结束标记，其他阶段出错时停止"""
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _END:
+                return
+            yield item
+
+    def _timed(self, name: str, iterator: Iterator[Any]) -> Iterator[Any]:
+        """统计生成器在本阶段内产生每一项所花的时间"""
+        stats = self._stats[name]
+        while True:
+            started = time.time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stats.busy_seconds += time.time() - started
+                return
+            stats.busy_seconds += time.time() - started
+            stats.items += 1
+            yield item
+
+    def _extract_stage(self, segments: Iterable[str], out: queue.Queue):
+        iterator = iter(segments)
+        try:
+            for segment in self._timed("extract", iterator):
+                if self._stop.is_set():
+                    break
+                self._put(out, segment)
+        finally:
+            # 其他阶段出错时关闭提取生成器，让沙箱或页面进程池尽早停止，而不是提取完整个文档
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self._put(out, _END)
+
+    def _chunk_stage(self, inp: queue.Queue, out: queue.Queue):
+        stats = self._stats["chunk"]
+        waited = 0.0
+
+        def segments():
+            # 分块函数直接消费上游队列，等待上游的时间不计入本阶段
+            nonlocal waited
+            iterator = self._iter_queue(inp)
+            while True:
+                started = time.time()
+                segment = next(iterator, _END)
+                waited += time.time() - started
+                if segment is _END:
+                    return
+                yield segment
+
+        chunks = self.chunk_fn(segments())
+        try:
+            while True:
+                started, waited = time.time(), 0.0
+                chunk = next(chunks, _END)
+                stats.busy_seconds += time.time() - started - waited
+                if chunk is _END:
+                    break
+                stats.items += 1
+                self._put(out, chunk)
+        finally:
+            self._put(out, _END)
+
+    def _embed_stage(self, inp: queue.Queue, out: queue.Queue):
+        stats = self._stats["embed"]
+        batch = []
+
+        def flush():
+            started = time.time()
+            vectors = self.embed_fn(batch)
+            stats.busy_seconds += time.time() - started
+            stats.items += len(batch)
+            self._put(out, (list(batch), vectors))
+            batch.clear()
+
+        try:
+            for chunk in self._iter_queue(inp):
+                batch.append(chunk)
+                if len(batch) >= self.embed_batch_size:
+                    flush()
+            if batch and not self._stop.is_set():
+                flush()
+        finally:
+            self._put(out, _END)
+
+    def _upsert_stage(self, inp: queue.Queue):
+        stats = self._stats["upsert"]
+        chunks, vectors = [], []
+
+        def flush():
+            started = time.time()
+            self.upsert_fn(chunks, vectors)
+            stats.busy_seconds += time.time() - started
+            stats.items += len(chunks)
+            chunks.clear()
+            vectors.clear()
+
+        for batch_chunks, batch_vectors in self._iter_queue(inp):
+            chunks.extend(batch_chunks)
+            vectors.extend(batch_vectors)
+            if len(chunks) >= self.upsert_batch_size:
+                flush()
+        if chunks and not self._stop.is_set():
+            flush()
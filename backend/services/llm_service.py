@@ -4,6 +4,8 @@ import yaml
 import httpx
 from typing import Dict, List, Optional, Any
 import json
+from .embedding_cache import get_embedding_cache
+from ..embeddings.client import get_embedding_client
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +20,6 @@ class LLMService:
         self.timeout = self.config["ollama"]["timeout"]
         self.base_url = f"http://{self.host}:{self.port}"
         self.default_model = self.config["models"]["default"]
-        self.embeddings_model = self.config["models"]["embeddings"]
         
         # 初始化客户端
         self.client = httpx.Client(timeout=self.timeout)
@@ -26,6 +27,14 @@ class LLMService:
         # 加载推理参数
         self.inference_params = self.config["inference"]
         
+        # 嵌入缓存，同一进程中的LLM服务共享
+        self.embedding_cache = get_embedding_cache(config_path)
+        
+        # 批量嵌入客户端，同一进程中的调用方共享连接池和并发上限
+        self.embedding_client = get_embedding_client(config_path)
+        # 嵌入模型由配置的嵌入后端决定（Ollama为models.embeddings）
+        self.embeddings_model = self.embedding_client.model
+        
         logger.info(f"LLM服务初始化完成，使用模型: {self.default_model}")
     
     def generate(self, prompt: str, system_prompt: Optional[str] = None, **kwargs) -> Dict[str, Any]:
@@ -90,18 +99,20 @@ class LLMService:
             raise Exception(f"生成流式响应失败: {str(e)}")
     
     def get_embedding(self, text: str, model: Optional[str] = None) -> List[float]:
-        """获取文本的向量嵌入"""
-        model = model or self.embeddings_model
+        """获取文本的向量嵌入，相同文本（规范化空白后）直接使用缓存的向量"""
+        return self.embedding_client.embed_many_sync([text], model or self.embeddings_model)[0]
+    
+    def get_embeddings(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """
+        批量获取文本的向量嵌入
         
-        try:
-            response = self.client.post(
-                f"{self.base_url}/api/embeddings",
-                json={"model": model, "prompt": text}
-            )
-            response.raise_for_status()
-            result = response.json()
+        由同一进程共享的嵌入客户端完成：文本按字符预算分组，每组调用一次嵌入后端，各组在并发上限内同时执行。
+        
+        Args:
+            texts: 文本列表，超过truncate_chars的文本被截断
+            model: 可选的嵌入模型，默认使用配置的嵌入模型
             
-            return result["embedding"]
-        except httpx.HTTPError as e:
-            logger.error(f"获取向量嵌入失败: {str(e)}")
-            raise Exception(f"生成向量嵌入失败: {str(e)}") 
+        Returns:
+            List[List[float]]: 与输入顺序一致的嵌入向量列表
+        """
+        return self.embedding_client.embed_many_sync(texts, model or self.embeddings_model)
@@ -1,18 +1,21 @@
- import os
+import os
 import logging
 import yaml
 from typing import Dict, List, Optional, Any
 import redis
 import json
 import time
+import hashlib
 from .vector_store import VectorStore
 from .llm_service import LLMService
+from .chunk_store import ChunkStore
 
 logger = logging.getLogger(__name__)
 
 class SearchService:
     def __init__(self, vector_store: VectorStore, llm_service: LLMService,
-                redis_config_path: str = "configs/redis.yaml"):
+                redis_config_path: str = "configs/redis.yaml",
+                chunk_store: Optional[ChunkStore] = None):
         # 加载Redis配置
         with open(redis_config_path, "r") as f:
             redis_config = yaml.safe_load(f)
@@ -33,27 +36,67 @@ class SearchService:
         self.vector_store = vector_store
         self.llm_service = llm_service
         
+        # 文本块正文存储，只为返回的结果读取正文
+        self.chunk_store = chunk_store or ChunkStore()
+        
         logger.info("搜索服务初始化完成")
     
     def search(self, query: str, user_id: Optional[str] = None, limit: int = 10,
               use_hybrid: bool = True, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """使用查询字符串搜索向量存储"""
-        # 生成缓存键
-        cache_key = f"search:{hash(query)}:{user_id or 'all'}:{limit}:{use_hybrid}:{hash(str(filters))}"
+        """使用查询字符串搜索向量存储，先查结果缓存，未命中时才生成查询嵌入"""
+        cache_key = self._cache_key(query, user_id, limit, use_hybrid, filters)
+        cached_results = self._get_cached(cache_key, query)
+        if cached_results is not None:
+            return cached_results
+        
+        try:
+            # 生成查询嵌入
+            start_time = time.time()
+            query_embedding = self.llm_service.get_embedding(query)
+            logger.debug(f"生成查询嵌入耗时: {time.time() - start_time:.3f}秒")
+        except Exception as e:
+            logger.error(f"搜索查询'{query}'时出错: {str(e)}")
+            raise Exception(f"搜索失败: {str(e)}")
+        
+        return self._search(query, user_id, limit, filters, query_embedding, cache_key)
+    
+    async def asearch(self, query: str, user_id: Optional[str] = None, limit: int = 10,
+                      use_hybrid: bool = True, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """search的协程版本，供异步路由使用：缓存未命中时通过异步嵌入客户端生成查询嵌入，不阻塞事件循环"""
+        cache_key = self._cache_key(query, user_id, limit, use_hybrid, filters)
+        cached_results = self._get_cached(cache_key, query)
+        if cached_results is not None:
+            return cached_results
+        
+        try:
+            start_time = time.time()
+            query_embedding = (await self.llm_service.embedding_client.embed_many([query]))[0]
+            logger.debug(f"生成查询嵌入耗时: {time.time() - start_time:.3f}秒")
+        except Exception as e:
+            logger.error(f"搜索查询'{query}'时出错: {str(e)}")
+            raise Exception(f"搜索失败: {str(e)}")
         
-        # 检查缓存
+        return self._search(query, user_id, limit, filters, query_embedding, cache_key)
+    
+    def _cache_key(self, query: str, user_id: Optional[str], limit: int,
+                   use_hybrid: bool, filters: Optional[Dict[str, Any]]) -> str:
+        """由查询文本、用户、过滤器等生成结果缓存键（不同进程中相同，不使用随机化的hash()）"""
+        params = json.dumps([query, filters], sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(params.encode("utf-8")).hexdigest()
+        return f"search:{digest}:{user_id or 'all'}:{limit}:{use_hybrid}"
+    
+    def _get_cached(self, cache_key: str, query: str) -> Optional[List[Dict[str, Any]]]:
+        """读取缓存的搜索结果，未命中时返回None"""
         cached_results = self.redis.get(cache_key)
         if cached_results:
             logger.info(f"缓存命中: {query}")
             return json.loads(cached_results)
-        
+        return None
+    
+    def _search(self, query: str, user_id: Optional[str], limit: int, filters: Optional[Dict[str, Any]],
+                query_embedding: List[float], cache_key: str) -> List[Dict[str, Any]]:
+        """用已生成的查询嵌入执行向量搜索并缓存结果"""
         try:
-            # 生成查询嵌入
-            start_time = time.time()
-            query_embedding = self.llm_service.get_embedding(query)
-            embedding_time = time.time() - start_time
-            logger.debug(f"生成查询嵌入耗时: {embedding_time:.3f}秒")
-            
             # 准备过滤器
             search_filter = self._prepare_filter(user_id, filters)
             
@@ -133,6 +176,9 @@ class SearchService:
         """将向量搜索结果格式化为标准格式"""
         formatted_results = []
         
+        # 批量读取结果的正文
+        texts = self.chunk_store.get_many([result["id"] for result in vector_results]) if vector_results else {}
+        
         for result in vector_results:
             # 提取基本信息
             result_id = result["id"]
@@ -143,10 +189,10 @@ class SearchService:
             formatted_result = {
                 "id": result_id,
                 "score": score,
-                "text": payload.get("text", ""),
+                "text": texts.get(result_id, payload.get("text", "")),
                 "metadata": {
                     "document_id": payload.get("document_id", ""),
-                    "chunk_id": payload.get("chunk_id", ""),
+                    "chunk_id": result_id,
                     "filename": payload.get("filename", ""),
                     "position": {
                         "start": payload.get("start_char", 0),
@@ -79,6 +79,11 @@ class VectorStore:
         # 转换为numpy数组进行验证
         vectors_np = np.array(vectors, dtype=np.float32)
         
+        # 零向量和NaN会使这些点无法被检索到，拒绝写入
+        invalid = _invalid_rows(vectors_np)
+        if invalid.any():
+            raise ValueError(f"{int(invalid.sum())} 个向量为零向量或包含NaN，拒绝写入{collection_name}")
+        
         try:
             # 创建点批次
             points = [
@@ -141,4 +146,168 @@ class VectorStore:
             
         except Exception as e:
             logger.error(f"查询{collection_name}失败: {str(e)}")
-            raise Exception(f"查询向量失败: {str(e)}") 
+            raise Exception(f"查询向量失败: {str(e)}")
+    
+    def get_vectors(self, ids: List[str], collection_name: Optional[str] = None) -> Dict[str, List[float]]:
+        """按ID批量获取已存储的向量"""
+        collection_name = collection_name or self.default_collection
+        
+        try:
+            points = self.client.retrieve(
+                collection_name=collection_name,
+                ids=ids,
+                with_payload=False,
+                with_vectors=True
+            )
+            
+            return {str(point.id): point.vector for point in points}
+            
+        except Exception as e:
+            logger.error(f"从{collection_name}获取向量失败: {str(e)}")
+            raise Exception(f"获取向量失败: {str(e)}")
+    
+    def scroll_points(self, filter_: Dict[str, Any], payload_fields: Optional[List[str]] = None,
+                      collection_name: Optional[str] = None, batch_size: int = 256,
+                      with_vectors: bool = False) -> List[Dict[str, Any]]:
+        """按过滤条件遍历所有点（不做向量搜索），返回ID、指定的有效载荷字段和可选的向量"""
+        collection_name = collection_name or self.default_collection
+        
+        try:
+            scroll_filter = rest.Filter(
+                must=[
+                    rest.FieldCondition(key=key, match=rest.MatchValue(value=value))
+                    for key, value in filter_.items()
+                ]
+            )
+            
+            results = []
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=collection_name,
+                    scroll_filter=scroll_filter,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=payload_fields if payload_fields is not None else True,
+                    with_vectors=with_vectors
+                )
+                results.extend(
+                    {"id": str(point.id), "payload": point.payload, "vector": point.vector}
+                    for point in points
+                )
+                if offset is None:
+                    break
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"遍历{collection_name}失败: {str(e)}")
+            raise Exception(f"遍历向量失败: {str(e)}")
+    
+    def find_invalid_vectors(self, filter_: Optional[Dict[str, Any]] = None,
+                             collection_name: Optional[str] = None, batch_size: int = 256) -> Dict[str, Any]:
+        """
+        按过滤条件遍历点，找出向量为零向量或包含NaN的点
+        
+        只保留无效点的ID，不把整个集合的向量留在内存中。
+        
+        Returns:
+            Dict[str, Any]: 遍历的点数（scanned）和无效点的ID列表（invalid_ids）
+        """
+        collection_name = collection_name or self.default_collection
+        
+        try:
+            scroll_filter = rest.Filter(
+                must=[
+                    rest.FieldCondition(key=key, match=rest.MatchValue(value=value))
+                    for key, value in (filter_ or {}).items()
+                ]
+            )
+            
+            scanned = 0
+            invalid_ids = []
+            offset = None
+            while True:
+                points, offset = self.client.scroll(
+                    collection_name=collection_name,
+                    scroll_filter=scroll_filter,
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=False,
+                    with_vectors=True
+                )
+                if points:
+                    vectors_np = np.array([point.vector for point in points], dtype=np.float32)
+                    invalid = _invalid_rows(vectors_np)
+                    invalid_ids.extend(str(point.id) for point, bad in zip(points, invalid) if bad)
+                    scanned += len(points)
+                if offset is None:
+                    break
+            
+            return {"scanned": scanned, "invalid_ids": invalid_ids}
+            
+        except Exception as e:
+            logger.error(f"检查{collection_name}的向量失败: {str(e)}")
+            raise Exception(f"检查向量失败: {str(e)}")
+    
+    def update_vectors(self, vectors: Dict[str, List[float]], collection_name: Optional[str] = None):
+        """替换已有点的向量，有效载荷不变"""
+        collection_name = collection_name or self.default_collection
+        
+        if not vectors:
+            return
+        
+        try:
+            self.client.update_vectors(
+                collection_name=collection_name,
+                points=[
+                    rest.PointVectors(id=point_id, vector=list(map(float, vector)))
+                    for point_id, vector in vectors.items()
+                ]
+            )
+            logger.info(f"更新了{collection_name}中{len(vectors)}个点的向量")
+        except Exception as e:
+            logger.error(f"更新{collection_name}的向量失败: {str(e)}")
+            raise Exception(f"更新向量失败: {str(e)}")
+    
+    def set_payloads(self, payloads: Dict[str, Dict[str, Any]], collection_name: Optional[str] = None):
+        """批量更新多个点的部分有效载荷字段（每个点的字段可以不同），不改变向量"""
+        collection_name = collection_name or self.default_collection
+        
+        if not payloads:
+            return
+        
+        try:
+            self.client.batch_update_points(
+                collection_name=collection_name,
+                update_operations=[
+                    rest.SetPayloadOperation(set_payload=rest.SetPayload(payload=payload, points=[point_id]))
+                    for point_id, payload in payloads.items()
+                ]
+            )
+        except Exception as e:
+            logger.error(f"更新{collection_name}有效载荷失败: {str(e)}")
+            raise Exception(f"更新有效载荷失败: {str(e)}")
+    
+    def delete_points(self, ids: List[str], collection_name: Optional[str] = None):
+        """按ID删除点"""
+        collection_name = collection_name or self.default_collection
+        
+        if not ids:
+            return
+        
+        try:
+            self.client.delete(
+                collection_name=collection_name,
+                points_selector=rest.PointIdsList(points=ids)
+            )
+            logger.info(f"从{collection_name}删除了{len(ids)}个向量")
+        except Exception as e:
+            logger.error(f"从{collection_name}删除向量失败: {str(e)}")
+            raise Exception(f"删除向量失败: {str(e)}")
+
+def _invalid_rows(vectors: np.ndarray) -> np.ndarray:
+    """逐行判断向量是否为零向量或包含NaN/无穷大"""
+    if vectors.ndim != 2:
+        return np.zeros(len(vectors), dtype=bool)
+    return ~(np.isfinite(vectors).all(axis=1) & vectors.any(axis=1))
@@ -1,4 +1,4 @@
- import os
+import os
 import logging
 import yaml
 import time
@@ -13,6 +13,7 @@ from ..services.document_service import DocumentService
 from ..services.vector_store import VectorStore
 from ..services.llm_service import LLMService
 from ..services.graphrag_service import GraphRAGService
+from .tasks.document_processor import DocumentProcessorTask
 
 # 加载配置
 config_path = os.getenv("WORKER_CONFIG_PATH", "configs/worker.yaml")
@@ -36,6 +37,11 @@ vector_store = VectorStore()
 llm_service = LLMService()
 document_service = DocumentService(vector_store)
 graphrag_service = GraphRAGService(vector_store, llm_service)
+document_task = DocumentProcessorTask(document_service)
+
+# 文档目录为空时导入早期版本保存在元数据集合中的文档
+if document_service.catalog.count() == 0:
+    document_service.import_metadata_collection()
 
 # 初始化Redis
 redis_client = redis.Redis(
@@ -53,21 +59,35 @@ thread_pool = ThreadPoolExecutor(max_workers=config["worker"]["threads"])
 running = True
 
 def process_document_task(task_data: Dict[str, Any]):
-    """处理文档任务"""
+    """处理文档任务：提取、分块、嵌入并索引上传的文件"""
+    task_id = task_data.get("task_id")
     try:
         document_id = task_data.get("document_id")
-        task_id = task_data.get("task_id")
         
         logger.info(f"处理文档任务: {task_id}, 文档ID: {document_id}")
         
         # 更新任务状态
         redis_client.hset(f"task:{task_id}", "status", "processing")
         
-        # 实际处理文档的逻辑
-        # 这里通常会从存储中加载临时文件，然后调用document_service的处理方法
+        # 处理存储目录中的文件，文档状态依次经过 processing/indexing/indexed
+        # 存储的文件在处理后保留，重新索引时增量比较文本块
+        result = document_task.process(
+            file_path=task_data["file_path"],
+            filename=task_data["filename"],
+            user_id=task_data["user_id"],
+            metadata=task_data.get("metadata"),
+            document_id=document_id,
+            file_hash=task_data.get("file_hash"),
+            file_size=task_data.get("file_size"),
+            incremental=task_data.get("incremental", False)
+        )
+        
+        if not result["success"]:
+            raise Exception(result["error"])
+        
+        redis_client.hset(f"task:{task_id}", "chunks_count", result["chunks_count"])
         
-        # 如果文档处理已在API层完成，这里可以进行额外的优化或后处理
-        # 例如，更新知识图谱
+        # 更新知识图谱
         graphrag_service.update_graph(document_id)
         
         # 更新任务状态为完成
@@ -84,29 +104,90 @@ def process_document_task(task_data: Dict[str, Any]):
             redis_client.hset(f"task:{task_id}", "status", "failed")
             redis_client.hset(f"task:{task_id}", "error", str(e))
 
+def process_archive_task(task_data: Dict[str, Any]):
+    """处理压缩包导入任务：流式读取成员，每个成员作为独立文档索引，进度写入任务状态"""
+    task_id = task_data.get("task_id")
+    try:
+        logger.info(f"处理压缩包导入任务: {task_id}, 文件: {task_data['filename']}")
+        
+        # 更新任务状态
+        redis_client.hset(f"task:{task_id}", "status", "processing")
+        
+        def on_progress(progress: Dict[str, Any]):
+            redis_client.hset(
+                f"task:{task_id}",
+                mapping={key: value for key, value in progress.items() if value is not None}
+            )
+        
+        result = document_service.archive_ingestor.ingest(
+            archive_path=task_data["file_path"],
+            filename=task_data["filename"],
+            user_id=task_data["user_id"],
+            metadata=task_data.get("metadata"),
+            on_progress=on_progress
+        )
+        
+        redis_client.hset(
+            f"task:{task_id}",
+            mapping={
+                "document_ids": json.dumps(result["document_ids"]),
+                "errors": json.dumps(result["errors"], ensure_ascii=False)
+            }
+        )
+        
+        # 更新知识图谱
+        for document_id in result["document_ids"]:
+            graphrag_service.update_graph(document_id)
+        
+        # 更新任务状态为完成
+        redis_client.hset(f"task:{task_id}", "status", "completed")
+        redis_client.hset(f"task:{task_id}", "completed_at", time.time())
+        
+        logger.info(f"压缩包导入任务 {task_id} 处理完成")
+    
+    except Exception as e:
+        logger.error(f"处理压缩包导入任务失败: {str(e)}")
+        
+        # 更新任务状态为失败
+        if task_id:
+            redis_client.hset(f"task:{task_id}", "status", "failed")
+            redis_client.hset(f"task:{task_id}", "error", str(e))
+    
+    finally:
+        # 成员不保留在存储目录中，导入结束后压缩包本身也不再需要
+        file_path = task_data.get("file_path")
+        if file_path and os.path.exists(file_path):
+            os.unlink(file_path)
+
 def process_embedding_task(task_data: Dict[str, Any]):
-    """处理嵌入任务"""
+    """处理嵌入修复任务：重新嵌入向量为零向量或包含NaN的文本块，进度写入任务状态"""
+    task_id = task_data.get("task_id")
     try:
         document_id = task_data.get("document_id")
-        chunk_ids = task_data.get("chunk_ids", [])
-        task_id = task_data.get("task_id")
+        user_id = task_data.get("user_id")
         
-        logger.info(f"处理嵌入任务: {task_id}, 文档ID: {document_id}, 块数: {len(chunk_ids)}")
+        logger.info(f"处理嵌入修复任务: {task_id}, 用户ID: {user_id}, 文档ID: {document_id}")
         
         # 更新任务状态
         redis_client.hset(f"task:{task_id}", "status", "processing")
         
-        # 这里实现嵌入处理逻辑
-        # 通常是从数据库加载块内容，然后生成嵌入
+        def on_progress(progress: Dict[str, Any]):
+            redis_client.hset(f"task:{task_id}", mapping=progress)
+        
+        result = document_service.repair_embeddings(
+            user_id=user_id,
+            document_id=document_id,
+            on_progress=on_progress
+        )
         
         # 更新任务状态为完成
         redis_client.hset(f"task:{task_id}", "status", "completed")
         redis_client.hset(f"task:{task_id}", "completed_at", time.time())
         
-        logger.info(f"嵌入任务 {task_id} 处理完成")
+        logger.info(f"嵌入修复任务 {task_id} 处理完成，修复 {result['points_repaired']} 个点")
         
     except Exception as e:
-        logger.error(f"处理嵌入任务失败: {str(e)}")
+        logger.error(f"处理嵌入修复任务失败: {str(e)}")
         
         # 更新任务状态为失败
         if task_id:
@@ -151,6 +232,7 @@ def poll_tasks():
     """轮询并处理任务队列中的任务"""
     task_types = {
         "document": process_document_task,
+        "archive": process_archive_task,
         "embedding": process_embedding_task,
         "indexing": process_indexing_task
     }
@@ -189,6 +271,9 @@ def handle_signal(sig, frame):
     # 关闭线程池
     thread_pool.shutdown(wait=True)
     
+    # 停止提取子进程
+    document_service.extraction_sandbox.shutdown()
+    
     # 关闭连接
     redis_client.close()
     
@@ -16,15 +16,21 @@ class DocumentProcessorTask:
         self.document_service = document_service
     
     def process(self, file_path: str, filename: str, user_id: str, 
-               metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+               metadata: Dict[str, Any] = None, document_id: str = None,
+               file_hash: str = None, file_size: int = None,
+               incremental: bool = False) -> Dict[str, Any]:
         """
         处理文档文件
         
         Args:
-            file_path: 临时文件路径
+            file_path: 存储目录中的文件路径，处理后保留供重新索引使用
             filename: 原始文件名
             user_id: 用户ID
             metadata: 可选的元数据
+            document_id: 可选的已登记文档ID
+            file_hash: 可选的已计算文件哈希
+            file_size: 可选的文件大小
+            incremental: 是否只为变化的文本块重新生成嵌入
             
         Returns:
             Dict[str, Any]: 处理结果
@@ -40,7 +46,12 @@ class DocumentProcessorTask:
                     file=file,
                     filename=filename,
                     user_id=user_id,
-                    metadata=metadata
+                    metadata=metadata,
+                    file_hash=file_hash,
+                    file_size=file_size,
+                    document_id=document_id,
+                    file_path=file_path,
+                    incremental=incremental
                 )
             
             processing_time = time.time() - start_time
@@ -62,10 +73,3 @@ class DocumentProcessorTask:
                 "error": str(e),
                 "processing_time": processing_time
             }
-        finally:
-            # 删除临时文件
-            if os.path.exists(file_path):
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    logger.warning(f"删除临时文件{file_path}失败: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+性能基准测试
+
+用法:
+    python scripts/benchmark.py chunker [--size-mb 50] [--unit chars|tokens] [--anchor-interval 0]
+    python scripts/benchmark.py pdf [--pages 800] [--workers 4]
+    python scripts/benchmark.py docx [--tables 20] [--rows 500] [--cols 8]
+    python scripts/benchmark.py embed [--chunks 10000] [--baseline-chunks 500] [--batch-size 64] [--backend ollama|onnx|hashing]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.processors.chunker import TextChunker
+from backend.processors.pdf_processor import PDFProcessor
+from backend.processors.docx_processor import DocxProcessor
+from backend.services.llm_service import LLMService
+from backend.embeddings.client import EmbeddingClient
+
+SAMPLE_SENTENCES = [
+    "本系统支持对大规模私有文档进行语义检索和问答。",
+    "文档在上传后会被提取文本、分块、向量化并写入向量数据库！",
+    "是否需要对表格数据进行单独处理？",
+    "检索结果会结合知识图谱进行扩展；",
+    "The knowledge base indexes PDF, Word and Excel files. ",
+    "\n",
+]
+
+def generate_text(size_mb: float, seed: int = 42) -> str:
+    """生成带页码标记的中英文混合测试文本"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    size = 0
+    page = 0
+
+    while size < target:
+        page += 1
+        marker = f"\n--- 页 {page} ---\n"
+        parts.append(marker)
+        size += len(marker.encode("utf-8"))
+        for _ in range(rng.randint(10, 60)):
+            sentence = rng.choice(SAMPLE_SENTENCES)
+            parts.append(sentence)
+            size += len(sentence.encode("utf-8"))
+
+    return "".join(parts)
+
+def bench_chunker(args):
+    text = generate_text(args.size_mb)
+    size_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    chunker = TextChunker(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, size_unit=args.unit,
+                          anchor_interval=args.anchor_interval)
+
+    # 以64KB的片段流式输入，与流水线中的用法一致
+    segment_size = 64 * 1024
+    segments = (text[i:i + segment_size] for i in range(0, len(text), segment_size))
+
+    start_time = time.perf_counter()
+    chunk_count = sum(1 for _ in chunker.iter_chunks(segments, "bench"))
+    elapsed = time.perf_counter() - start_time
+
+    print(f"分块器 ({args.unit}, 锚点间隔 {args.anchor_interval}): {size_mb:.1f}MB, {chunk_count}块, "
+          f"耗时 {elapsed:.2f}秒, {size_mb / elapsed:.1f}MB/s")
+
+def generate_pdf(path: str, pages: int, seed: int = 42):
+    """生成每页若干段英文文本的测试PDF"""
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = "".join(rng.choice(SAMPLE_SENTENCES[4:5]) for _ in range(40))
+        page.insert_textbox(fitz.Rect(50, 50, 550, 800), f"Page {page_num + 1}. {text}")
+    doc.save(path)
+    doc.close()
+
+def bench_pdf(args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench.pdf")
+        generate_pdf(path, args.pages)
+
+        for workers in (1, args.workers):
+            processor = PDFProcessor()
+            processor.max_workers = workers
+
+            start_time = time.perf_counter()
+            with open(path, "rb") as f:
+                text, metadata = processor.process(f)
+            elapsed = time.perf_counter() - start_time
+
+            print(f"PDF提取 ({workers}进程): {args.pages}页, {len(text)}字符, "
+                  f"耗时 {elapsed:.2f}秒, {args.pages / elapsed:.1f}页/秒")
+
+def generate_docx(path: str, tables: int, rows: int, cols: int, seed: int = 42):
+    """生成包含若干大表格和说明段落的测试Word文档"""
+    import docx
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+
+    rng = random.Random(seed)
+    doc = docx.Document()
+    for table_num in range(tables):
+        doc.add_heading(f"表格 {table_num + 1}", 2)
+        doc.add_paragraph("".join(rng.choice(SAMPLE_SENTENCES[:5]) for _ in range(5)))
+
+        # 直接构造表格XML，避免python-docx逐单元格写入过慢
+        tbl_rows = "".join(
+            "<w:tr>" + "".join(
+                f"<w:tc><w:p><w:r><w:t>{row}-{col}-{rng.randint(0, 99999)}</w:t></w:r></w:p></w:tc>"
+                for col in range(cols)
+            ) + "</w:tr>"
+            for row in range(rows)
+        )
+        grid = "".join("<w:gridCol/>" for _ in range(cols))
+        doc.element.body.append(parse_xml(f"<w:tbl {nsdecls('w')}><w:tblGrid>{grid}</w:tblGrid>{tbl_rows}</w:tbl>"))
+    doc.save(path)
+
+def bench_docx(args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench.docx")
+        generate_docx(path, args.tables, args.rows, args.cols)
+
+        for fast_path in (False, True):
+            processor = DocxProcessor()
+            processor.fast_path = fast_path
+
+            start_time = time.perf_counter()
+            with open(path, "rb") as f:
+                text, metadata = processor.process(f)
+            elapsed = time.perf_counter() - start_time
+
+            label = "直接解析XML" if fast_path else "python-docx"
+            print(f"Word提取 ({label}): {args.tables}个表格 x {args.rows}行 x {args.cols}列, "
+                  f"{len(text)}字符, 耗时 {elapsed:.2f}秒")
+
+def bench_embed(args):
+    """
+    对比逐条、批量和并发批量嵌入的吞吐量
+
+    默认使用配置的嵌入后端，--backend可以指定其他后端（ollama后端需要可访问的Ollama服务）。
+    """
+    chunker = TextChunker(chunk_size=1000, chunk_overlap=200)
+    texts = []
+    for chunk in chunker.iter_chunks(iter([generate_text(args.chunks * 1000 / (1024 * 1024) * 3)]), "bench"):
+        texts.append(chunk["text"])
+        if len(texts) >= args.chunks:
+            break
+
+    llm_service = LLMService(args.config)
+    if args.backend:
+        llm_service.embedding_client = EmbeddingClient(args.config, backend_type=args.backend)
+        llm_service.embeddings_model = llm_service.embedding_client.model
+    print(f"嵌入后端: {llm_service.embedding_client.backend.type}, 模型 {llm_service.embeddings_model}")
+    # 测量的是嵌入请求本身，不使用嵌入缓存
+    llm_service.embedding_cache.enabled = False
+
+    # 逐条请求耗时较长，只取前baseline_chunks条估算吞吐量
+    baseline = texts[:args.baseline_chunks]
+    start_time = time.perf_counter()
+    for text in baseline:
+        llm_service.get_embedding(text)
+    single_rate = len(baseline) / (time.perf_counter() - start_time)
+    print(f"逐条嵌入: {len(baseline)}块, {single_rate:.1f}块/秒")
+
+    # 与流水线一致，每batch_size块调用一次get_embeddings
+    start_time = time.perf_counter()
+    for i in range(0, len(texts), args.batch_size):
+        llm_service.get_embeddings(texts[i:i + args.batch_size])
+    elapsed = time.perf_counter() - start_time
+    batch_rate = len(texts) / elapsed
+    print(f"批量嵌入: {len(texts)}块, 耗时 {elapsed:.2f}秒, {batch_rate:.1f}块/秒, "
+          f"字符预算 {llm_service.embedding_client.batch_chars}, 提升 {batch_rate / single_rate:.1f}倍")
+
+    # 一次交给嵌入客户端，各批次在并发上限内同时请求
+    start_time = time.perf_counter()
+    llm_service.get_embeddings(texts)
+    elapsed = time.perf_counter() - start_time
+    concurrent_rate = len(texts) / elapsed
+    print(f"并发嵌入: {len(texts)}块, 耗时 {elapsed:.2f}秒, {concurrent_rate:.1f}块/秒, "
+          f"最大并发请求 {llm_service.embedding_client.stats['max_in_flight']}, "
+          f"提升 {concurrent_rate / single_rate:.1f}倍")
+
+def main():
+    parser = argparse.ArgumentParser(description="知识库系统性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    chunker_parser = subparsers.add_parser("chunker", help="文本分块吞吐量")
+    chunker_parser.add_argument("--size-mb", type=float, default=50)
+    chunker_parser.add_argument("--unit", choices=["chars", "tokens"], default="chars")
+    chunker_parser.add_argument("--chunk-size", type=int, default=1000)
+    chunker_parser.add_argument("--chunk-overlap", type=int, default=200)
+    chunker_parser.add_argument("--anchor-interval", type=int, default=0)
+    chunker_parser.set_defaults(func=bench_chunker)
+
+    pdf_parser = subparsers.add_parser("pdf", help="PDF并行提取吞吐量")
+    pdf_parser.add_argument("--pages", type=int, default=800)
+    pdf_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    pdf_parser.set_defaults(func=bench_pdf)
+
+    docx_parser = subparsers.add_parser("docx", help="Word大表格提取耗时")
+    docx_parser.add_argument("--tables", type=int, default=20)
+    docx_parser.add_argument("--rows", type=int, default=500)
+    docx_parser.add_argument("--cols", type=int, default=8)
+    docx_parser.set_defaults(func=bench_docx)
+
+    embed_parser = subparsers.add_parser("embed", help="逐条与批量嵌入吞吐量")
+    embed_parser.add_argument("--chunks", type=int, default=10000)
+    embed_parser.add_argument("--baseline-chunks", type=int, default=500)
+    embed_parser.add_argument("--batch-size", type=int, default=64)
+    embed_parser.add_argument("--config", default=os.getenv("OLLAMA_CONFIG_PATH", "configs/ollama.yaml"))
+    embed_parser.add_argument("--backend", choices=["ollama", "onnx", "hashing"], default=None,
+                              help="覆盖配置中的embedding_backend.type")
+    embed_parser.set_defaults(func=bench_embed)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import yaml
+from backend.embeddings import batch_processor
+from backend.embeddings.batch_processor import BatchProcessor
+
+def fake_embeddings(texts):
+    return [[float(len(text)), 1.0] for text in texts]
+
+class BatchProcessorTest(unittest.TestCase):
+    """BatchProcessor按批调用get_embeddings，结果与输入顺序一致"""
+    
+    def setUp(self):
+        fd, self.config_path = tempfile.mkstemp(suffix=".yaml")
+        with os.fdopen(fd, "w") as f:
+            yaml.safe_dump({"embedding": {"batch_size": 3, "max_workers": 2}}, f)
+        self.addCleanup(os.unlink, self.config_path)
+        self.texts = [f"文本{i}" * (i + 1) for i in range(8)]
+    
+    def test_process_in_batches(self):
+        processor = BatchProcessor(self.config_path)
+        with mock.patch.object(batch_processor, "get_embeddings", side_effect=fake_embeddings) as get_embeddings:
+            embeddings = processor.process_in_batches(self.texts)
+        
+        self.assertEqual(embeddings, fake_embeddings(self.texts))
+        self.assertEqual([len(call.args[0]) for call in get_embeddings.call_args_list], [3, 3, 2])
+    
+    def test_process_in_parallel(self):
+        processor = BatchProcessor(self.config_path)
+        with mock.patch.object(batch_processor, "get_embeddings", side_effect=fake_embeddings) as get_embeddings:
+            embeddings = processor.process_in_parallel(self.texts)
+        
+        self.assertEqual(embeddings, fake_embeddings(self.texts))
+        # 所有文本一次交给嵌入客户端分组
+        get_embeddings.assert_called_once_with(self.texts)
+
+if __name__ == "__main__":
+    unittest.main()